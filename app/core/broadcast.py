@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from app.core.config import Config
+from app.core.database import mongo_db
+from app.core.health import health_monitor
+from app.core.rate_limit import TokenBucket
+from app.core.registry import module_registry
+
+logger = logging.getLogger(__name__)
+
+# Resultado do envio para um destinatário
+SENT, BLOCKED, FAILED = 'sent', 'blocked', 'failed'
+
+class BroadcastEngine:
+    """Envio em massa com limite de taxa, checkpoint no MongoDB e retomada após reinício.
+
+    Os destinatários são lidos em lotes ordenados por user_id (paginação por chave);
+    ao fim de cada lote o último user_id e os contadores são gravados no documento
+    do broadcast. Após um reinício, no máximo o lote em andamento é reenviado.
+    """
+
+    def __init__(self, rate: float = 25.0, concurrency: int = 16, batch_size: int = 200,
+                 lease_seconds: int = 300, max_network_retries: int = 3):
+        self.limiter = TokenBucket(rate, capacity=rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_network_retries = max_network_retries
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.application = None
+
+    def _collection(self):
+        return mongo_db.get_collection('broadcasts')
+
+    def _insert(self, broadcast: Dict):
+        self._collection().insert_one(broadcast)
+
+    def _claim(self, query: Dict) -> Optional[Dict]:
+        now = datetime.utcnow()
+        return self._collection().find_one_and_update(
+            {**query, 'status': 'running', '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}]},
+            {'$set': {'worker_id': self.worker_id, 'lease_until': now + timedelta(seconds=self.lease_seconds)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _next_batch(self, after_user_id: int) -> List[int]:
+        """Próximo lote de destinatários ativos depois do checkpoint"""
+        users = mongo_db.get_collection('users')
+        cursor = users.find(
+            {'user_id': {'$gt': after_user_id}, 'is_active': {'$ne': False}},
+            {'user_id': 1, '_id': 0}
+        ).sort('user_id', 1).limit(self.batch_size)
+        return [user['user_id'] for user in cursor]
+
+    def _checkpoint(self, broadcast_id: str, last_user_id: int, counts: Dict[str, int], blocked: List[int]) -> Optional[Dict]:
+        """Gravar o progresso do lote; retorna o documento atualizado (None se perdemos o lease)"""
+        now = datetime.utcnow()
+        if blocked:
+            # Usuários que bloquearam o bot ficam de fora dos próximos broadcasts
+            mongo_db.get_collection('users').update_many(
+                {'user_id': {'$in': blocked}},
+                {'$set': {'is_active': False, 'blocked_at': now}}
+            )
+        return self._collection().find_one_and_update(
+            {'_id': broadcast_id, 'worker_id': self.worker_id},
+            {
+                '$set': {
+                    'last_user_id': last_user_id,
+                    'lease_until': now + timedelta(seconds=self.lease_seconds),
+                    'updated_at': now
+                },
+                '$inc': counts
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _finish(self, broadcast_id: str) -> Optional[Dict]:
+        now = datetime.utcnow()
+        return self._collection().find_one_and_update(
+            {'_id': broadcast_id, 'worker_id': self.worker_id, 'status': 'running'},
+            {'$set': {'status': 'done', 'lease_until': None, 'finished_at': now, 'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _release(self, broadcast_ids: List[str]):
+        self._collection().update_many(
+            {'_id': {'$in': broadcast_ids}, 'worker_id': self.worker_id, 'status': 'running'},
+            {'$set': {'lease_until': None}}
+        )
+
+    def cancel(self, broadcast_id: str) -> bool:
+        """Interromper um broadcast; o lote em andamento termina antes da parada"""
+        result = self._collection().update_one(
+            {'_id': broadcast_id, 'status': 'running'},
+            {'$set': {'status': 'cancelled', 'finished_at': datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+
+    async def _send(self, chat_id: int, text: str) -> str:
+        retries = 0
+        async with self.semaphore:
+            while True:
+                await self.limiter.acquire()
+                try:
+                    await self.application.bot.send_message(chat_id=chat_id, text=text)
+                    return SENT
+                except RetryAfter as e:
+                    # Limite global do Telegram: todos os envios aguardam, não só este
+                    logger.warning(f"Broadcast: RetryAfter de {e.retry_after}s")
+                    self.limiter.pause(float(e.retry_after))
+                except Forbidden:
+                    return BLOCKED
+                except BadRequest as e:
+                    if 'chat not found' in str(e).lower():
+                        return BLOCKED
+                    logger.error(f"Erro ao enviar broadcast para {chat_id}: {e}")
+                    return FAILED
+                except NetworkError as e:
+                    retries += 1
+                    if retries > self.max_network_retries:
+                        logger.error(f"Erro ao enviar broadcast para {chat_id}: {e}")
+                        return FAILED
+                    await asyncio.sleep(retries)
+                except TelegramError as e:
+                    logger.error(f"Erro ao enviar broadcast para {chat_id}: {e}")
+                    return FAILED
+
+    def _status_text(self, broadcast: Dict) -> str:
+        sent, blocked, failed = broadcast.get('sent', 0), broadcast.get('blocked', 0), broadcast.get('failed', 0)
+        labels = {'running': '📤 Broadcast em andamento', 'done': '✅ Broadcast concluído!', 'cancelled': '⛔ Broadcast cancelado'}
+        return (
+            f"{labels.get(broadcast['status'], broadcast['status'])}\n\n"
+            f"• ✅ Enviadas: {sent}\n"
+            f"• 🚫 Bloquearam o bot: {blocked}\n"
+            f"• ❌ Erros: {failed}\n"
+            f"• 📊 Total: {sent + blocked + failed} de ~{broadcast.get('estimated_total', 0)}"
+        )
+
+    async def _report(self, broadcast: Dict):
+        """Atualizar a mensagem de progresso enviada ao admin"""
+        if not broadcast.get('status_message_id'):
+            return
+        running = broadcast['status'] == 'running'
+        keyboard = InlineKeyboardMarkup([[
+            InlineKeyboardButton("⛔ Cancelar", callback_data=f"bcast:cancel:{broadcast['_id']}")
+        ]]) if running else None
+        try:
+            await self.application.bot.edit_message_text(
+                self._status_text(broadcast), chat_id=broadcast['admin_chat_id'],
+                message_id=broadcast['status_message_id'], reply_markup=keyboard
+            )
+        except BadRequest as e:
+            logger.debug(f"Não foi possível atualizar o progresso do broadcast: {e}")
+
+    async def _run(self, broadcast: Dict):
+        broadcast_id = broadcast['_id']
+        text = broadcast['text']
+        try:
+            while broadcast['status'] == 'running':
+                recipients = await asyncio.to_thread(self._next_batch, broadcast.get('last_user_id', 0))
+                if not recipients:
+                    finished = await asyncio.to_thread(self._finish, broadcast_id)
+                    broadcast = finished or await asyncio.to_thread(self._collection().find_one, {'_id': broadcast_id})
+                    break
+
+                results = await asyncio.gather(*(self._send(user_id, text) for user_id in recipients))
+                counts = {status: results.count(status) for status in (SENT, BLOCKED, FAILED)}
+                blocked = [user_id for user_id, status in zip(recipients, results) if status == BLOCKED]
+
+                updated = await asyncio.to_thread(self._checkpoint, broadcast_id, recipients[-1], counts, blocked)
+                if updated is None:
+                    logger.warning(f"Broadcast {broadcast_id} assumido por outra instância")
+                    return
+                broadcast = updated
+                await self._report(broadcast)
+
+            await self._report(broadcast)
+            logger.info(f"Broadcast {broadcast_id} finalizado: {broadcast['status']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # O lease expira e o broadcast é retomado do último checkpoint
+            logger.error(f"Erro no broadcast {broadcast_id}: {e}")
+        finally:
+            self.tasks.pop(broadcast_id, None)
+
+    def _launch(self, broadcast: Dict):
+        self.tasks[broadcast['_id']] = asyncio.get_running_loop().create_task(self._run(broadcast))
+
+    def running(self) -> int:
+        return len(self.tasks)
+
+    async def start_broadcast(self, text: str, created_by: int, admin_chat_id: int) -> Optional[str]:
+        """Criar um broadcast e começar o envio em segundo plano"""
+        now = datetime.utcnow()
+        users = mongo_db.get_collection('users')
+        if users is None:
+            return None
+        estimated_total = await asyncio.to_thread(users.count_documents, {'is_active': {'$ne': False}})
+
+        broadcast = {
+            '_id': uuid.uuid4().hex,
+            'text': text,
+            'created_by': created_by,
+            'admin_chat_id': admin_chat_id,
+            'status': 'running',
+            'estimated_total': estimated_total,
+            'last_user_id': 0,
+            'sent': 0,
+            'blocked': 0,
+            'failed': 0,
+            'worker_id': self.worker_id,
+            'lease_until': now + timedelta(seconds=self.lease_seconds),
+            'created_at': now,
+            'updated_at': now
+        }
+        status_message = await self.application.bot.send_message(admin_chat_id, self._status_text(broadcast))
+        broadcast['status_message_id'] = status_message.message_id
+        await asyncio.to_thread(self._insert, broadcast)
+
+        self._launch(broadcast)
+        await self._report(broadcast)
+        return broadcast['_id']
+
+    async def start(self, application=None):
+        """Retomar broadcasts interrompidos por um reinício"""
+        self.application = application
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        if self._collection() is None:
+            return
+        while True:
+            broadcast = await asyncio.to_thread(self._claim, {})
+            if broadcast is None:
+                break
+            logger.info(f"📤 Retomando broadcast {broadcast['_id']} após user_id {broadcast.get('last_user_id', 0)}")
+            self._launch(broadcast)
+
+    async def stop(self, application=None):
+        broadcast_ids = list(self.tasks)
+        for task in list(self.tasks.values()):
+            task.cancel()
+        self.tasks = {}
+        if broadcast_ids and self._collection() is not None:
+            # Liberar o lease para que o próximo processo retome imediatamente
+            await asyncio.to_thread(self._release, broadcast_ids)
+
+# Instância global do motor de broadcast
+broadcast_engine = BroadcastEngine(Config.BROADCAST_RATE, Config.BROADCAST_CONCURRENCY, Config.BROADCAST_BATCH_SIZE)
+
+module_registry.register_startup(broadcast_engine.start)
+module_registry.register_shutdown(broadcast_engine.stop)
+health_monitor.register_queue('broadcasts', broadcast_engine.running)
@@ -0,0 +1,363 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import bson
+from pymongo import ReturnDocument
+from app.core.config import Config
+from app.core.database import mongo_db
+from app.core.registry import module_registry
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'juristbot'
+
+class CacheError(Exception):
+    """Falha do backend de cache (o chamador trata como ausência do valor)"""
+
+class CacheBackend:
+    """Backend de cache compartilhado: valores em bytes com TTL e contadores de versão"""
+
+    name = ''
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        """Incrementar um contador (sem TTL) e devolver o novo valor"""
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def close(self, application=None):
+        pass
+
+class MemoryLRUBackend(CacheBackend):
+    """LRU em memória do processo: não compartilha nada entre instâncias"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    async def get_counter(self, key: str) -> int:
+        return self.counters.get(key, 0)
+
+class MongoTTLBackend(CacheBackend):
+    """Coleção `cache` do MongoDB com índice TTL em expires_at.
+
+    O monitor de TTL do MongoDB remove documentos a cada ~60 s, então a leitura
+    também filtra por expires_at.
+    """
+
+    name = 'mongo'
+
+    def __init__(self, collection: str = 'cache'):
+        self.collection_name = collection
+
+    def _collection(self):
+        collection = mongo_db.get_collection(self.collection_name)
+        if collection is None:
+            raise CacheError("MongoDB indisponível")
+        return collection
+
+    def _get(self, key: str) -> Optional[bytes]:
+        document = self._collection().find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}}, {'value': 1})
+        return bytes(document['value']) if document else None
+
+    def _set(self, key: str, value: bytes, ttl: int):
+        self._collection().replace_one(
+            {'_id': key},
+            {'_id': key, 'value': bson.Binary(value), 'expires_at': datetime.utcnow() + timedelta(seconds=ttl)},
+            upsert=True
+        )
+
+    def _incr(self, key: str) -> int:
+        document = self._collection().find_one_and_update(
+            {'_id': key}, {'$inc': {'counter': 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return document['counter']
+
+    def _get_counter(self, key: str) -> int:
+        document = self._collection().find_one({'_id': key}, {'counter': 1})
+        return document.get('counter', 0) if document else 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(lambda: self._collection().delete_one({'_id': key}))
+
+    async def incr(self, key: str) -> int:
+        return await asyncio.to_thread(self._incr, key)
+
+    async def get_counter(self, key: str) -> int:
+        return await asyncio.to_thread(self._get_counter, key)
+
+class RedisBackend(CacheBackend):
+    """Cliente mínimo do protocolo RESP2 (Redis, KeyDB, Valkey...) sobre asyncio, com pool de conexões.
+
+    Implementa apenas os comandos usados pelo cache: GET, SET EX, DEL, INCR,
+    além de AUTH/SELECT a partir da URL (redis://:senha@host:6379/0).
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: str, pool_size: int = 10, timeout: float = 2.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.strip('/') or 0)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.slots: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(out)
+
+    @classmethod
+    async def read_reply(cls, reader: asyncio.StreamReader) -> Any:
+        line = await reader.readuntil(b'\r\n')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise CacheError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [await cls.read_reply(reader) for _ in range(count)]
+        raise CacheError(f"resposta RESP inválida: {line!r}")
+
+    async def _open(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            if self.password:
+                writer.write(self.encode('AUTH', self.password))
+                await self.read_reply(reader)
+            if self.db:
+                writer.write(self.encode('SELECT', self.db))
+                await self.read_reply(reader)
+        except Exception:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def execute(self, *args) -> Any:
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.pool_size)
+        async with self.slots:
+            connection = self.idle.pop() if self.idle else None
+            try:
+                if connection is None:
+                    connection = await self._open()
+                reader, writer = connection
+                writer.write(self.encode(*args))
+                reply = await asyncio.wait_for(self.read_reply(reader), self.timeout)
+            except CacheError:
+                # Erro do servidor: a conexão continua válida
+                self.idle.append(connection)
+                raise
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                if connection is not None:
+                    connection[1].close()
+                raise CacheError(f"Redis indisponível: {e}") from e
+            self.idle.append(connection)
+            return reply
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.execute('GET', key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.execute('SET', key, value, 'EX', ttl)
+
+    async def delete(self, key: str):
+        await self.execute('DEL', key)
+
+    async def incr(self, key: str) -> int:
+        return await self.execute('INCR', key)
+
+    async def get_counter(self, key: str) -> int:
+        value = await self.execute('GET', key)
+        return int(value) if value else 0
+
+    async def close(self, application=None):
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+
+def build_backend(kind: str, redis_url: str = '') -> CacheBackend:
+    if kind == 'redis':
+        return RedisBackend(redis_url)
+    if kind == 'mongo':
+        return MongoTTLBackend()
+    return MemoryLRUBackend()
+
+class NearCache:
+    """Cache de dois níveis: memória local (L1) na frente de um backend compartilhado (L2).
+
+    Cada namespace tem um contador de versão no backend. O L1 guarda o valor
+    junto com a versão em que foi lido e confere a versão no máximo a cada
+    `version_interval` segundos; invalidate() apaga a chave no L2 e incrementa
+    a versão, o que descarta o L1 de todas as instâncias. Acertos no L1 não
+    fazem nenhuma ida à rede.
+    """
+
+    def __init__(self, namespace: str, backend: CacheBackend, ttl: int = 300, local_ttl: int = 30,
+                 local_size: int = 10000, version_interval: float = 1.0, cache_none: bool = False):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self.version_interval = version_interval
+        self.cache_none = cache_none
+        self.local: OrderedDict = OrderedDict()
+        self.version = 0
+        self.version_checked_at = 0.0
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {'l1': 0, 'l2': 0, 'miss': 0, 'errors': 0}
+
+    def _key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{self.namespace}:{key}"
+
+    def _version_key(self) -> str:
+        return f"{KEY_PREFIX}:{self.namespace}:__version__"
+
+    async def _current_version(self) -> int:
+        now = time.monotonic()
+        if now - self.version_checked_at >= self.version_interval:
+            self.version_checked_at = now
+            try:
+                version = await self.backend.get_counter(self._version_key())
+            except CacheError as e:
+                self.stats['errors'] += 1
+                logger.warning(f"Cache {self.namespace}: versão indisponível: {e}")
+                # Sem como saber se houve invalidação: o L1 não é confiável
+                self.local.clear()
+                return self.version
+            if version != self.version:
+                self.version = version
+                self.local.clear()
+        return self.version
+
+    def _remember(self, key: str, value: Any):
+        self.local[key] = (time.monotonic() + self.local_ttl, value)
+        self.local.move_to_end(key)
+        while len(self.local) > self.local_size:
+            self.local.popitem(last=False)
+
+    async def _read_shared(self, key: str) -> Tuple[bool, Any]:
+        try:
+            raw = await self.backend.get(self._key(key))
+        except CacheError as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Cache {self.namespace}: leitura falhou: {e}")
+            return False, None
+        if raw is None:
+            return False, None
+        return True, bson.decode(raw)['v']
+
+    async def set(self, key: str, value: Any):
+        self._remember(key, value)
+        try:
+            await self.backend.set(self._key(key), bson.encode({'v': value}), self.ttl)
+        except CacheError as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Cache {self.namespace}: gravação falhou: {e}")
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = await self._read_shared(key)
+        if found:
+            self.stats['l2'] += 1
+            self._remember(key, value)
+            return value
+        self.stats['miss'] += 1
+        value = await loader()
+        if value is not None or self.cache_none:
+            await self.set(key, value)
+        return value
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Valor do L1, do L2 ou do loader (chamado uma vez por chave, mesmo com pedidos simultâneos)"""
+        await self._current_version()
+        entry = self.local.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.stats['l1'] += 1
+            self.local.move_to_end(key)
+            return entry[1]
+
+        if key not in self.inflight:
+            self.inflight[key] = asyncio.ensure_future(self._load(key, loader))
+            self.inflight[key].add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(self.inflight[key])
+
+    async def invalidate(self, key: str):
+        """Remover a chave em todas as instâncias (L1 alheio expira em até version_interval)"""
+        self.local.pop(key, None)
+        try:
+            await self.backend.delete(self._key(key))
+            self.version = await self.backend.incr(self._version_key())
+            self.version_checked_at = time.monotonic()
+        except CacheError as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Cache {self.namespace}: invalidação falhou: {e}")
+
+# Backend compartilhado por todos os caches do processo
+cache_backend = build_backend(Config.CACHE_BACKEND, Config.REDIS_URL)
+
+module_registry.register_shutdown(cache_backend.close)
@@ -21,6 +21,55 @@ class Config:
     RENDER_WEBHOOK_URL = os.getenv('RENDER_WEBHOOK_URL')
     PORT = int(os.getenv('PORT', 8443))
     WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', 'juristbot_secret')
+    # Processos servindo o webhook (fork no mesmo socket); MULTI_INSTANCE=1 quando há várias instâncias
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+    MULTI_WORKER = WEB_CONCURRENCY > 1 or os.getenv('MULTI_INSTANCE', '').lower() in ('1', 'true')
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+    
+    # APIs dos tribunais ('mock' usa dados locais em processo, 'http' usa as URLs abaixo)
+    TRIBUNAL_API_MODE = os.getenv('TRIBUNAL_API_MODE', 'mock')
+    TJSP_API_URL = os.getenv('TJSP_API_URL', 'https://api.tjsp.jus.br/v1/processos')
+    TJMG_API_URL = os.getenv('TJMG_API_URL', 'https://api.tjmg.jus.br/v1/processos')
+    TJRS_API_URL = os.getenv('TJRS_API_URL', 'https://api.tjrs.jus.br/v1/processos')
+    
+    # Processamento de updates: executando em paralelo / aguardando (por chat/usuário)
+    MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 64))
+    MAX_PENDING_UPDATES = int(os.getenv('MAX_PENDING_UPDATES', 4096))
+    
+    # Módulos importados no primeiro update que precisa deles (0 importa todos na inicialização)
+    LAZY_MODULES = os.getenv('LAZY_MODULES', '1').lower() not in ('0', 'false')
+    
+    # Persistência das conversas e user_data/chat_data no MongoDB (intervalo de gravação em segundos)
+    PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', 10))
+    
+    # Fila de jobs em segundo plano (gerações longas de IA)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 120))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+    # Perguntas do /direito acima deste tamanho viram job em segundo plano
+    DIREITO_INLINE_MAX_CHARS = int(os.getenv('DIREITO_INLINE_MAX_CHARS', 300))
+    
+    # Broadcast: mensagens/s (o Telegram limita a ~30/s), envios simultâneos e tamanho do lote
+    BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 25))
+    BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 16))
+    BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 200))
+    
+    # Cache compartilhado: 'memory' (por processo), 'mongo' (coleção com TTL) ou 'redis' (REDIS_URL)
+    REDIS_URL = os.getenv('REDIS_URL', '')
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if REDIS_URL else 'mongo' if MULTI_WORKER else 'memory')
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 6 * 3600))
+    
+    # Saúde (/health, /ready, /live): intervalo das sondas e limites de atraso do loop de eventos, em segundos
+    HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', 15))
+    HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', 5))
+    HEALTH_MAX_LOOP_LAG = float(os.getenv('HEALTH_MAX_LOOP_LAG', 0.5))
+    HEALTH_LIVE_MAX_LAG = float(os.getenv('HEALTH_LIVE_MAX_LAG', 10))
+    # Provedor de IA com falhas seguidas fica fora da rotação por AI_CIRCUIT_COOLDOWN segundos
+    AI_CIRCUIT_FAILURES = int(os.getenv('AI_CIRCUIT_FAILURES', 3))
+    AI_CIRCUIT_COOLDOWN = float(os.getenv('AI_CIRCUIT_COOLDOWN', 60))
+    
+    # Métricas no formato do Prometheus em /metrics (latência por handler, MongoDB e IA)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false')
     
     # Configurações do Bot
     BOT_NAME = os.getenv('BOT_NAME', 'JuristBot 2.0')
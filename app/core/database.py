@@ -1,17 +1,81 @@
 import os
+import time
+import hashlib
 import logging
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, ServerSelectionTimeoutError
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
+from app.core.metrics import metrics, mongo_command_metrics
 
 logger = logging.getLogger(__name__)
 
+# Índices: (coleção, chaves, opções). Alterar a lista muda a versão e recria na próxima inicialização
+INDEXES = [
+    # Índices para usuários
+    ('users', 'user_id', {'unique': True}),
+    ('users', 'created_at', {}),
+    ('users', 'is_active', {}),
+    
+    # Índices para afiliados
+    ('affiliates', 'affiliate_code', {'unique': True}),
+    ('affiliates', 'user_id', {'unique': True}),
+    ('affiliates', 'status', {}),
+    ('affiliates', [('total_commission', -1)], {}),
+    
+    # Índices para processos
+    ('processes', 'process_number', {'unique': True}),
+    ('processes', 'user_id', {}),
+    ('processes', 'cpf', {}),
+    ('processes', 'created_at', {}),
+    
+    # Acompanhamento de processos (um documento por processo)
+    ('process_watches', 'next_check_at', {}),
+    ('process_watches', 'subscribers', {}),
+    ('process_watches', 'claim_token', {'sparse': True}),
+    
+    # Fila de jobs: próximos a executar, leases vencidos e limpeza dos concluídos
+    ('jobs', [('status', 1), ('run_at', 1)], {}),
+    ('jobs', [('status', 1), ('lease_until', 1)], {}),
+    ('jobs', 'finished_at', {'expireAfterSeconds': 7 * 24 * 3600}),
+    
+    # Persistência do bot: conversas por nome e expiração das abandonadas
+    ('ptb_conversations', 'name', {}),
+    ('ptb_conversations', 'key', {}),
+    ('ptb_conversations', 'updated_at', {'expireAfterSeconds': 30 * 24 * 3600}),
+    
+    # Cache compartilhado (CACHE_BACKEND=mongo): removido quando expires_at passa
+    ('cache', 'expires_at', {'expireAfterSeconds': 0}),
+    
+    # Broadcasts em andamento (retomados na inicialização)
+    ('broadcasts', [('status', 1), ('lease_until', 1)], {}),
+    
+    # update_ids já recebidos pelo webhook (deduplicação entre workers)
+    ('processed_updates', 'received_at', {'expireAfterSeconds': 24 * 3600}),
+    
+    # Índices para consultas
+    ('queries', [('created_at', -1)], {}),
+    ('queries', 'user_id', {}),
+    ('queries', 'query_type', {}),
+    
+    # Índices para indicações
+    ('referrals', [('affiliate_code', 1), ('created_at', -1)], {}),
+    ('referrals', 'referred_user_id', {}),
+    
+    # Eventos de conversão já aplicados (idempotência por event_id)
+    ('conversion_events', 'created_at', {'expireAfterSeconds': 30 * 24 * 3600}),
+    
+    # Ledger de comissões (append-only)
+    ('commission_ledger', [('affiliate_code', 1), ('created_at', 1)], {}),
+    ('commission_ledger', 'created_at', {}),
+]
+
 class MongoDBManager:
     def __init__(self):
         self.client = None
         self.db = None
         self.is_connected = False
+        self._supports_transactions = None
         self.connect()
 
     def connect(self):
@@ -25,7 +89,8 @@ class MongoDBManager:
                 serverSelectionTimeoutMS=5000,
                 connectTimeoutMS=10000,
                 socketTimeoutMS=10000,
-                retryWrites=True
+                retryWrites=True,
+                event_listeners=[mongo_command_metrics] if metrics.enabled else []
             )
             
             # Testar conexão
@@ -43,56 +108,95 @@ class MongoDBManager:
             self.is_connected = False
 
     def _create_indexes(self):
-        """Criar índices para otimização"""
+        """Criar índices para otimização (uma vez por versão da lista INDEXES, não a cada processo)"""
+        version = hashlib.sha1(repr(INDEXES).encode()).hexdigest()
+        if not self.claim_bootstrap('indexes', version):
+            logger.info("✅ Índices do MongoDB já verificados por outro processo")
+            return
         try:
-            # Índices para usuários
-            self.db.users.create_index("user_id", unique=True)
-            self.db.users.create_index("created_at")
-            self.db.users.create_index("is_active")
-            
-            # Índices para afiliados
-            self.db.affiliates.create_index("affiliate_code", unique=True)
-            self.db.affiliates.create_index("user_id", unique=True)
-            self.db.affiliates.create_index("status")
-            
-            # Índices para processos
-            self.db.processes.create_index("process_number", unique=True)
-            self.db.processes.create_index("user_id")
-            self.db.processes.create_index("cpf")
-            self.db.processes.create_index("created_at")
-            
-            # Índices para consultas
-            self.db.queries.create_index([("created_at", -1)])
-            self.db.queries.create_index("user_id")
-            self.db.queries.create_index("query_type")
-            
+            for collection, keys, options in INDEXES:
+                self.db[collection].create_index(keys, **options)
             logger.info("✅ Índices do MongoDB criados/verificados!")
-            
         except Exception as e:
             logger.error(f"❌ Erro ao criar índices: {e}")
+            self.release_bootstrap('indexes')
+
+    def claim_bootstrap(self, step: str, version: str) -> bool:
+        """Reservar uma etapa de inicialização (índices, comandos, webhook) para este processo.
+
+        Retorna True para exatamente um processo por versão: os demais workers e
+        instâncias pulam a etapa, que só volta a rodar quando a versão muda.
+        """
+        try:
+            self.db.bootstrap.update_one(
+                {'_id': step, 'version': {'$ne': version}},
+                {'$set': {'version': version, 'claimed_at': datetime.utcnow(), 'pid': os.getpid()}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Já existe com a mesma versão: outro processo executou (ou está executando) a etapa
+            return False
+        except Exception as e:
+            logger.warning(f"Não foi possível reservar a etapa de inicialização {step}: {e}")
+            return True
+
+    def release_bootstrap(self, step: str):
+        """Desfazer a reserva de uma etapa que falhou, para que o próximo processo tente de novo"""
+        try:
+            self.db.bootstrap.delete_one({'_id': step})
+        except Exception as e:
+            logger.warning(f"Não foi possível liberar a etapa de inicialização {step}: {e}")
 
+    def ping(self) -> float:
+        """Latência de um ping ao servidor, em segundos (exceção se estiver fora do ar)"""
+        if self.client is None:
+            raise ConnectionFailure("MongoDB não conectado")
+        started = time.perf_counter()
+        self.client.admin.command('ping')
+        return time.perf_counter() - started
+    
     def get_collection(self, collection_name: str):
         """Obter uma coleção do MongoDB"""
         if not self.is_connected:
             self.connect()
-        return self.db[collection_name] if self.db else None
+        return self.db[collection_name] if self.db is not None else None
+
+    def supports_transactions(self) -> bool:
+        """Verificar se o servidor aceita transações (replica set ou mongos)"""
+        if self._supports_transactions is None:
+            try:
+                hello = self.client.admin.command('hello')
+                self._supports_transactions = bool(hello.get('setName') or hello.get('msg') == 'isdbgrid')
+            except Exception as e:
+                logger.warning(f"Não foi possível verificar suporte a transações: {e}")
+                self._supports_transactions = False
+        return self._supports_transactions
+
+    def run_in_transaction(self, callback: Callable[[Any], Any]) -> Any:
+        """Executar callback(session) dentro de uma transação quando disponível"""
+        if not self.is_connected or not self.supports_transactions():
+            return callback(None)
+        with self.client.start_session() as session:
+            return session.with_transaction(callback)
 
     def insert_user(self, user_data: Dict) -> bool:
         """Inserir ou atualizar usuário"""
         try:
             users = self.get_collection('users')
-            if users:
+            if users is not None:
                 users.update_one(
                     {'user_id': user_data['user_id']},
                     {
                         '$set': {
                             **user_data, 
                             'updated_at': datetime.utcnow(),
-                            'last_activity': datetime.utcnow()
+                            'last_activity': datetime.utcnow(),
+                            # Quem voltou a falar com o bot desbloqueou: volta a receber broadcasts
+                            'is_active': True
                         },
                         '$setOnInsert': {
-                            'created_at': datetime.utcnow(),
-                            'is_active': True
+                            'created_at': datetime.utcnow()
                         }
                     },
                     upsert=True
@@ -106,7 +210,7 @@ class MongoDBManager:
         """Obter usuário por ID"""
         try:
             users = self.get_collection('users')
-            return users.find_one({'user_id': user_id}) if users else None
+            return users.find_one({'user_id': user_id}) if users is not None else None
         except Exception as e:
             logger.error(f"Erro ao buscar usuário: {e}")
             return None
@@ -115,7 +219,7 @@ class MongoDBManager:
         """Log de consultas para analytics"""
         try:
             queries = self.get_collection('queries')
-            if queries:
+            if queries is not None:
                 queries.insert_one({
                     'user_id': user_id,
                     'query_type': query_type,
@@ -134,7 +238,7 @@ class MongoDBManager:
         """Obter estatísticas do usuário"""
         try:
             queries = self.get_collection('queries')
-            if queries:
+            if queries is not None:
                 total_queries = queries.count_documents({'user_id': user_id})
                 today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
                 today_queries = queries.count_documents({
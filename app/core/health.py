@@ -0,0 +1,183 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+from app.core.config import Config
+from app.core.database import mongo_db
+
+logger = logging.getLogger(__name__)
+
+class HealthMonitor:
+    """Sinais de saúde do processo, medidos em segundo plano e servidos do último resultado.
+
+    Cada sonda roda no seu intervalo e guarda o resultado; /health, /ready e
+    /live só leem esse snapshot, então uma verificação de saúde nunca consulta
+    o MongoDB nem o Telegram. A latência do loop de eventos é medida por um
+    amostrador próprio (atraso de um sleep curto em relação ao esperado).
+
+    Módulos registram as suas sondas com register_probe (ex.: circuitos dos
+    provedores de IA) e as filas com gravação adiada com register_queue.
+    """
+
+    def __init__(self, interval: float = 15.0, timeout: float = 5.0, lag_sample: float = 0.5):
+        self.interval = interval
+        self.timeout = timeout
+        self.lag_sample = lag_sample
+        # nome -> (sonda, crítica, intervalo)
+        self.probes: Dict[str, tuple] = {}
+        # nome -> (tamanho, limite, bloqueante)
+        self.queues: Dict[str, tuple] = {}
+        self.results: Dict[str, Dict] = {}
+        self.loop_lag = 0.0
+        self.loop_lag_max = 0.0
+        self.last_tick: Optional[float] = None
+        self.started_at: Optional[float] = None
+        self.application = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.tasks: list = []
+
+    def register_probe(self, name: str, probe: Callable[[], Any], critical: bool = False, interval: Optional[float] = None):
+        """Registrar uma sonda (função ou corrotina) que devolve um dict com 'ok'"""
+        self.probes[name] = (probe, critical, interval or self.interval)
+        if self.loop is not None:
+            # Módulo carregado depois da inicialização (o import pode rodar em outra thread)
+            self.loop.call_soon_threadsafe(self._spawn_probe, name)
+
+    def register_queue(self, name: str, size: Callable[[], int], limit: Optional[int] = None, blocking: bool = False):
+        """Registrar uma fila de gravação adiada; `blocking` para contagens que consultam o banco"""
+        self.queues[name] = (size, limit, blocking)
+
+    # Sondas embutidas
+
+    def _probe_loop(self) -> Dict:
+        lag, self.loop_lag_max = self.loop_lag_max, self.loop_lag
+        return {'ok': lag < Config.HEALTH_MAX_LOOP_LAG, 'lag_ms': round(self.loop_lag * 1000, 1), 'max_lag_ms': round(lag * 1000, 1)}
+
+    async def _probe_mongo(self) -> Dict:
+        latency = await asyncio.to_thread(mongo_db.ping)
+        return {'ok': True, 'latency_ms': round(latency * 1000, 1)}
+
+    def _probe_updates(self) -> Dict:
+        application = self.application
+        queued = application.update_queue.qsize()
+        in_flight = getattr(application.update_processor, 'in_flight', 0)
+        pending = queued + in_flight
+        return {'ok': pending < Config.MAX_PENDING_UPDATES, 'queued': queued, 'in_flight': in_flight, 'pending': pending}
+
+    async def _probe_webhook(self) -> Dict:
+        info = await self.application.bot.get_webhook_info()
+        return {
+            'ok': not info.last_error_date or (time.time() - info.last_error_date.timestamp()) > 600,
+            'pending_update_count': info.pending_update_count,
+            'last_error': info.last_error_message
+        }
+
+    async def _probe_queues(self) -> Dict:
+        depths, ok = {}, True
+        for name, (size, limit, blocking) in self.queues.items():
+            try:
+                depth = await asyncio.to_thread(size) if blocking else size()
+            except Exception as e:
+                logger.debug(f"Profundidade da fila {name} indisponível: {e}")
+                depths[name], ok = None, False
+                continue
+            depths[name] = depth
+            if limit is not None and depth >= limit:
+                ok = False
+        return {'ok': ok, **depths}
+
+    # Execução em segundo plano
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_sample)
+            self.last_tick = loop.time()
+            self.loop_lag = max(0.0, self.last_tick - started - self.lag_sample)
+            self.loop_lag_max = max(self.loop_lag_max, self.loop_lag)
+
+    async def _run_probe(self, name: str, probe: Callable, critical: bool) -> None:
+        started = time.perf_counter()
+        try:
+            result = probe()
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, self.timeout)
+        except Exception as e:
+            result = {'ok': False, 'error': str(e) or type(e).__name__}
+        result['critical'] = critical
+        result['checked_at'] = time.time()
+        result['probe_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if self.results.get(name, {}).get('ok', True) and not result['ok']:
+            logger.warning(f"⚠️ Sonda de saúde {name} falhou: {result}")
+        self.results[name] = result
+
+    def _spawn_probe(self, name: str):
+        self.tasks.append(self.loop.create_task(self._probe_every(name)))
+    
+    async def _probe_every(self, name: str):
+        probe, critical, interval = self.probes[name]
+        while True:
+            await self._run_probe(name, probe, critical)
+            await asyncio.sleep(interval)
+
+    async def start(self, application):
+        """Iniciar o amostrador do loop e as sondas (cada uma no seu intervalo)"""
+        self.application = application
+        self.started_at = time.time()
+        self.register_probe('loop', self._probe_loop, critical=False)
+        self.register_probe('mongo', self._probe_mongo, critical=True)
+        self.register_probe('updates', self._probe_updates, critical=True)
+        self.register_probe('webhook', self._probe_webhook, interval=60)
+        self.register_probe('queues', self._probe_queues)
+        if hasattr(application.persistence, 'pending_count'):
+            self.register_queue('persistence', application.persistence.pending_count, application.persistence.max_pending * 10)
+        self.loop = asyncio.get_running_loop()
+        self.tasks = [self.loop.create_task(self._sample_lag())]
+        for name in self.probes:
+            self._spawn_probe(name)
+
+    async def stop(self, application=None):
+        self.loop = None
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    # Respostas dos endpoints (só leem o snapshot)
+
+    def live(self) -> Dict:
+        """Processo vivo: loop de eventos respondendo e tarefas de monitoramento rodando"""
+        now = asyncio.get_running_loop().time()
+        stalled = self.last_tick is None or now - self.last_tick > max(Config.HEALTH_LIVE_MAX_LAG, self.lag_sample * 4)
+        dead = [task.get_coro().__name__ for task in self.tasks if task.done()]
+        return {'ok': self.started_at is not None and not stalled and not dead,
+                'loop_lag_ms': round(self.loop_lag * 1000, 1), 'stopped_tasks': dead}
+
+    def ready(self) -> Dict:
+        """Pronto para receber updates: aplicação rodando, sondas críticas em dia e passando"""
+        now = time.time()
+        failing = []
+        for name, (_, critical, interval) in self.probes.items():
+            if not critical:
+                continue
+            result = self.results.get(name)
+            if result is None or not result['ok'] or now - result['checked_at'] > interval * 3 + self.timeout:
+                failing.append(name)
+        running = self.application is not None and self.application.running
+        return {'ok': running and not failing, 'running': running, 'failing': failing}
+
+    def health(self) -> Dict:
+        """Relatório completo: ok, degraded (sonda não crítica falhando) ou fail (não pronto)"""
+        ready = self.ready()
+        degraded = [name for name, result in self.results.items() if not result['ok'] and not result['critical']]
+        status = 'fail' if not ready['ok'] or not self.live()['ok'] else 'degraded' if degraded else 'ok'
+        return {
+            'status': status,
+            'uptime_s': round(time.time() - self.started_at) if self.started_at else 0,
+            'failing': ready['failing'] + degraded,
+            'probes': self.results
+        }
+
+# Instância global do monitor de saúde
+health_monitor = HealthMonitor(Config.HEALTH_PROBE_INTERVAL, Config.HEALTH_PROBE_TIMEOUT)
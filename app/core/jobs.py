@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from pymongo import ReturnDocument
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden
+from app.core.config import Config
+from app.core.database import mongo_db
+from app.core.health import health_monitor
+from app.core.registry import module_registry
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+class JobRetry(Exception):
+    """Falha transitória (ex.: nenhuma API de IA respondeu): o job volta para a fila com backoff"""
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Dividir em partes de até `limit` caracteres, preferindo quebras de parágrafo/linha"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n\n', 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind('\n', 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text:
+        parts.append(text)
+    return parts
+
+class DurableJobQueue:
+    """Fila de jobs persistida no MongoDB com leases, workers concorrentes e retry com backoff.
+
+    Estados: queued -> running -> delivering -> done (ou failed). Um job cujo lease
+    expira (instância reiniciada no meio da execução) é reassumido por outro worker;
+    se o resultado já foi gerado, apenas a entrega é refeita.
+    """
+
+    def __init__(self, workers: int = 4, lease_seconds: int = 120, max_attempts: int = 5,
+                 poll_interval: float = 5.0, backoff_base: float = 10.0, backoff_max: float = 600.0):
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.handlers: Dict[str, Callable[..., Awaitable[Dict]]] = {}
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.tasks: List[asyncio.Task] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.application = None
+
+    def register(self, kind: str, handler: Callable[..., Awaitable[Dict]]):
+        """Registrar o executor de um tipo de job: async handler(job, progress) -> resultado"""
+        self.handlers[kind] = handler
+
+    def _collection(self):
+        return mongo_db.get_collection('jobs')
+
+    def _insert(self, job: Dict):
+        self._collection().insert_one(job)
+
+    async def enqueue(self, kind: str, payload: Dict, user_id: int, chat_id: int,
+                      waiting_text: str = "⏳ Sua solicitação entrou na fila. Você receberá a resposta aqui.") -> Optional[str]:
+        """Persistir um job e avisar o usuário; retorna o id (None se não foi possível enfileirar)"""
+        now = datetime.utcnow()
+        job = {
+            '_id': uuid.uuid4().hex,
+            'kind': kind,
+            'payload': payload,
+            'user_id': user_id,
+            'chat_id': chat_id,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': self.max_attempts,
+            'run_at': now,
+            'lease_until': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        try:
+            message = await self.application.bot.send_message(chat_id, waiting_text)
+            job['progress_message_id'] = message.message_id
+            await asyncio.to_thread(self._insert, job)
+        except Exception as e:
+            logger.error(f"Erro ao enfileirar job {kind}: {e}")
+            return None
+
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return job['_id']
+
+    def _claim(self) -> Optional[Dict]:
+        """Reivindicar atomicamente o próximo job disponível (ou com lease vencido)"""
+        now = datetime.utcnow()
+        return self._collection().find_one_and_update(
+            {'$or': [
+                {'status': 'queued', 'run_at': {'$lte': now}},
+                {'status': {'$in': ['running', 'delivering']}, 'lease_until': {'$lt': now}}
+            ]},
+            {
+                '$set': {
+                    'status': 'running',
+                    'lease_until': now + timedelta(seconds=self.lease_seconds),
+                    'worker_id': self.worker_id,
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('run_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _update_owned(self, job: Dict, changes: Dict) -> bool:
+        """Atualizar o job somente se este worker ainda for o dono do lease"""
+        result = self._collection().update_one(
+            {'_id': job['_id'], 'worker_id': self.worker_id},
+            {'$set': {**changes, 'updated_at': datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+
+    async def _renew_lease(self, job: Dict):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(self._update_owned, job, {
+                'lease_until': datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            })
+
+    async def _edit_progress(self, job: Dict, text: str):
+        if not job.get('progress_message_id'):
+            return
+        try:
+            await self.application.bot.edit_message_text(text, chat_id=job['chat_id'], message_id=job['progress_message_id'])
+        except BadRequest as e:
+            logger.debug(f"Não foi possível atualizar progresso do job {job['_id']}: {e}")
+
+    async def _send(self, chat_id: int, text: str, reply_markup=None):
+        try:
+            await self.application.bot.send_message(chat_id, text, parse_mode='Markdown', reply_markup=reply_markup)
+        except BadRequest:
+            # Markdown gerado pela IA nem sempre é válido: reenviar como texto simples
+            await self.application.bot.send_message(chat_id, text, reply_markup=reply_markup)
+
+    async def _deliver(self, job: Dict, result: Dict):
+        """Entregar o resultado dividido em mensagens, seguido dos botões de próximo passo
+
+        Cada parte enviada é registrada no job (delivered_parts): uma nova
+        tentativa retoma da primeira parte que ainda não chegou ao usuário.
+        """
+        delivered = job.get('delivered_parts', 0)
+        if not delivered:
+            await self._edit_progress(job, "✅ Pronto! Enviando a resposta...")
+        messages = [(part, None) for part in split_message(result['text'])]
+        if result.get('follow_up'):
+            buttons = result.get('buttons') or []
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton(label, callback_data=data)] for label, data in buttons
+            ]) if buttons else None
+            messages.append((result['follow_up'], keyboard))
+        for index, (text, keyboard) in enumerate(messages[delivered:], start=delivered):
+            await self._send(job['chat_id'], text, reply_markup=keyboard)
+            if not await asyncio.to_thread(self._update_owned, job, {'delivered_parts': index + 1}):
+                # Lease perdido: o worker que reivindicou o job continua a entrega
+                logger.warning(f"Job {job['_id']} reivindicado por outro worker durante a entrega")
+                return
+
+    @staticmethod
+    def undeliverable(error: Exception) -> bool:
+        """Usuário bloqueou o bot ou o chat não existe mais: repetir não adianta"""
+        return isinstance(error, Forbidden) or (isinstance(error, BadRequest) and 'chat not found' in str(error).lower())
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _run_job(self, job: Dict):
+        renewer = asyncio.get_running_loop().create_task(self._renew_lease(job))
+        try:
+            result = job.get('result')
+            if result is None:
+                if job['kind'] not in self.handlers:
+                    # Módulo ainda não carregado (carregamento sob demanda): ele registra o executor ao importar
+                    await module_registry.load_for_job(job['kind'])
+                handler = self.handlers.get(job['kind'])
+                if handler is None:
+                    raise RuntimeError(f"tipo de job desconhecido: {job['kind']}")
+
+                attempt = f" (tentativa {job['attempts']})" if job['attempts'] > 1 else ""
+                await self._edit_progress(job, f"⚙️ Gerando sua resposta{attempt}...")
+
+                async def progress(text: str):
+                    await self._edit_progress(job, text)
+
+                result = await handler(job, progress)
+                # Resultado persistido antes da entrega: um reinício não refaz a geração
+                await asyncio.to_thread(self._update_owned, job, {'status': 'delivering', 'result': result})
+
+            await self._deliver(job, result)
+            await asyncio.to_thread(self._update_owned, job, {
+                'status': 'done', 'lease_until': None, 'finished_at': datetime.utcnow()
+            })
+
+        except Exception as e:
+            if self.undeliverable(e):
+                logger.info(f"Job {job['_id']} ({job['kind']}) sem destinatário: {e}")
+                await asyncio.to_thread(self._update_owned, job, {
+                    'status': 'undeliverable', 'error': str(e), 'lease_until': None, 'finished_at': datetime.utcnow()
+                })
+            elif job['attempts'] >= job.get('max_attempts', self.max_attempts):
+                logger.error(f"Job {job['_id']} ({job['kind']}) falhou definitivamente: {e}")
+                await asyncio.to_thread(self._update_owned, job, {
+                    'status': 'failed', 'error': str(e), 'lease_until': None, 'finished_at': datetime.utcnow()
+                })
+                await self._edit_progress(job, "❌ Não foi possível concluir sua solicitação. Tente novamente mais tarde.")
+            else:
+                delay = self.backoff(job['attempts'])
+                logger.warning(f"Job {job['_id']} ({job['kind']}) falhou, nova tentativa em {delay:.0f}s: {e}")
+                await asyncio.to_thread(self._update_owned, job, {
+                    'status': 'queued', 'error': str(e), 'lease_until': None,
+                    'run_at': datetime.utcnow() + timedelta(seconds=delay)
+                })
+                await self._edit_progress(job, "⏳ Serviço de IA instável, tentando novamente em instantes...")
+        finally:
+            renewer.cancel()
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.error(f"Erro ao buscar jobs: {e}")
+                job = None
+
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run_job(job)
+            except Exception:
+                # Falha no próprio tratamento de erro (MongoDB, rede): o worker continua e o
+                # lease vencido devolve o job à fila
+                logger.exception(f"Erro inesperado no worker {number} ao processar o job {job['_id']}")
+
+    def pending(self) -> int:
+        return self._collection().count_documents({'status': {'$in': ['queued', 'running', 'delivering']}})
+
+    async def start(self, application=None):
+        self.application = application
+        self.wakeup = asyncio.Event()
+        if not self.tasks:
+            loop = asyncio.get_running_loop()
+            self.tasks = [loop.create_task(self._worker(i)) for i in range(self.workers)]
+            logger.info(f"⚙️ Fila de jobs iniciada com {self.workers} worker(s)")
+
+    async def stop(self, application=None):
+        # Jobs em execução são retomados por outra instância quando o lease vencer
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+# Instância global da fila de jobs
+job_queue = DurableJobQueue(Config.JOB_WORKERS, Config.JOB_LEASE_SECONDS, Config.JOB_MAX_ATTEMPTS)
+
+module_registry.register_startup(job_queue.start)
+module_registry.register_shutdown(job_queue.stop)
+# Contagem no MongoDB: roda fora do loop, no intervalo das sondas de saúde
+health_monitor.register_queue('jobs', job_queue.pending, blocking=True)
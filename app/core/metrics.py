@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+from pymongo import monitoring
+from telegram.ext import ApplicationHandlerStop
+from app.core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos buckets: de operações no MongoDB a gerações longas de IA
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class CounterChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self, lock: Optional[threading.Lock]):
+        self.value = 0.0
+        self.lock = lock
+
+    def inc(self, amount: float = 1.0):
+        if self.lock is None:
+            self.value += amount
+            return
+        with self.lock:
+            self.value += amount
+
+class HistogramChild:
+    __slots__ = ('bounds', 'buckets', 'sum', 'count', 'lock')
+
+    def __init__(self, bounds: Tuple[float, ...], lock: Optional[threading.Lock]):
+        self.bounds = bounds
+        # Contagem por bucket (não cumulativa; acumulada só na exposição) + o bucket +Inf
+        self.buckets = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = lock
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        if self.lock is None:
+            self.buckets[index] += 1
+            self.sum += value
+            self.count += 1
+            return
+        with self.lock:
+            self.buckets[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Metric:
+    """Métrica com rótulos; `labels(...)` devolve o filho, que pode ser guardado para o caminho quente"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), threadsafe: bool = False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Sem trava para métricas atualizadas só no loop de eventos; com trava para as de threads (pymongo)
+        self.lock = threading.Lock() if threadsafe else None
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: esperados rótulos {self.labelnames}, recebidos {key}")
+            child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return CounterChild(self.lock)
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, threadsafe: bool = False):
+        super().__init__(name, documentation, labelnames, threadsafe)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.bounds, self.lock)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float('inf'),), list(child.buckets)):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            extra = f'le="{le}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, extra)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(child.sum)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+class MetricsRegistry:
+    """Métricas do processo no formato texto do Prometheus (servidas em /metrics pelo webhook).
+
+    Cada worker tem as suas; com WEB_CONCURRENCY > 1 cada coleta vê o worker
+    que atendeu a requisição (o `pid` vai em juristbot_process_info).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics: Dict[str, Metric] = {}
+        self.started_at = time.time()
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), threadsafe: bool = False) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, documentation, labelnames, threadsafe))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS, threadsafe: bool = False) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets, threadsafe))
+
+    def render(self) -> str:
+        lines = [
+            "# HELP juristbot_process_info Processo que respondeu a coleta",
+            "# TYPE juristbot_process_info gauge",
+            f'juristbot_process_info{{pid="{os.getpid()}"}} 1',
+            "# HELP juristbot_process_start_time_seconds Início do processo (epoch)",
+            "# TYPE juristbot_process_start_time_seconds gauge",
+            f"juristbot_process_start_time_seconds {_number(self.started_at)}",
+        ]
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, callback: Callable, handler: str, kind: str) -> Callable:
+        """Envolver um callback de handler: latência (o _count é o número de chamadas) e erros"""
+        if not self.enabled or getattr(callback, '__instrumented__', False):
+            return callback
+        duration = handler_duration.labels(handler, kind)
+        errors = handler_errors.labels(handler, kind)
+        clock = time.perf_counter
+
+        async def instrumented(update, context):
+            started = clock()
+            try:
+                return await callback(update, context)
+            except ApplicationHandlerStop:
+                raise
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(clock() - started)
+
+        instrumented.__instrumented__ = True
+        instrumented.__wrapped__ = callback
+        instrumented.__name__ = getattr(callback, '__name__', 'callback')
+        return instrumented
+
+# Instância global das métricas
+metrics = MetricsRegistry(Config.METRICS_ENABLED)
+
+handler_duration = metrics.histogram(
+    'juristbot_handler_duration_seconds', "Duração dos handlers por comando/rota", ('handler', 'kind'))
+handler_errors = metrics.counter(
+    'juristbot_handler_errors_total', "Exceções nos handlers por comando/rota", ('handler', 'kind'))
+mongo_duration = metrics.histogram(
+    'juristbot_mongo_command_duration_seconds', "Duração dos comandos do MongoDB", ('command', 'collection'), threadsafe=True)
+mongo_errors = metrics.counter(
+    'juristbot_mongo_command_errors_total', "Comandos do MongoDB que falharam", ('command', 'collection'), threadsafe=True)
+ai_duration = metrics.histogram(
+    'juristbot_ai_request_duration_seconds', "Duração das chamadas aos provedores de IA", ('provider',))
+ai_requests = metrics.counter(
+    'juristbot_ai_requests_total', "Chamadas aos provedores de IA por resultado (ok, error, skipped)", ('provider', 'outcome'))
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Listener do pymongo: duração e falhas de cada comando, por coleção (roda nas threads do driver)"""
+
+    def __init__(self):
+        # (conexão, request_id) -> coleção, do started até o succeeded/failed
+        self.collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        self.collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ''
+
+    def _finish(self, event, failed: bool):
+        collection = self.collections.pop((event.connection_id, event.request_id), '')
+        mongo_duration.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        if failed:
+            mongo_errors.labels(event.command_name, collection).inc()
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+mongo_command_metrics = MongoCommandMetrics()
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict, defaultdict
+from copy import deepcopy
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from bson.errors import InvalidDocument
+from pymongo import DeleteOne, ReplaceOne
+from telegram import Update
+from telegram.ext import BasePersistence, ContextTypes, ConversationHandler, PersistenceInput
+from app.core.database import mongo_db
+
+logger = logging.getLogger(__name__)
+
+# Coleções usadas pela persistência
+USER_DATA, CHAT_DATA, BOT_DATA, CONVERSATIONS = 'ptb_user_data', 'ptb_chat_data', 'ptb_bot_data', 'ptb_conversations'
+
+def conversation_id(name: str, key: Tuple[int, ...]) -> str:
+    return f"{name}:{json.dumps(list(key))}"
+
+def remember(cache: OrderedDict, key, value, limit: int):
+    """Guardar em um OrderedDict limitado, descartando os menos usados"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > limit:
+        cache.popitem(last=False)
+
+def merge_stored(data: Dict, stored: Optional[Dict]):
+    """Valores gravados antes deste update não sobrescrevem o que já mudou em memória"""
+    for key, value in (stored or {}).items():
+        data.setdefault(key, value)
+
+class MongoPersistence(BasePersistence):
+    """Persistência do python-telegram-bot no MongoDB.
+
+    user_data e chat_data são carregados sob demanda, na primeira vez que um
+    usuário/chat aparece (refresh_*), em vez de tudo na inicialização; em chats
+    privados os dois vêm na mesma ida ao banco. Os estados
+    de conversa ativos são carregados no boot, como exige o ConversationHandler.
+
+    As gravações entregues pela Application a cada `update_interval` são
+    acumuladas por documento (a última versão vence) e enviadas em um
+    bulk_write por coleção, logo após a rodada de atualização.
+
+    Com `shared=True` (vários workers/instâncias) os dados são relidos a cada
+    update e o estado das conversas é sincronizado por sync_conversations,
+    já que o próximo update do usuário pode ter sido tratado por outro processo.
+    A releitura nunca descarta mudanças locais ainda não gravadas: dados que
+    diferem da última versão lida/entregue, ou com gravação pendente, ficam.
+    """
+
+    def __init__(self, update_interval: float = 10, flush_delay: float = 0.5, max_pending: int = 1000,
+                 shared: bool = False, max_tracked: int = 100000):
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        self.shared = shared
+        self.flush_delay = flush_delay
+        self.max_pending = max_pending
+        # Limite dos controles por usuário/chat (LRU): sem ele crescem com cada usuário já visto
+        self.max_tracked = max_tracked
+        # coleção -> _id -> operação pendente (ReplaceOne/DeleteOne)
+        self.pending: Dict[str, Dict] = defaultdict(dict)
+        # Lote sendo gravado agora (já fora de pending, ainda não no banco)
+        self.flushing: Dict[str, Dict] = {}
+        # shared: última versão de cada user_data/chat_data igual à do banco ou já entregue para gravação
+        # (fora do LRU conta como não alterado: quem sai do LRU está inativo há muito mais que update_interval)
+        self.synced: Dict[str, OrderedDict] = {USER_DATA: OrderedDict(), CHAT_DATA: OrderedDict()}
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_lock = asyncio.Lock()
+        self.loaded_users: OrderedDict = OrderedDict()
+        self.loaded_chats: OrderedDict = OrderedDict()
+        # user_data lido junto com o chat privado, consumido pelo refresh_user_data do mesmo update
+        self.prefetched: OrderedDict = OrderedDict()
+        self.bot_data: Optional[Dict] = None
+        self.warned_private_api = False
+
+    # Gravação em lote
+
+    def pending_count(self) -> int:
+        return sum(len(operations) for operations in self.pending.values())
+
+    def _stage(self, collection: str, doc_id, operation):
+        self.pending[collection][doc_id] = operation
+        if self.pending_count() >= self.max_pending:
+            self._schedule_flush(0)
+        else:
+            self._schedule_flush(self.flush_delay)
+
+    def _stage_replace(self, collection: str, doc_id, fields: Dict):
+        document = {'_id': doc_id, **fields, 'updated_at': datetime.utcnow()}
+        self._stage(collection, doc_id, ReplaceOne({'_id': doc_id}, document, upsert=True))
+
+    def _stage_delete(self, collection: str, doc_id):
+        self._stage(collection, doc_id, DeleteOne({'_id': doc_id}))
+
+    def _schedule_flush(self, delay: float):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self._delayed_flush(delay))
+
+    async def _delayed_flush(self, delay: float):
+        # A Application entrega as mudanças de uma rodada em paralelo: esperar um pouco junta todas
+        await asyncio.sleep(delay)
+        await self._flush_pending()
+
+    def _write(self, batches: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Enviar um bulk_write por coleção; devolve o que não pôde ser gravado"""
+        failed = {}
+        for name, operations in batches.items():
+            collection = mongo_db.get_collection(name)
+            if collection is None:
+                failed[name] = operations
+                continue
+            try:
+                collection.bulk_write(list(operations.values()), ordered=False)
+            except InvalidDocument:
+                failed_operations = self._write_each(collection, name, operations)
+                if failed_operations:
+                    failed[name] = failed_operations
+            except Exception as e:
+                logger.error(f"Erro ao gravar persistência em {name}: {e}")
+                failed[name] = operations
+        return failed
+
+    def _write_each(self, collection, name: str, operations: Dict) -> Dict:
+        """Um documento que o BSON não codifica derruba o lote: gravar um a um e descartar esses"""
+        failed = {}
+        for doc_id, operation in operations.items():
+            try:
+                collection.bulk_write([operation])
+            except InvalidDocument as e:
+                # Repetir não adianta (ex.: user_data com chaves int): descartado, não volta à fila
+                logger.error(f"❌ Persistência de {name}/{doc_id} descartada, documento inválido: {e}")
+            except Exception as e:
+                logger.error(f"Erro ao gravar persistência em {name}/{doc_id}: {e}")
+                failed[doc_id] = operation
+        return failed
+
+    async def _flush_pending(self):
+        async with self.flush_lock:
+            if not any(self.pending.values()):
+                return
+            batches, self.pending = self.pending, defaultdict(dict)
+            self.flushing = batches
+            try:
+                failed = await asyncio.to_thread(self._write, batches)
+            finally:
+                self.flushing = {}
+            # Devolver à fila o que falhou, sem sobrescrever versões mais novas
+            for name, operations in failed.items():
+                for doc_id, operation in operations.items():
+                    self.pending[name].setdefault(doc_id, operation)
+
+    async def flush(self) -> None:
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+        await self._flush_pending()
+
+    # Leitura sob demanda
+
+    def _find_data(self, name: str, doc_id) -> Optional[Dict]:
+        collection = mongo_db.get_collection(name)
+        if collection is None:
+            return None
+        document = collection.find_one({'_id': doc_id}, {'data': 1})
+        return document['data'] if document else None
+
+    def _load_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        collection = mongo_db.get_collection(CONVERSATIONS)
+        if collection is None:
+            return {}
+        return {
+            tuple(document['key']): document['state']
+            for document in collection.find({'name': name}, {'key': 1, 'state': 1})
+        }
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        if self.bot_data is None:
+            self.bot_data = await asyncio.to_thread(self._find_data, BOT_DATA, 'bot_data') or {}
+        return deepcopy(self.bot_data)
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        return await asyncio.to_thread(self._load_conversations, name)
+
+    def _find_private(self, chat_id: int) -> Tuple[Optional[Dict], Optional[Dict]]:
+        return self._find_data(CHAT_DATA, chat_id), self._find_data(USER_DATA, chat_id)
+
+    def _dirty(self, name: str, doc_id: int, data: Dict) -> bool:
+        """Mudança local ainda não gravada (mais nova que a do banco)"""
+        if doc_id in self.pending[name] or doc_id in self.flushing.get(name, {}):
+            return True
+        # Mudou desde a última leitura/entrega: a Application só entrega na próxima rodada de update_interval
+        synced = self.synced[name].get(doc_id)
+        return synced is not None and data != synced
+
+    async def _refresh_shared(self, name: str, doc_id: int, data: Dict):
+        stored = await asyncio.to_thread(self._find_data, name, doc_id)
+        # Verificado depois da leitura, sem await até o fim: nada muda os dados entre a checagem e a troca
+        if self._dirty(name, doc_id, data):
+            return
+        data.clear()
+        data.update(stored or {})
+        remember(self.synced[name], doc_id, deepcopy(stored or {}), self.max_tracked)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        if self.shared:
+            await self._refresh_shared(CHAT_DATA, chat_id, chat_data)
+            return
+        if chat_id in self.loaded_chats:
+            self.loaded_chats.move_to_end(chat_id)
+            return
+        if chat_id > 0 and chat_id not in self.loaded_users:
+            # Chat privado (id do chat = id do usuário): carregar os dois em uma ida ao banco,
+            # já que refresh_user_data vem logo em seguida
+            stored, prefetched = await asyncio.to_thread(self._find_private, chat_id)
+            # Limite pequeno: a entrada só vive até o refresh_user_data logo em seguida
+            remember(self.prefetched, chat_id, prefetched, 1000)
+        else:
+            stored = await asyncio.to_thread(self._find_data, CHAT_DATA, chat_id)
+        merge_stored(chat_data, stored)
+        remember(self.loaded_chats, chat_id, True, self.max_tracked)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        if self.shared:
+            await self._refresh_shared(USER_DATA, user_id, user_data)
+            return
+        if user_id in self.loaded_users:
+            self.loaded_users.move_to_end(user_id)
+            return
+        if user_id in self.prefetched:
+            stored = self.prefetched.pop(user_id)
+        else:
+            stored = await asyncio.to_thread(self._find_data, USER_DATA, user_id)
+        merge_stored(user_data, stored)
+        remember(self.loaded_users, user_id, True, self.max_tracked)
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    def _find_states(self, key: Tuple[int, ...]) -> Dict[str, object]:
+        collection = mongo_db.get_collection(CONVERSATIONS)
+        if collection is None:
+            return {}
+        return {document['name']: document['state'] for document in collection.find({'key': list(key)}, {'name': 1, 'state': 1})}
+
+    @staticmethod
+    def _tracking_api(handler: ConversationHandler) -> bool:
+        conversations = getattr(handler, '_conversations', None)
+        return all(hasattr(conversations, name) for name in ('_write_access_keys', 'update_no_track', 'data'))
+
+    async def sync_conversations(self, update: object, context: ContextTypes.DEFAULT_TYPE):
+        """Antes dos handlers (grupo -1000): trazer o estado gravado por outro worker"""
+        if not isinstance(update, Update) or not update.effective_chat or not update.effective_user:
+            return
+        handlers = [
+            handler for group in context.application.handlers.values() for handler in group
+            if isinstance(handler, ConversationHandler) and handler.persistent
+            and handler.per_chat and handler.per_user and not handler.per_message
+        ]
+        if not handlers:
+            return
+
+        # O PTB não expõe API para estado externo: o TrackingDict da conversa é ajustado sem
+        # marcar escrita, para não regravar o estado lido. Atributos privados do PTB 20.7
+        # (fixado em requirements.txt); em outra versão a sincronização é desligada com aviso
+        if not all(self._tracking_api(handler) for handler in handlers):
+            if not self.warned_private_api:
+                self.warned_private_api = True
+                logger.warning("⚠️ Versão do python-telegram-bot sem a API interna esperada: "
+                               "estado das conversas não é sincronizado entre workers")
+            return
+
+        key = (update.effective_chat.id, update.effective_user.id)
+        states = await asyncio.to_thread(self._find_states, key)
+        for handler in handlers:
+            conversations = handler._conversations
+            if key in conversations._write_access_keys or conversation_id(handler.name, key) in self.pending[CONVERSATIONS]:
+                continue  # mudança local ainda não gravada é a mais recente
+            if handler.name in states:
+                conversations.update_no_track({key: states[handler.name]})
+            else:
+                conversations.data.pop(key, None)
+
+    # Atualizações entregues pela Application
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        if self.shared:
+            # data já é uma cópia feita pela Application
+            remember(self.synced[USER_DATA], user_id, data, self.max_tracked)
+        self._stage_replace(USER_DATA, user_id, {'data': data})
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        if self.shared:
+            remember(self.synced[CHAT_DATA], chat_id, data, self.max_tracked)
+        self._stage_replace(CHAT_DATA, chat_id, {'data': data})
+
+    async def update_bot_data(self, data: Dict) -> None:
+        # Chamado a cada rodada mesmo sem mudanças
+        if data == self.bot_data:
+            return
+        self.bot_data = deepcopy(data)
+        self._stage_replace(BOT_DATA, 'bot_data', {'data': data})
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        doc_id = conversation_id(name, key)
+        if new_state is None:
+            self._stage_delete(CONVERSATIONS, doc_id)
+        else:
+            self._stage_replace(CONVERSATIONS, doc_id, {'name': name, 'key': list(key), 'state': new_state})
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self.loaded_users.pop(user_id, None)
+        self.synced[USER_DATA].pop(user_id, None)
+        self._stage_delete(USER_DATA, user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self.loaded_chats.pop(chat_id, None)
+        self.synced[CHAT_DATA].pop(chat_id, None)
+        self._stage_delete(CHAT_DATA, chat_id)
@@ -0,0 +1,34 @@
+import logging
+import os
+import signal
+import tornado.netutil
+import tornado.process
+
+logger = logging.getLogger(__name__)
+
+def bind_and_fork(port: int, workers: int):
+    """Abrir o socket do webhook e, com mais de um worker, criar os processos que o compartilham.
+
+    Precisa rodar antes de conectar ao MongoDB ou criar um loop de eventos: o
+    MongoClient e o asyncio não sobrevivem ao fork. O processo pai fica só
+    supervisionando (reinicia workers que caírem) e repassa o SIGTERM do deploy.
+    """
+    sockets = tornado.netutil.bind_sockets(port, address='0.0.0.0')
+    if workers <= 1:
+        return sockets
+
+    # Grupo de processos próprio: o pai encaminha o sinal de parada para todos os workers
+    os.setpgrp()
+
+    def forward(signum, frame):
+        signal.signal(signum, signal.SIG_IGN)
+        os.killpg(os.getpgrp(), signum)
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, forward)
+
+    logger.info(f"🔀 Iniciando {workers} workers na porta {port}")
+    # Retorna apenas nos filhos; o pai termina quando todos saírem com código 0
+    task_id = tornado.process.fork_processes(workers)
+    logger.info(f"👷 Worker {task_id} iniciado (pid {os.getpid()})")
+    return sockets
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Limitador assíncrono do tipo token bucket"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Aguardar até haver fichas disponíveis"""
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Suspender a emissão de fichas (ex.: RetryAfter do servidor)"""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
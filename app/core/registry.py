@@ -1,46 +1,507 @@
+import asyncio
+import importlib
 import logging
-from typing import List, Tuple, Callable, Any
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Callable, Any
+from telegram import Update
+from telegram.ext import BaseHandler, CallbackQueryHandler, CommandHandler, ConversationHandler, MessageHandler
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Limite do Telegram para callback_data, em bytes
+CALLBACK_DATA_LIMIT = 64
+BASE36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+class CallbackRouter:
+    """Roteamento de callback queries no formato `prefixo:ação:arg1:arg2...`.
+
+    As rotas ficam em um dicionário por prefixo e outro por ação: um callback
+    é resolvido com duas consultas, sem testar uma cadeia de regex. A ação `*`
+    atende qualquer ação do prefixo. Os argumentos chegam ao callback em
+    context.args, como nos comandos.
+    """
+    
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, Callable]] = {}
+        # Prefixos atendidos dentro de ConversationHandlers (o handler global os ignora)
+        self.scoped: Set[str] = set()
+        # Rota do handler global para um prefixo escopado quando nenhuma conversa aceitou o botão
+        # (ex.: botão de uma conversa já encerrada)
+        self.fallbacks: Dict[str, Callable] = {}
+        # callback_data antigo (botões já enviados) -> formato atual
+        self.legacy: Dict[str, str] = {}
+    
+    def add(self, prefix: str, action: str, callback: Callable):
+        if ':' in prefix or ':' in action:
+            raise ValueError(f"prefixo/ação não podem conter ':' ({prefix}:{action})")
+        self.routes.setdefault(prefix, {})[action] = callback
+    
+    def add_fallback(self, prefix: str, callback: Callable):
+        self.fallbacks[prefix] = callback
+    
+    def remove(self, prefix: str, action: str, callback: Optional[Callable] = None):
+        actions = self.routes.get(prefix, {})
+        if action in actions and (callback is None or actions[action] is callback):
+            del actions[action]
+            if not actions:
+                del self.routes[prefix]
+    
+    @staticmethod
+    def pack(prefix: str, action: str, *args) -> str:
+        """Montar o callback_data; inteiros vão em base 36 (leia com unpack_int)"""
+        parts = [prefix, action]
+        for arg in args:
+            if isinstance(arg, int):
+                digits, number = '', abs(arg)
+                while True:
+                    number, remainder = divmod(number, 36)
+                    digits = BASE36[remainder] + digits
+                    if not number:
+                        break
+                arg = ('-' if arg < 0 else '') + digits
+            arg = str(arg)
+            if ':' in arg:
+                raise ValueError(f"argumento de callback não pode conter ':' ({arg})")
+            parts.append(arg)
+        data = ':'.join(parts)
+        if len(data.encode()) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"callback_data com mais de {CALLBACK_DATA_LIMIT} bytes: {data}")
+        return data
+    
+    @staticmethod
+    def unpack_int(arg: str) -> int:
+        return int(arg, 36)
+    
+    def resolve(self, data: str) -> Optional[Tuple[str, str, Callable, List[str]]]:
+        """(prefixo, ação, callback, args) da rota que atende o callback_data, ou None"""
+        data = self.legacy.get(data, data)
+        prefix, _, rest = data.partition(':')
+        actions = self.routes.get(prefix)
+        if actions is None:
+            return None
+        action, _, args = rest.partition(':')
+        callback = actions.get(action) or actions.get('*')
+        if callback is None:
+            return None
+        return prefix, action, callback, args.split(':') if args else []
+    
+    def handler(self, *prefixes: str, actions: Optional[Iterable[str]] = None) -> 'CallbackRouteHandler':
+        """Handler para a Application (sem prefixos: todas as rotas) ou para estados de uma conversa"""
+        self.scoped.update(prefixes)
+        return CallbackRouteHandler(self, set(prefixes) or None, set(actions) if actions else None)
+
+class CallbackRouteHandler(BaseHandler):
+    """Handler do python-telegram-bot que despacha pelas rotas do CallbackRouter"""
+    
+    def __init__(self, router: CallbackRouter, prefixes: Optional[Set[str]] = None, actions: Optional[Set[str]] = None):
+        super().__init__(self._unused, block=True)
+        self.router = router
+        self.prefixes = prefixes
+        self.actions = actions
+    
+    async def _unused(self, update, context):
+        pass
+    
+    def check_update(self, update: object):
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        data = update.callback_query.data
+        if not isinstance(data, str):
+            return None
+        resolved = self.router.resolve(data)
+        if resolved is None:
+            return None
+        prefix, action = resolved[0], resolved[1]
+        if self.prefixes is None:
+            if prefix in self.router.scoped:
+                # A conversa do prefixo (no mesmo grupo, antes deste handler) já recusou o botão
+                fallback = self.router.fallbacks.get(prefix)
+                if fallback is None:
+                    return None
+                return prefix, action, fallback, resolved[3]
+        elif prefix not in self.prefixes:
+            return None
+        if self.actions is not None and action not in self.actions:
+            return None
+        return resolved
+    
+    def collect_additional_context(self, context, update, application, check_result):
+        context.args = check_result[3]
+    
+    async def handle_update(self, update, application, check_result, context):
+        self.collect_additional_context(context, update, application, check_result)
+        # O retorno é o próximo estado quando a rota roda dentro de um ConversationHandler
+        return await check_result[2](update, context)
+
 class ModuleRegistry:
+    """Registro de comandos, handlers e hooks dos módulos.
+    
+    Com um manifesto (load_manifest), os comandos ficam conhecidos sem importar
+    os módulos e install() coloca na Application um handler provisório por
+    comando/callback/filtro declarado. O primeiro update que chega a um deles
+    importa o módulo, troca os provisórios pelos handlers reais na mesma posição
+    e reenvia o update ao handler real.
+    """
+    
     def __init__(self):
         self.handlers = []
         self.commands = []
         self.loaded_modules = set()
         self.conversation_handlers = []  # ✅ NOVO: Suporte a Conversation Handlers
+        self.startup_hooks = []
+        self.shutdown_hooks = []
+        
+        # Carregamento sob demanda a partir do manifesto
+        self.manifest: Dict[str, Dict] = {}
+        self.job_modules: Dict[str, str] = {}
+        # Registros feitos desde o último register_module pertencem ao próximo módulo registrado
+        self.unclaimed_handlers = []
+        self.unclaimed_conversations = []
+        self.unclaimed_commands: List[Tuple[str, str]] = []
+        self.unclaimed_routes: Set[str] = set()
+        # O que cada módulo registrou de fato, para comparar com o manifesto
+        self.module_declarations: Dict[str, Dict] = {}
+        self.module_handlers: Dict[str, Tuple[List, List]] = {}
+        self.stubs: Dict[str, List[Tuple[int, BaseHandler]]] = {}
+        self.active = set()
+        self.loading: Dict[str, asyncio.Future] = {}
+        self.import_lock = asyncio.Lock()
+        self.application = None
+        self.hooks_started: Optional[int] = None  # hooks de inicialização já executados (None antes do boot)
+        self.warm_task: Optional[asyncio.Task] = None
+        self.callbacks = CallbackRouter()
+        self.stub_routes: Dict[str, List[Tuple[str, Callable]]] = {}
+        # Espera antes do aquecimento: os primeiros updates não disputam o import com ele
+        self.warm_delay = 2.0
+        self.load_times: Dict[str, float] = {}
+    
+    def _add_command(self, command: str, description: str):
+        if all(existing != command for existing, _ in self.commands):
+            self.commands.append((command, description))
     
     def register_command(self, command: str, callback: Callable, description: str = None):
         """Registrar comando do bot"""
-        self.handlers.append(('command', [command, callback]))
+        entry = ('command', [command, callback], 0)
+        self.handlers.append(entry)
+        self.unclaimed_handlers.append(entry)
         
         # Adicionar descrição padrão se não fornecida
         if description is None:
             description = f"Comando {command}"
-            
-        self.commands.append((command, description))
+        
+        self.unclaimed_commands.append((command, description))
+        self._add_command(command, description)
         logger.debug(f"Comando registrado: /{command} - {description}")
     
-    def register_message(self, filters_obj: Any, callback: Callable):
-        """Registrar handler de mensagens"""
-        self.handlers.append(('message', [filters_obj, callback]))
-        logger.debug(f"Handler de mensagem registrado: {filters_obj}")
+    def register_message(self, filters_obj: Any, callback: Callable, group: int = 0):
+        """Registrar handler de mensagens (grupos diferentes de 0 não disputam a mensagem com os demais)"""
+        entry = ('message', [filters_obj, callback], group)
+        self.handlers.append(entry)
+        self.unclaimed_handlers.append(entry)
+        logger.debug(f"Handler de mensagem registrado: {filters_obj} (grupo {group})")
     
     def register_callback(self, pattern: str, callback: Callable):
-        """Registrar callback queries"""
-        self.handlers.append(('callback', [pattern, callback]))
+        """Registrar callback queries por regex (novos botões usam register_route)"""
+        entry = ('callback', [pattern, callback], 0)
+        self.handlers.append(entry)
+        self.unclaimed_handlers.append(entry)
         logger.debug(f"Callback registrado: {pattern}")
     
+    def register_route(self, prefix: str, action: str, callback: Callable):
+        """Registrar a rota de callback `prefixo:ação` (monte o callback_data com callbacks.pack)"""
+        self.callbacks.add(prefix, action, metrics.instrument(callback, f"{prefix}:{action}", 'callback'))
+        self.unclaimed_routes.add(prefix)
+        logger.debug(f"Rota de callback registrada: {prefix}:{action}")
+    
+    def register_route_fallback(self, prefix: str, callback: Callable):
+        """Registrar quem atende botões de um prefixo escopado fora da sua conversa"""
+        self.callbacks.add_fallback(prefix, metrics.instrument(callback, f"{prefix}:fallback", 'callback'))
+        logger.debug(f"Rota de callback de reserva registrada: {prefix}")
+    
     def register_module(self, module_name: str):
-        """Registrar módulo carregado"""
+        """Registrar módulo carregado (chamado ao fim do módulo, depois dos seus handlers)"""
         self.loaded_modules.add(module_name)
+        self.module_handlers[module_name] = (self.unclaimed_conversations, self.unclaimed_handlers)
+        self.module_declarations[module_name] = {
+            'commands': self.unclaimed_commands,
+            'routes': self.unclaimed_routes,
+            'messages': sorted(group for handler_type, _, group in self.unclaimed_handlers if handler_type == 'message'),
+        }
+        self.unclaimed_conversations, self.unclaimed_handlers = [], []
+        self.unclaimed_commands, self.unclaimed_routes = [], set()
         logger.info(f"Módulo carregado: {module_name}")
+        
+        for problem in self.manifest_drift(module_name):
+            logger.error(f"❌ Manifesto desatualizado: {problem}")
     
     def register_conversation_handler(self, conversation_handler):
         """✅ NOVO: Registrar Conversation Handler"""
         self.conversation_handlers.append(conversation_handler)
+        self.unclaimed_conversations.append(conversation_handler)
         logger.debug(f"Conversation Handler registrado: {conversation_handler}")
     
+    def register_startup(self, callback: Callable):
+        """Registrar corrotina executada após a inicialização da aplicação"""
+        self.startup_hooks.append(callback)
+        logger.debug(f"Hook de inicialização registrado: {callback}")
+    
+    def register_shutdown(self, callback: Callable):
+        """Registrar corrotina executada no encerramento da aplicação"""
+        self.shutdown_hooks.append(callback)
+        logger.debug(f"Hook de encerramento registrado: {callback}")
+    
+    # Manifesto e carregamento sob demanda
+    
+    def load_manifest(self, modules: List[Dict]):
+        """Conhecer comandos, prefixos de callback e jobs dos módulos sem importá-los"""
+        for entry in modules:
+            self.manifest[entry['name']] = entry
+            for command, description in entry.get('commands', []):
+                self._add_command(command, description)
+            for kind in entry.get('jobs', []):
+                self.job_modules[kind] = entry['name']
+    
+    def manifest_drift(self, module_name: str, jobs: Optional[Iterable[str]] = None) -> List[str]:
+        """Diferenças entre o que o módulo registrou e o que o manifesto declara (vazio se estiver em dia)
+
+        Comandos (com descrição), prefixos de rota e grupos dos handlers de
+        mensagem são comparados; os tipos de job só quando informados (a fila
+        de jobs não passa pelo registro).
+        """
+        declared = self.module_declarations.get(module_name)
+        if not self.manifest or declared is None:
+            return []
+        entry = self.manifest.get(module_name)
+        if entry is None:
+            return [f"módulo {module_name} não está no manifesto"]
+        
+        problems = []
+        manifest_commands = dict(entry.get('commands', []))
+        module_commands = dict(declared['commands'])
+        for command in sorted(module_commands.keys() - manifest_commands.keys()):
+            problems.append(f"{module_name}: /{command} registrado no módulo e ausente do manifesto")
+        for command in sorted(manifest_commands.keys() - module_commands.keys()):
+            problems.append(f"{module_name}: /{command} declarado no manifesto e não registrado pelo módulo")
+        for command in sorted(manifest_commands.keys() & module_commands.keys()):
+            if manifest_commands[command] != module_commands[command]:
+                problems.append(f"{module_name}: descrição de /{command} difere do manifesto")
+        
+        manifest_routes = set(entry.get('routes', []))
+        if manifest_routes != declared['routes']:
+            problems.append(
+                f"{module_name}: prefixos de rota {sorted(declared['routes'])} no módulo, {sorted(manifest_routes)} no manifesto"
+            )
+        manifest_messages = sorted(group for _, group in entry.get('messages', []))
+        if manifest_messages != declared['messages']:
+            problems.append(
+                f"{module_name}: handlers de mensagem nos grupos {declared['messages']} no módulo, {manifest_messages} no manifesto"
+            )
+        if jobs is not None and set(jobs) != set(entry.get('jobs', [])):
+            problems.append(f"{module_name}: jobs {sorted(jobs)} no módulo, {sorted(entry.get('jobs', []))} no manifesto")
+        return problems
+    
+    def load_legacy_callbacks(self, aliases: Dict[str, str]):
+        """Traduzir callback_data de botões enviados antes do formato `prefixo:ação`"""
+        self.callbacks.legacy.update(aliases)
+    
+    def build_handlers(self, module_name: str) -> List[Tuple[int, BaseHandler]]:
+        """Handlers reais do módulo: conversas primeiro, já que seus pontos de entrada também são comandos"""
+        conversations, handlers = self.module_handlers.get(module_name, ([], []))
+        built = [(0, self._instrument_conversation(conversation_handler)) for conversation_handler in conversations]
+        for handler_type, handler_config, group in handlers:
+            if handler_type == 'command':
+                command, callback = handler_config
+                built.append((group, CommandHandler(command, metrics.instrument(callback, f"/{command}", 'command'))))
+            elif handler_type == 'message':
+                filters_obj, callback = handler_config
+                built.append((group, MessageHandler(filters_obj, metrics.instrument(callback, self._callback_name(callback), 'message'))))
+            elif handler_type == 'callback':
+                pattern, callback = handler_config
+                built.append((group, CallbackQueryHandler(metrics.instrument(callback, pattern, 'callback'), pattern=pattern)))
+        return built
+    
+    @staticmethod
+    def _callback_name(callback: Callable) -> str:
+        return getattr(callback, '__qualname__', getattr(callback, '__name__', 'callback'))
+    
+    def _instrument_conversation(self, conversation: ConversationHandler) -> ConversationHandler:
+        """Métricas nos comandos e mensagens da conversa (as rotas de callback já vêm instrumentadas)"""
+        inner = list(conversation.entry_points) + list(conversation.fallbacks)
+        for state_handlers in conversation.states.values():
+            inner.extend(state_handlers)
+        for handler in inner:
+            if isinstance(handler, CommandHandler):
+                handler.callback = metrics.instrument(handler.callback, f"/{sorted(handler.commands)[0]}", 'command')
+            elif isinstance(handler, MessageHandler):
+                handler.callback = metrics.instrument(handler.callback, self._callback_name(handler.callback), 'message')
+            elif isinstance(handler, CallbackQueryHandler):
+                pattern = getattr(handler.pattern, 'pattern', handler.pattern)
+                handler.callback = metrics.instrument(handler.callback, str(pattern), 'callback')
+        return conversation
+    
+    def _stub(self, module_name: str, group: int) -> Callable:
+        async def dispatch(update, context):
+            if not await self.load(module_name):
+                return
+            # Os handlers anteriores ao provisório já recusaram o update: o primeiro que aceitar é o real
+            for handler in self.application.handlers.get(group, []):
+                check = handler.check_update(update)
+                if check is not None and check is not False:
+                    await handler.handle_update(update, self.application, check, context)
+                    return
+        return dispatch
+    
+    def install(self, application, lazy: bool = True):
+        """Instalar os handlers dos módulos do manifesto: provisórios (lazy) ou importando todos agora"""
+        self.application = application
+        if not lazy:
+            for module_name in self.manifest:
+                if module_name in self.loaded_modules:
+                    continue
+                try:
+                    importlib.import_module(f"app.modules.{module_name}")
+                    logger.info(f"✅ Módulo {module_name} carregado")
+                except Exception as e:
+                    logger.error(f"❌ Erro carregando {module_name}: {e}")
+            # Com todos os módulos importados no boot, divergência do manifesto impede a inicialização
+            drift = [problem for module_name in sorted(self.loaded_modules) for problem in self.manifest_drift(module_name)]
+            if drift:
+                raise RuntimeError(f"Manifesto desatualizado (app/modules/manifest.py): {'; '.join(drift)}")
+            for module_name in self.manifest:
+                if module_name in self.loaded_modules:
+                    for group, handler in self.build_handlers(module_name):
+                        application.add_handler(handler, group)
+                    self.active.add(module_name)
+            application.add_handler(self.callbacks.handler())
+            return
+        
+        for module_name, entry in self.manifest.items():
+            stubs = []
+            commands = [command for command, _ in entry.get('commands', [])]
+            if commands:
+                stubs.append((0, CommandHandler(commands, self._stub(module_name, 0))))
+            for pattern in entry.get('callbacks', []):
+                stubs.append((0, CallbackQueryHandler(self._stub(module_name, 0), pattern=pattern)))
+            for filters_obj, group in entry.get('messages', []):
+                stubs.append((group, MessageHandler(filters_obj, self._stub(module_name, group))))
+            for group, handler in stubs:
+                application.add_handler(handler, group)
+            self.stubs[module_name] = stubs
+            # Rota provisória por prefixo: qualquer ação carrega o módulo, que registra as rotas reais
+            self.stub_routes[module_name] = []
+            for prefix in entry.get('routes', []):
+                stub = self._stub(module_name, 0)
+                self.callbacks.add(prefix, '*', stub)
+                self.stub_routes[module_name].append((prefix, stub))
+        application.add_handler(self.callbacks.handler())
+    
+    def _replace_stubs(self, module_name: str, built: List[Tuple[int, BaseHandler]]):
+        application = self.application
+        stubs = self.stubs.pop(module_name, [])
+        for prefix, stub in self.stub_routes.pop(module_name, []):
+            self.callbacks.remove(prefix, '*', stub)
+        for group in sorted({group for group, _ in built} | {group for group, _ in stubs}):
+            current = application.handlers.get(group, [])
+            group_stubs = [handler for stub_group, handler in stubs if stub_group == group]
+            positions = [index for index, handler in enumerate(current) if any(handler is stub for stub in group_stubs)]
+            remaining = [handler for handler in current if not any(handler is stub for stub in group_stubs)]
+            at = positions[0] if positions else len(remaining)
+            real = [handler for handler_group, handler in built if handler_group == group]
+            # Lista nova: updates em andamento continuam percorrendo a anterior
+            application.handlers[group] = remaining[:at] + real + remaining[at:]
+        application.handlers = dict(sorted(application.handlers.items()))
+    
+    async def _activate(self, module_name: str):
+        built = self.build_handlers(module_name)
+        self._replace_stubs(module_name, built)
+        for _, handler in built:
+            if isinstance(handler, ConversationHandler) and handler.persistent:
+                # Depois do initialize, add_handler carregaria o estado salvo em segundo plano;
+                # aqui ele precisa estar pronto antes de reenviar o update. Método privado do
+                # python-telegram-bot (fixado em 20.7 no requirements.txt): conferir ao atualizar
+                add_to_persistence = getattr(self.application, '_add_ch_to_persistence', None)
+                if add_to_persistence is None:
+                    logger.warning(
+                        f"⚠️ Application sem _add_ch_to_persistence: estado salvo da conversa {handler.name} não foi carregado"
+                    )
+                    continue
+                await add_to_persistence(handler)
+        self.active.add(module_name)
+        await self._run_new_startup_hooks()
+    
+    async def _load(self, module_name: str) -> bool:
+        async with self.import_lock:
+            if module_name not in self.loaded_modules:
+                started = time.perf_counter()
+                try:
+                    # Imports pesados (numpy, SDKs de IA) rodam fora do loop de eventos
+                    await asyncio.to_thread(importlib.import_module, f"app.modules.{module_name}")
+                except Exception as e:
+                    logger.error(f"❌ Erro carregando {module_name}: {e}")
+                    self._replace_stubs(module_name, [])
+                    return False
+                self.load_times[module_name] = time.perf_counter() - started
+                logger.info(f"✅ Módulo {module_name} carregado sob demanda em {self.load_times[module_name] * 1000:.0f} ms")
+            
+            # O import pode ter trazido outros módulos do manifesto (ex.: exemplo importa affiliate_system)
+            for name in self.manifest:
+                if name in self.loaded_modules and name not in self.active:
+                    await self._activate(name)
+        return module_name in self.active
+    
+    async def load(self, module_name: str) -> bool:
+        """Importar e ativar um módulo do manifesto (uma vez, mesmo com vários updates simultâneos)"""
+        if module_name in self.active:
+            return True
+        if module_name not in self.manifest:
+            return False
+        if module_name not in self.loading:
+            self.loading[module_name] = asyncio.ensure_future(self._load(module_name))
+        return await asyncio.shield(self.loading[module_name])
+    
+    async def load_for_job(self, kind: str) -> bool:
+        """Carregar o módulo que executa um tipo de job (a fila pode pegar um job antes do primeiro update)"""
+        module_name = self.job_modules.get(kind)
+        return module_name is not None and await self.load(module_name)
+    
+    async def warm(self):
+        """Carregar em segundo plano os módulos marcados com `warm` no manifesto"""
+        await asyncio.sleep(self.warm_delay)
+        for module_name, entry in self.manifest.items():
+            if entry.get('warm'):
+                await self.load(module_name)
+    
+    # Ciclo de vida
+    
+    async def _run_new_startup_hooks(self):
+        if self.hooks_started is None:
+            return  # antes do boot: run_startup_hooks executa todos
+        while self.hooks_started < len(self.startup_hooks):
+            hook = self.startup_hooks[self.hooks_started]
+            self.hooks_started += 1
+            try:
+                await hook(self.application)
+            except Exception as e:
+                logger.error(f"❌ Erro em hook de inicialização {hook}: {e}")
+    
+    async def run_startup_hooks(self, application):
+        """post_init: hooks registrados até agora; módulos carregados depois rodam os seus ao ativar"""
+        self.application = application
+        self.hooks_started = 0
+        await self._run_new_startup_hooks()
+        if self.stubs:
+            self.warm_task = asyncio.get_running_loop().create_task(self.warm())
+    
+    async def run_shutdown_hooks(self, application):
+        if self.warm_task is not None:
+            self.warm_task.cancel()
+        for hook in self.shutdown_hooks:
+            try:
+                await hook(application)
+            except Exception as e:
+                logger.error(f"❌ Erro em hook de encerramento {hook}: {e}")
+    
     def get_handlers(self) -> List[Tuple]:
         return self.handlers
     
@@ -54,12 +515,35 @@ class ModuleRegistry:
         """✅ NOVO: Obter todos os Conversation Handlers"""
         return self.conversation_handlers
     
+    def in_conversation(self, update: Update) -> bool:
+        """Se alguma conversa ativa atenderia este update (handlers de outros grupos o usam para não competir)"""
+        for conversation in self.conversation_handlers:
+            check = conversation.check_update(update)
+            if check is not None and check is not False:
+                return True
+        return False
+    
+    def get_startup_hooks(self) -> List[Callable]:
+        return self.startup_hooks
+    
+    def get_shutdown_hooks(self) -> List[Callable]:
+        return self.shutdown_hooks
+    
     def clear_registry(self):
         """Limpar registro (para testes)"""
         self.handlers.clear()
         self.commands.clear()
         self.loaded_modules.clear()
         self.conversation_handlers.clear()
+        self.startup_hooks.clear()
+        self.shutdown_hooks.clear()
+        self.manifest.clear()
+        self.job_modules.clear()
+        self.module_handlers.clear()
+        self.stubs.clear()
+        self.module_declarations.clear()
+        self.active.clear()
+        self.loading.clear()
 
 # Instância global do registro
 module_registry = ModuleRegistry()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+class KeyedSequencer:
+    """Executa corrotinas em paralelo entre chaves e em ordem de chegada dentro de cada chave"""
+
+    def __init__(self, max_concurrency: int):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency deve ser positivo")
+        self.max_concurrency = max_concurrency
+        # O limite global só é ocupado por quem já está na vez da sua chave
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Último da fila de cada chave: cada novo item espera o anterior terminar
+        self.tails: Dict[Hashable, asyncio.Future] = {}
+
+    def pending_keys(self) -> int:
+        return len(self.tails)
+
+    async def run(self, key: Optional[Hashable], coroutine: Awaitable[Any]) -> Any:
+        if key is None:
+            async with self.semaphore:
+                return await coroutine
+
+        previous = self.tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self.tails[key] = done
+        # A chave só sai de tails quando o último da fila termina de fato
+        done.add_done_callback(lambda _: self._release(key, done))
+        chained = False
+        try:
+            if previous is not None:
+                try:
+                    # shield: o cancelamento deste item não pode cancelar o future do anterior
+                    await asyncio.shield(previous)
+                except asyncio.CancelledError:
+                    # Cancelado enquanto aguardava a vez: a corrotina nunca será executada, mas
+                    # o próximo da chave continua esperando o anterior, que ainda pode estar rodando
+                    coroutine.close()
+                    previous.add_done_callback(lambda _: self._resolve(done))
+                    chained = True
+                    raise
+            async with self.semaphore:
+                return await coroutine
+        finally:
+            if not chained:
+                self._resolve(done)
+
+    @staticmethod
+    def _resolve(done: asyncio.Future):
+        if not done.done():
+            done.set_result(None)
+
+    def _release(self, key: Hashable, done: asyncio.Future):
+        if self.tails.get(key) is done:
+            del self.tails[key]
+
+def update_key(update: object) -> Optional[Hashable]:
+    """Chave de ordenação: (chat, usuário), como o estado das conversas"""
+    if not isinstance(update, Update):
+        return None
+    chat = update.effective_chat
+    user = update.effective_user
+    if chat is None and user is None:
+        return None
+    return (chat.id if chat else None, user.id if user else None)
+
+class SequencedUpdateProcessor(BaseUpdateProcessor):
+    """Processamento concorrente de updates preservando a ordem por chat/usuário"""
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 4096):
+        # O semáforo do PTB limita updates em andamento (rodando ou na fila da própria chave);
+        # o sequenciador limita os que estão de fato executando
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.sequencer = KeyedSequencer(max_concurrent_updates)
+        # Updates já retirados da fila da Application: executando ou aguardando a vez da sua chave
+        self.in_flight = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.in_flight += 1
+        try:
+            await self.sequencer.run(update_key(update), coroutine)
+        finally:
+            self.in_flight -= 1
+
+    async def initialize(self) -> None:
+        logger.info(f"⚙️ Processamento concorrente: até {self.sequencer.max_concurrency} updates simultâneos")
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import signal
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List
+import tornado.web
+from tornado.httpserver import HTTPServer
+from pymongo.errors import DuplicateKeyError
+from telegram import Update
+from telegram.ext import Application
+from app.core.config import Config
+from app.core.database import mongo_db
+from app.core.health import health_monitor
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_UPDATES = ['message', 'callback_query']
+
+class UpdateDeduplicator:
+    """Aceita cada update_id uma única vez entre todos os workers e instâncias.
+
+    O Telegram reentrega um update quando não recebe 200 a tempo; com vários
+    workers a reentrega pode cair em outro processo. O primeiro a inserir o
+    update_id em `processed_updates` (TTL de 24 h) fica com ele. Sem MongoDB o
+    update é aceito: preferimos processar duas vezes a perder mensagens.
+    """
+
+    def __init__(self, local_size: int = 10000):
+        self.local_size = local_size
+        # Atalho para reentregas no mesmo processo, sem ida ao banco
+        self.recent: OrderedDict = OrderedDict()
+
+    def _claim(self, update_id: int) -> bool:
+        collection = mongo_db.get_collection('processed_updates')
+        if collection is None:
+            return True
+        try:
+            collection.insert_one({'_id': update_id, 'received_at': datetime.utcnow(), 'pid': os.getpid()})
+            return True
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            logger.warning(f"Deduplicação indisponível para update {update_id}: {e}")
+            return True
+
+    async def first_delivery(self, update_id: int) -> bool:
+        if update_id in self.recent:
+            return False
+        self.recent[update_id] = True
+        if len(self.recent) > self.local_size:
+            self.recent.popitem(last=False)
+        return await asyncio.to_thread(self._claim, update_id)
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Recebe os updates do Telegram e os coloca na fila da Application"""
+
+    def initialize(self, server: 'WebhookServer'):
+        self.server = server
+
+    async def post(self):
+        if self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.server.secret_token:
+            self.set_status(403)
+            return
+
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.server.application.bot)
+        except Exception as e:
+            logger.warning(f"Webhook: corpo inválido: {e}")
+            update = None
+        if update is None:
+            self.set_status(400)
+            return
+
+        if await self.server.deduplicator.first_delivery(update.update_id):
+            await self.server.application.update_queue.put(update)
+            self.server.stats['accepted'] += 1
+        else:
+            self.server.stats['duplicates'] += 1
+        self.set_status(200)
+
+class HealthHandler(tornado.web.RequestHandler):
+    """/health, /ready e /live: respondem com o último resultado das sondas, sem consultar nada"""
+
+    def initialize(self, check: str):
+        self.check = check
+
+    def get(self):
+        report = getattr(health_monitor, self.check)()
+        ok = report['status'] != 'fail' if self.check == 'health' else report['ok']
+        self.set_status(200 if ok else 503)
+        self.set_header('Cache-Control', 'no-store')
+        self.finish(json.dumps(report, default=str))
+
+    def head(self):
+        self.get()
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """/metrics no formato texto do Prometheus"""
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.finish(metrics.render())
+
+class WebhookServer:
+    """Servidor de webhook próprio (tornado), capaz de rodar em vários workers no mesmo socket"""
+
+    def __init__(self, application: Application, url_path: str, secret_token: str):
+        self.application = application
+        self.url_path = url_path.strip('/')
+        self.secret_token = secret_token
+        self.deduplicator = UpdateDeduplicator()
+        self.stats: Dict[str, int] = {'accepted': 0, 'duplicates': 0}
+
+    def make_app(self) -> tornado.web.Application:
+        return tornado.web.Application([
+            (rf"/{self.url_path}/?", TelegramWebhookHandler, {'server': self}),
+            (r"/health/?", HealthHandler, {'check': 'health'}),
+            (r"/ready/?", HealthHandler, {'check': 'ready'}),
+            (r"/live/?", HealthHandler, {'check': 'live'}),
+            (r"/metrics/?", MetricsHandler),
+        ])
+
+    async def set_webhook(self, webhook_url: str):
+        """Registrar o webhook no Telegram uma vez por configuração, não a cada worker"""
+        settings = f"{webhook_url}|{self.secret_token}|{ALLOWED_UPDATES}|{Config.WEBHOOK_MAX_CONNECTIONS}"
+        version = hashlib.sha1(settings.encode()).hexdigest()
+        if not await asyncio.to_thread(mongo_db.claim_bootstrap, 'webhook', version):
+            return
+        try:
+            await self.application.bot.set_webhook(
+                webhook_url,
+                secret_token=self.secret_token,
+                allowed_updates=ALLOWED_UPDATES,
+                max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"🌐 Webhook registrado: {webhook_url}")
+        except Exception:
+            await asyncio.to_thread(mongo_db.release_bootstrap, 'webhook')
+            raise
+
+    async def serve(self, sockets: List, webhook_url: str):
+        """Ciclo de vida completo, na mesma ordem do Application.run_webhook"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+
+        server = HTTPServer(self.make_app())
+        application = self.application
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            await health_monitor.start(application)
+            await self.set_webhook(webhook_url)
+            server.add_sockets(sockets)
+            logger.info(f"🌐 Worker {os.getpid()} recebendo updates")
+
+            await stop.wait()
+
+            server.stop()
+            await server.close_all_connections()
+            await health_monitor.stop()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        logger.info(f"👋 Worker {os.getpid()} encerrado: {self.stats['accepted']} updates, {self.stats['duplicates']} duplicados")
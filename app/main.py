@@ -1,5 +1,7 @@
 import os
 import sys
+import asyncio
+import hashlib
 import logging
 
 # ✅ CORREÇÃO CRÍTICA: Adicionar caminho absoluto
@@ -26,6 +28,13 @@ def main():
     try:
         logger.info("🚀 Iniciando JuristBot 2.0...")
         
+        # Webhook com vários workers: socket aberto e fork antes de qualquer conexão ao MongoDB
+        webhook_url = os.getenv('RENDER_WEBHOOK_URL')
+        sockets = None
+        if webhook_url:
+            from app.core.prefork import bind_and_fork
+            sockets = bind_and_fork(int(os.getenv('PORT', 10000)), int(os.getenv('WEB_CONCURRENCY', 1)))
+        
         # ✅ VERIFICAR IMPORTAÇÕES PRIMEIRO
         logger.info("📦 Verificando importações...")
         
@@ -35,8 +44,9 @@ def main():
         from app.core.database import mongo_db
         logger.info("✅ app.core.database importado")
         
-        from app.modules.ia_services import ai_service
-        logger.info("✅ app.modules.ia_services importado")
+        # Fila de jobs e broadcasts retomam o trabalho pendente logo no boot, antes dos módulos
+        from app.core import jobs, broadcast
+        logger.info("✅ app.core.jobs e app.core.broadcast importados")
         
         logger.info("✅ Importações básicas OK")
         
@@ -45,94 +55,76 @@ def main():
         logger.info("✅ Configurações validadas")
         
         # Inicializar bot Telegram
-        from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler
+        from telegram import Update
+        from telegram.ext import Application, TypeHandler
         from app.core.registry import module_registry
         
         token = os.getenv('TELEGRAM_BOT_TOKEN')
         if not token:
             raise ValueError("TELEGRAM_BOT_TOKEN não configurado!")
             
-        application = Application.builder().token(token).build()
+        from app.core.sequencer import SequencedUpdateProcessor
+        from app.core.persistence import MongoPersistence
+        
+        # Com vários workers o estado precisa chegar rápido ao MongoDB para os demais processos
+        persistence = MongoPersistence(
+            1 if Config.MULTI_WORKER else Config.PERSISTENCE_UPDATE_INTERVAL,
+            shared=Config.MULTI_WORKER
+        )
+        
+        application = (
+            Application.builder()
+            .token(token)
+            .concurrent_updates(SequencedUpdateProcessor(Config.MAX_CONCURRENT_UPDATES, Config.MAX_PENDING_UPDATES))
+            .persistence(persistence)
+            .post_init(module_registry.run_startup_hooks)
+            .post_shutdown(module_registry.run_shutdown_hooks)
+            .build()
+        )
         logger.info("✅ Bot Telegram inicializado")
         
         # ✅ CARREGAR MÓDULOS
-        logger.info("🔧 Carregando módulos...")
-        
-        # Importar módulos (isso registra automaticamente os handlers)
-        try:
-            from app.modules import example
-            logger.info("✅ Módulo example carregado")
-        except Exception as e:
-            logger.error(f"❌ Erro carregando example: {e}")
-            
-        try:
-            from app.modules import legal_assistant
-            logger.info("✅ Módulo legal_assistant carregado")
-        except Exception as e:
-            logger.error(f"❌ Erro carregando legal_assistant: {e}")
-            
-        try:
-            from app.modules import affiliate_system
-            logger.info("✅ Módulo affiliate_system carregado")
-        except Exception as e:
-            logger.error(f"❌ Erro carregando affiliate_system: {e}")
-            
-        try:
-            from app.modules import process_consultation
-            logger.info("✅ Módulo process_consultation carregado")
-        except Exception as e:
-            logger.error(f"❌ Erro carregando process_consultation: {e}")
-            
-        try:
-            from app.modules import admin
-            logger.info("✅ Módulo admin carregado")
-        except Exception as e:
-            logger.error(f"❌ Erro carregando admin: {e}")
-            
-        try:
-            from app.modules import juristcoach
-            logger.info("✅ Módulo juristcoach carregado")
-        except Exception as e:
-            logger.error(f"❌ Erro carregando juristcoach: {e}")
-        
-        logger.info("✅ Módulos importados")
-        
-        # Registrar handlers dos módulos
-        for handler_type, handler_config in module_registry.get_handlers():
-            if handler_type == 'command':
-                application.add_handler(CommandHandler(*handler_config))
-            elif handler_type == 'message':
-                application.add_handler(MessageHandler(*handler_config))
-            elif handler_type == 'callback':
-                application.add_handler(CallbackQueryHandler(*handler_config))
-        
-        # Registrar Conversation Handlers
-        for conversation_handler in module_registry.get_conversation_handlers():
-            application.add_handler(conversation_handler)
-        
-        # Configurar comandos do bot
+        # Comandos vêm do manifesto; cada módulo é importado no primeiro update que precisa dele
+        from app.modules.manifest import MODULES, LEGACY_CALLBACKS
+        module_registry.load_manifest(MODULES)
+        module_registry.load_legacy_callbacks(LEGACY_CALLBACKS)
+        module_registry.install(application, lazy=Config.LAZY_MODULES)
+        logger.info(f"✅ Módulos {'registrados para carregamento sob demanda' if Config.LAZY_MODULES else 'importados'}")
+        
+        if Config.MULTI_WORKER:
+            application.add_handler(TypeHandler(Update, persistence.sync_conversations), -1000)
+        
+        # Configurar comandos do bot (uma vez por lista de comandos, não a cada worker)
         commands_list = module_registry.get_commands()
-        if commands_list:
+        
+        async def publish_commands(app):
+            if not commands_list:
+                return
             from telegram import BotCommand
-            bot_commands = [BotCommand(cmd, desc) for cmd, desc in commands_list]
-            application.bot.set_my_commands(bot_commands)
+            version = hashlib.sha1(repr(commands_list).encode()).hexdigest()
+            if not await asyncio.to_thread(mongo_db.claim_bootstrap, 'commands', version):
+                return
+            try:
+                await app.bot.set_my_commands([BotCommand(cmd, desc) for cmd, desc in commands_list])
+            except Exception:
+                await asyncio.to_thread(mongo_db.release_bootstrap, 'commands')
+                raise
+        
+        module_registry.register_startup(publish_commands)
         
         logger.info(f"✅ {len(commands_list)} comandos registrados")
-        logger.info(f"✅ {len(module_registry.get_loaded_modules())} módulos carregados")
+        logger.info(f"✅ {len(module_registry.get_loaded_modules())} de {len(MODULES)} módulos carregados")
         
         # Configurar webhook para Render
-        webhook_url = os.getenv('RENDER_WEBHOOK_URL')
         if webhook_url:
             logger.info(f"🌐 Configurando webhook: {webhook_url}")
-            application.run_webhook(
-                listen="0.0.0.0",
-                port=int(os.getenv('PORT', 10000)),
-                url_path=token,
-                webhook_url=f"{webhook_url}/{token}",
-                secret_token=os.getenv('WEBHOOK_SECRET', 'juristbot_secret')
-            )
+            from app.core.webhook import WebhookServer
+            server = WebhookServer(application, url_path=token, secret_token=os.getenv('WEBHOOK_SECRET', 'juristbot_secret'))
+            asyncio.run(server.serve(sockets, f"{webhook_url}/{token}"))
         else:
             logger.info("🔄 Modo polling ativado")
+            # run_polling remove o webhook: o próximo deploy com webhook precisa registrá-lo de novo
+            mongo_db.release_bootstrap('webhook')
             application.run_polling(
                 drop_pending_updates=True,
                 allowed_updates=['message', 'callback_query']
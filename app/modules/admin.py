@@ -1,13 +1,22 @@
 import logging
+import asyncio
 import csv
 import io
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+import numpy as np
+from pymongo import UpdateOne
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler
+from telegram.ext import ContextTypes
 from app.core.registry import module_registry
 from app.core.database import mongo_db
 from app.core.config import Config
+from app.core.broadcast import broadcast_engine
+from app.modules.affiliate_stats import affiliate_stats
+from app.modules.affiliate_codes import affiliate_codes
+from app.modules.commission_ledger import commission_ledger
+from app.modules.affiliate_leaderboard import affiliate_leaderboard
+from app.modules.cpf import validate_cpfs
 
 logger = logging.getLogger(__name__)
 
@@ -56,12 +65,12 @@ class AdminPanel:
         )
         
         keyboard = [
-            [InlineKeyboardButton("📊 Estatísticas Detalhadas", callback_data="admin_stats")],
-            [InlineKeyboardButton("👥 Gerenciar Usuários", callback_data="admin_users")],
-            [InlineKeyboardButton("🤖 Gerenciar Afiliados", callback_data="admin_affiliates")],
-            [InlineKeyboardButton("🔍 Consultas Recentes", callback_data="admin_queries")],
-            [InlineKeyboardButton("💰 Relatório Financeiro", callback_data="admin_finance")],
-            [InlineKeyboardButton("⚙️ Configurações", callback_data="admin_settings")],
+            [InlineKeyboardButton("📊 Estatísticas Detalhadas", callback_data="admin:stats")],
+            [InlineKeyboardButton("👥 Gerenciar Usuários", callback_data="admin:users")],
+            [InlineKeyboardButton("🤖 Gerenciar Afiliados", callback_data="admin:affiliates")],
+            [InlineKeyboardButton("🔍 Consultas Recentes", callback_data="admin:queries")],
+            [InlineKeyboardButton("💰 Relatório Financeiro", callback_data="admin:finance")],
+            [InlineKeyboardButton("⚙️ Configurações", callback_data="admin:settings")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -94,31 +103,9 @@ class AdminPanel:
                 'created_at': {'$gte': today_start}
             }) if queries else 0
             
-            # Comissões
-            total_commissions = 0
-            commissions_today = 0
-            if affiliates:
-                affiliate_stats = affiliates.aggregate([
-                    {
-                        '$group': {
-                            '_id': None,
-                            'total_commission': {'$sum': '$total_commission'},
-                            'today_commission': {
-                                '$sum': {
-                                    '$cond': [
-                                        {'$gte': ['$last_commission_date', today_start]},
-                                        '$pending_commission',
-                                        0
-                                    ]
-                                }
-                            }
-                        }
-                    }
-                ])
-                result = list(affiliate_stats)
-                if result:
-                    total_commissions = result[0].get('total_commission', 0)
-                    commissions_today = result[0].get('today_commission', 0)
+            # Comissões (snapshot + delta do ledger)
+            total_commissions = commission_ledger.balances()['total']
+            commissions_today = commission_ledger.sum_since(today_start)['total']
             
             # Novos usuários hoje
             new_users_today = users.count_documents({
@@ -213,7 +200,7 @@ class AdminPanel:
                 f"• Últimos 30 dias: {user_stats['last_30d']}\n"
             )
         
-        keyboard = [[InlineKeyboardButton("🔙 Voltar", callback_data="admin_back")]]
+        keyboard = [[InlineKeyboardButton("🔙 Voltar", callback_data="admin:back")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(stats_text, reply_markup=reply_markup, parse_mode='Markdown')
@@ -266,9 +253,9 @@ class AdminPanel:
         users_text += "\n💡 *Use /exportusers para exportar lista completa*"
         
         keyboard = [
-            [InlineKeyboardButton("📤 Exportar Usuários", callback_data="admin_export_users")],
-            [InlineKeyboardButton("🔄 Atualizar", callback_data="admin_users")],
-            [InlineKeyboardButton("🔙 Voltar", callback_data="admin_back")],
+            [InlineKeyboardButton("📤 Exportar Usuários", callback_data="admin:export_users")],
+            [InlineKeyboardButton("🔄 Atualizar", callback_data="admin:users")],
+            [InlineKeyboardButton("🔙 Voltar", callback_data="admin:back")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -338,7 +325,7 @@ class AdminPanel:
             f"✅ Arquivo CSV exportado com sucesso!\n\n"
             f"📁 {len(all_users)} usuários exportados.",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Voltar", callback_data="admin_users")
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin:users")
             ]])
         )
     
@@ -351,14 +338,12 @@ class AdminPanel:
             await query.edit_message_text("❌ Acesso negado.")
             return
         
-        affiliates = mongo_db.get_collection('affiliates')
-        if not affiliates:
+        # Top afiliados por comissão (ranking em memória)
+        top_affiliates = affiliate_leaderboard.top(10)
+        if not top_affiliates:
             await query.edit_message_text("❌ Nenhum afiliado encontrado.")
             return
         
-        # Top afiliados por comissão
-        top_affiliates = list(affiliates.find().sort('total_commission', -1).limit(10))
-        
         affiliates_text = "🤖 **Top 10 Afiliados por Comissão**\n\n"
         
         for i, affiliate in enumerate(top_affiliates, 1):
@@ -373,9 +358,9 @@ class AdminPanel:
             )
         
         keyboard = [
-            [InlineKeyboardButton("📤 Exportar Afiliados", callback_data="admin_export_affiliates")],
-            [InlineKeyboardButton("🔄 Atualizar", callback_data="admin_affiliates")],
-            [InlineKeyboardButton("🔙 Voltar", callback_data="admin_back")],
+            [InlineKeyboardButton("📤 Exportar Afiliados", callback_data="admin:export_affiliates")],
+            [InlineKeyboardButton("🔄 Atualizar", callback_data="admin:affiliates")],
+            [InlineKeyboardButton("🔙 Voltar", callback_data="admin:back")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -410,9 +395,9 @@ class AdminPanel:
             queries_text += f"   📝 {query_type}: {query_data}\n\n"
         
         keyboard = [
-            [InlineKeyboardButton("📤 Exportar Consultas", callback_data="admin_export_queries")],
-            [InlineKeyboardButton("🔄 Atualizar", callback_data="admin_queries")],
-            [InlineKeyboardButton("🔙 Voltar", callback_data="admin_back")],
+            [InlineKeyboardButton("📤 Exportar Consultas", callback_data="admin:export_queries")],
+            [InlineKeyboardButton("🔄 Atualizar", callback_data="admin:queries")],
+            [InlineKeyboardButton("🔙 Voltar", callback_data="admin:back")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -427,29 +412,22 @@ class AdminPanel:
             await query.edit_message_text("❌ Acesso negado.")
             return
         
-        affiliates = mongo_db.get_collection('affiliates')
-        if not affiliates:
+        # Saldos lidos do snapshot materializado + lançamentos posteriores
+        try:
+            balances = await asyncio.to_thread(commission_ledger.balances)
+            affiliates = mongo_db.get_collection('affiliates')
+            active_affiliates = await asyncio.to_thread(affiliates.count_documents, {'status': 'active'})
+        except Exception as e:
+            logger.error(f"Erro ao gerar relatório financeiro: {e}")
             await query.edit_message_text("❌ Dados financeiros não disponíveis.")
             return
         
-        # Estatísticas financeiras
-        pipeline = [
-            {
-                '$group': {
-                    '_id': None,
-                    'total_commission': {'$sum': '$total_commission'},
-                    'pending_commission': {'$sum': '$pending_commission'},
-                    'paid_commission': {'$sum': '$paid_commission'},
-                    'active_affiliates': {'$sum': 1}
-                }
-            }
-        ]
-        
-        result = list(affiliates.aggregate(pipeline))
-        if not result:
-            finance_data = {'total_commission': 0, 'pending_commission': 0, 'paid_commission': 0, 'active_affiliates': 0}
-        else:
-            finance_data = result[0]
+        finance_data = {
+            'total_commission': balances['total'],
+            'pending_commission': balances['pending'],
+            'paid_commission': balances['paid'],
+            'active_affiliates': active_affiliates
+        }
         
         finance_text = (
             "💰 **Relatório Financeiro**\n\n"
@@ -462,8 +440,8 @@ class AdminPanel:
         )
         
         keyboard = [
-            [InlineKeyboardButton("📊 Estatísticas Detalhadas", callback_data="admin_stats")],
-            [InlineKeyboardButton("🔙 Voltar", callback_data="admin_back")],
+            [InlineKeyboardButton("📊 Estatísticas Detalhadas", callback_data="admin:stats")],
+            [InlineKeyboardButton("🔙 Voltar", callback_data="admin:back")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -500,8 +478,8 @@ class AdminPanel:
         settings_text += "\n".join(apis_status)
         
         keyboard = [
-            [InlineKeyboardButton("🔄 Verificar Conexões", callback_data="admin_check_connections")],
-            [InlineKeyboardButton("🔙 Voltar", callback_data="admin_back")],
+            [InlineKeyboardButton("🔄 Verificar Conexões", callback_data="admin:check_connections")],
+            [InlineKeyboardButton("🔙 Voltar", callback_data="admin:back")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -557,36 +535,14 @@ class AdminPanel:
         
         connection_text += "\n".join(test_results)
         
-        keyboard = [[InlineKeyboardButton("🔙 Voltar", callback_data="admin_settings")]]
+        keyboard = [[InlineKeyboardButton("🔙 Voltar", callback_data="admin:settings")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(connection_text, reply_markup=reply_markup, parse_mode='Markdown')
     
-    async def admin_callback_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Manipular callbacks do painel administrativo"""
-        query = update.callback_query
-        await query.answer()
-        
-        callback_data = query.data
-        
-        if callback_data == "admin_stats":
-            await self.admin_stats_detailed(update, context)
-        elif callback_data == "admin_users":
-            await self.admin_manage_users(update, context)
-        elif callback_data == "admin_affiliates":
-            await self.admin_manage_affiliates(update, context)
-        elif callback_data == "admin_queries":
-            await self.admin_recent_queries(update, context)
-        elif callback_data == "admin_finance":
-            await self.admin_financial_report(update, context)
-        elif callback_data == "admin_settings":
-            await self.admin_settings(update, context)
-        elif callback_data == "admin_export_users":
-            await self.admin_export_users(update, context)
-        elif callback_data == "admin_check_connections":
-            await self.admin_check_connections(update, context)
-        elif callback_data == "admin_back":
-            await self.admin_dashboard_callback(update, context)
+    async def admin_unavailable_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Botões do painel sem ação implementada (ex.: exportar afiliados/consultas)"""
+        await update.callback_query.answer("🚧 Opção ainda não disponível.")
     
     async def admin_dashboard_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Voltar ao dashboard principal (versão callback)"""
@@ -616,12 +572,12 @@ class AdminPanel:
         )
         
         keyboard = [
-            [InlineKeyboardButton("📊 Estatísticas Detalhadas", callback_data="admin_stats")],
-            [InlineKeyboardButton("👥 Gerenciar Usuários", callback_data="admin_users")],
-            [InlineKeyboardButton("🤖 Gerenciar Afiliados", callback_data="admin_affiliates")],
-            [InlineKeyboardButton("🔍 Consultas Recentes", callback_data="admin_queries")],
-            [InlineKeyboardButton("💰 Relatório Financeiro", callback_data="admin_finance")],
-            [InlineKeyboardButton("⚙️ Configurações", callback_data="admin_settings")],
+            [InlineKeyboardButton("📊 Estatísticas Detalhadas", callback_data="admin:stats")],
+            [InlineKeyboardButton("👥 Gerenciar Usuários", callback_data="admin:users")],
+            [InlineKeyboardButton("🤖 Gerenciar Afiliados", callback_data="admin:affiliates")],
+            [InlineKeyboardButton("🔍 Consultas Recentes", callback_data="admin:queries")],
+            [InlineKeyboardButton("💰 Relatório Financeiro", callback_data="admin:finance")],
+            [InlineKeyboardButton("⚙️ Configurações", callback_data="admin:settings")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -644,43 +600,188 @@ class AdminPanel:
             return
         
         message = " ".join(context.args)
-        users = mongo_db.get_collection('users')
-        
-        if not users:
+        if mongo_db.get_collection('users') is None:
             await update.message.reply_text("❌ Erro ao acessar banco de dados.")
             return
         
-        # Buscar todos os usuários
-        all_users = users.find({}, {'user_id': 1})
-        user_count = 0
-        error_count = 0
+        # Envio em segundo plano com limite de taxa e checkpoint: sobrevive a reinícios
+        broadcast_id = await broadcast_engine.start_broadcast(
+            f"📢 **Mensagem do JuristBot:**\n\n{message}", update.effective_user.id, update.effective_chat.id
+        )
+        if broadcast_id is None:
+            await update.message.reply_text("❌ Erro ao iniciar o broadcast.")
+
+    async def cancel_broadcast_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Botão de cancelamento da mensagem de progresso do broadcast"""
+        query = update.callback_query
+        if not self.is_admin(query.from_user.id):
+            await query.answer("❌ Acesso restrito.", show_alert=True)
+            return
+        
+        broadcast_id = context.args[0] if context.args else ''
+        cancelled = await asyncio.to_thread(broadcast_engine.cancel, broadcast_id)
+        await query.answer("⛔ Broadcast será interrompido após o lote atual." if cancelled else "Broadcast já finalizado.")
+
+    async def rebuild_affiliate_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Recalcular estatísticas diárias dos afiliados a partir das indicações"""
+        if not await self.admin_access_required(update, context):
+            return
         
-        await update.message.reply_text(f"📤 Iniciando broadcast para {users.count_documents({})} usuários...")
+        affiliate_code = context.args[0] if context.args else None
+        target = f"afiliado `{affiliate_code}`" if affiliate_code else "todos os afiliados"
+        await update.message.reply_text(f"🔄 Recalculando estatísticas de {target}...", parse_mode='Markdown')
         
-        # Enviar mensagem para cada usuário
-        for user in all_users:
-            try:
-                user_id = user['user_id']
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"📢 **Mensagem do JuristBot:**\n\n{message}"
+        try:
+            rebuilt = await asyncio.to_thread(affiliate_stats.rebuild, affiliate_code)
+            await update.message.reply_text(f"✅ Estatísticas recalculadas para {rebuilt} afiliado(s).")
+        except Exception as e:
+            logger.error(f"Erro ao recalcular estatísticas de afiliados: {e}")
+            await update.message.reply_text("❌ Erro ao recalcular estatísticas.")
+
+    def _audit_cpfs(self, collection_name: str, normalize: bool, batch_size: int = 50000) -> Dict[str, int]:
+        """Validar os CPFs de uma coleção em lotes vetorizados"""
+        collection = mongo_db.get_collection(collection_name)
+        totals = {'total': 0, 'valid': 0, 'invalid': 0, 'unnormalized': 0, 'normalized': 0}
+        cursor = collection.find({'cpf': {'$exists': True, '$ne': None}}, {'cpf': 1}).batch_size(batch_size)
+        
+        def flush(ids: List, values: List[str]):
+            valid, normalized = validate_cpfs(values)
+            formatted = valid & (np.asarray(values, dtype=str) != normalized)
+            totals['total'] += len(values)
+            totals['valid'] += int(valid.sum())
+            totals['invalid'] += int((~valid).sum())
+            totals['unnormalized'] += int(formatted.sum())
+            if normalize and formatted.any():
+                result = collection.bulk_write([
+                    UpdateOne({'_id': ids[i]}, {'$set': {'cpf': str(normalized[i])}})
+                    for i in np.flatnonzero(formatted)
+                ], ordered=False)
+                totals['normalized'] += result.modified_count
+        
+        ids, values = [], []
+        for doc in cursor:
+            ids.append(doc['_id'])
+            values.append(str(doc['cpf']))
+            if len(values) >= batch_size:
+                flush(ids, values)
+                ids, values = [], []
+        if values:
+            flush(ids, values)
+        return totals
+    
+    async def cpf_data_quality(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Relatório de qualidade dos CPFs armazenados (opcionalmente normaliza)"""
+        if not await self.admin_access_required(update, context):
+            return
+        
+        normalize = bool(context.args) and context.args[0].lower() == 'normalizar'
+        await update.message.reply_text("🔄 Verificando CPFs armazenados...")
+        
+        try:
+            report = "🧪 **Qualidade dos CPFs**\n\n"
+            for collection_name in ('users', 'processes'):
+                started = datetime.utcnow()
+                totals = await asyncio.to_thread(self._audit_cpfs, collection_name, normalize)
+                elapsed = (datetime.utcnow() - started).total_seconds()
+                report += (
+                    f"📁 **{collection_name}** ({elapsed:.1f}s)\n"
+                    f"• Com CPF: {totals['total']}\n"
+                    f"• Válidos: {totals['valid']}\n"
+                    f"• Inválidos: {totals['invalid']}\n"
+                    f"• Válidos com formatação: {totals['unnormalized']}\n"
                 )
-                user_count += 1
-                
-                # Pequena pausa para evitar rate limiting
-                import asyncio
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                error_count += 1
-                logger.error(f"Erro ao enviar broadcast para {user_id}: {e}")
+                if normalize:
+                    report += f"• Normalizados agora: {totals['normalized']}\n"
+                report += "\n"
+            
+            if not normalize:
+                report += "💡 Use `/qualidadedados normalizar` para gravar os CPFs válidos só com dígitos."
+            await update.message.reply_text(report, parse_mode='Markdown')
+        except Exception as e:
+            logger.error(f"Erro ao verificar qualidade dos CPFs: {e}")
+            await update.message.reply_text("❌ Erro ao verificar qualidade dos dados.")
+
+    async def bulk_register_affiliates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cadastrar afiliados em lote a partir de IDs de usuários"""
+        if not await self.admin_access_required(update, context):
+            return
+        
+        user_ids = [int(arg) for arg in context.args if arg.isdigit()]
+        if not user_ids:
+            await update.message.reply_text(
+                "💡 **Uso:** /afiliadoslote <id1> <id2> ...\n\n"
+                "Cadastra os usuários informados como afiliados em uma única operação.",
+                parse_mode='Markdown'
+            )
+            return
+        
+        def allocate():
+            users = mongo_db.get_collection('users')
+            profiles = list(users.find(
+                {'user_id': {'$in': user_ids}},
+                {'_id': 0, 'user_id': 1, 'username': 1, 'first_name': 1}
+            ))
+            known = {profile['user_id'] for profile in profiles}
+            profiles += [{'user_id': user_id} for user_id in user_ids if user_id not in known]
+            
+            codes = affiliate_codes.allocate_bulk(profiles)
+            if codes:
+                users.bulk_write([
+                    UpdateOne({'user_id': user_id}, {'$set': {'is_affiliate': True, 'affiliate_code': code}})
+                    for user_id, code in codes.items()
+                ], ordered=False)
+            return codes
+        
+        try:
+            codes = await asyncio.to_thread(allocate)
+        except Exception as e:
+            logger.error(f"Erro no cadastro de afiliados em lote: {e}")
+            await update.message.reply_text("❌ Erro ao cadastrar afiliados em lote.")
+            return
         
         await update.message.reply_text(
-            f"✅ Broadcast concluído!\n\n"
-            f"• ✅ Enviadas: {user_count}\n"
-            f"• ❌ Erros: {error_count}\n"
-            f"• 📊 Total: {user_count + error_count}"
+            f"✅ {len(codes)} de {len(user_ids)} usuário(s) com código de afiliado.\n\n"
+            + "\n".join(f"• {user_id}: `{code}`" for user_id, code in list(codes.items())[:50]),
+            parse_mode='Markdown'
+        )
+
+    async def verify_commission_ledger(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Reconciliar ledger de comissões com os snapshots materializados"""
+        if not await self.admin_access_required(update, context):
+            return
+        
+        try:
+            if context.args and context.args[0] == 'abrir':
+                opened = await asyncio.to_thread(commission_ledger.seed_opening_balances)
+                await update.message.reply_text(f"📒 {opened} lançamento(s) de abertura criados a partir dos afiliados.")
+            
+            if context.args and context.args[0] in ('abrir', 'materializar'):
+                await asyncio.to_thread(commission_ledger.materialize)
+            
+            report = await asyncio.to_thread(commission_ledger.verify)
+        except Exception as e:
+            logger.error(f"Erro ao verificar ledger de comissões: {e}")
+            await update.message.reply_text("❌ Erro ao verificar ledger de comissões.")
+            return
+        
+        if not report['as_of']:
+            await update.message.reply_text("ℹ️ Nenhum snapshot materializado ainda. Use /verificarledger materializar")
+            return
+        
+        text = (
+            "📒 **Verificação do Ledger de Comissões**\n\n"
+            f"• Corte do snapshot: {report['as_of'].strftime('%d/%m/%Y %H:%M')}\n"
+            f"• Afiliados verificados: {report['checked']}\n"
+            f"• Divergências: {len(report['mismatches'])}\n"
         )
+        for mismatch in report['mismatches'][:10]:
+            diffs = ", ".join(
+                f"{field}: snapshot {stored:.2f} × ledger {expected:.2f}"
+                for field, (stored, expected) in mismatch['diffs'].items()
+            )
+            text += f"\n• `{mismatch['affiliate_code']}` - {diffs}"
+        
+        await update.message.reply_text(text, parse_mode='Markdown')
 
 # Instância global do painel administrativo
 admin_panel = AdminPanel()
@@ -688,8 +789,22 @@ admin_panel = AdminPanel()
 # Registrar comandos administrativos
 module_registry.register_command("admin", admin_panel.admin_dashboard, "Painel administrativo (apenas admin)")
 module_registry.register_command("broadcast", admin_panel.broadcast_message, "Enviar mensagem para todos os usuários (apenas admin)")
+module_registry.register_command("afiliadoslote", admin_panel.bulk_register_affiliates, "Cadastrar afiliados em lote (apenas admin)")
+module_registry.register_command("verificarledger", admin_panel.verify_commission_ledger, "Reconciliar ledger de comissões (apenas admin)")
+module_registry.register_command("qualidadedados", admin_panel.cpf_data_quality, "Verificar qualidade dos CPFs armazenados (apenas admin)")
+module_registry.register_command("recalcularstats", admin_panel.rebuild_affiliate_stats, "Recalcular estatísticas de afiliados (apenas admin)")
 
-# Registrar handlers de callback
-module_registry.register_callback("admin_.*", admin_panel.admin_callback_handler)
+# Registrar rotas de callback (admin:<ação>)
+module_registry.register_route('admin', 'stats', admin_panel.admin_stats_detailed)
+module_registry.register_route('admin', 'users', admin_panel.admin_manage_users)
+module_registry.register_route('admin', 'affiliates', admin_panel.admin_manage_affiliates)
+module_registry.register_route('admin', 'queries', admin_panel.admin_recent_queries)
+module_registry.register_route('admin', 'finance', admin_panel.admin_financial_report)
+module_registry.register_route('admin', 'settings', admin_panel.admin_settings)
+module_registry.register_route('admin', 'export_users', admin_panel.admin_export_users)
+module_registry.register_route('admin', 'check_connections', admin_panel.admin_check_connections)
+module_registry.register_route('admin', 'back', admin_panel.admin_dashboard_callback)
+module_registry.register_route('admin', '*', admin_panel.admin_unavailable_callback)
+module_registry.register_route('bcast', 'cancel', admin_panel.cancel_broadcast_callback)
 
 module_registry.register_module("admin")
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import re
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.core.database import mongo_db
+
+logger = logging.getLogger(__name__)
+
+# Base32 de Crockford: sem I, L, O e U para evitar confusão na digitação
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ALPHABET_INDEX = {char: i for i, char in enumerate(ALPHABET)}
+CONFUSABLES = str.maketrans({'I': '1', 'L': '1', 'O': '0'})
+
+CODE_PREFIX = 'JB'
+CODE_BODY_LENGTH = 8  # 40 bits aleatórios
+LEGACY_CODE_PATTERN = re.compile(r'^JURIST\d{6,}[A-Z0-9]{4}$')
+
+class AffiliateCodeAllocator:
+    """Gerador de códigos de afiliado com dígito verificador e registro atômico"""
+
+    def __init__(self, max_retries: int = 5):
+        self.max_retries = max_retries
+
+    @staticmethod
+    def check_char(body: str) -> str:
+        """Dígito verificador Luhn mod 32 (detecta todo erro simples e quase toda transposição adjacente)"""
+        factor = 2
+        total = 0
+        for char in reversed(body):
+            addend = factor * ALPHABET_INDEX[char]
+            factor = 1 if factor == 2 else 2
+            total += addend // 32 + addend % 32
+        return ALPHABET[(32 - total % 32) % 32]
+
+    def generate(self) -> str:
+        """Gerar um novo código no formato JB + 8 caracteres + verificador"""
+        body = ''.join(secrets.choice(ALPHABET) for _ in range(CODE_BODY_LENGTH))
+        return f"{CODE_PREFIX}{body}{self.check_char(body)}"
+
+    def normalize(self, code: str) -> Optional[str]:
+        """Normalizar e validar um código localmente, sem acessar o banco"""
+        if not code:
+            return None
+
+        code = code.strip().upper()
+        if LEGACY_CODE_PATTERN.match(code):
+            return code
+
+        if not code.startswith(CODE_PREFIX) or len(code) != len(CODE_PREFIX) + CODE_BODY_LENGTH + 1:
+            return None
+
+        payload = code[len(CODE_PREFIX):].translate(CONFUSABLES)
+        if any(char not in ALPHABET_INDEX for char in payload):
+            return None
+
+        body, check = payload[:-1], payload[-1]
+        if self.check_char(body) != check:
+            return None
+
+        return f"{CODE_PREFIX}{payload}"
+
+    def is_valid(self, code: str) -> bool:
+        return self.normalize(code) is not None
+
+    @staticmethod
+    def new_affiliate_fields(profile: Dict) -> Dict:
+        """Campos iniciais do documento de afiliado"""
+        return {
+            'username': profile.get('username'),
+            'first_name': profile.get('first_name'),
+            'joined_at': datetime.utcnow(),
+            'status': 'active',
+            'total_commission': 0,
+            'pending_commission': 0,
+            'paid_commission': 0,
+            'referral_count': 0,
+            'conversion_rate': 0,
+            'last_commission_date': None
+        }
+
+    def register(self, user_id: int, profile: Dict) -> Tuple[Dict, bool]:
+        """Registrar afiliado com um único upsert atômico; retorna (documento, criado)"""
+        affiliates = mongo_db.get_collection('affiliates')
+
+        for attempt in range(1, self.max_retries + 1):
+            code = self.generate()
+            try:
+                affiliate = affiliates.find_one_and_update(
+                    {'user_id': user_id},
+                    {'$setOnInsert': {**self.new_affiliate_fields(profile), 'user_id': user_id, 'affiliate_code': code}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                affiliate_code_index.add(affiliate['affiliate_code'], user_id)
+                return affiliate, affiliate['affiliate_code'] == code
+
+            except DuplicateKeyError:
+                # Colisão de código ou upsert concorrente do mesmo usuário (duplo toque)
+                existing = affiliates.find_one({'user_id': user_id})
+                if existing:
+                    return existing, False
+                logger.warning(f"Colisão de código de afiliado (tentativa {attempt}): {code}")
+
+        raise RuntimeError(f"Não foi possível alocar código de afiliado após {self.max_retries} tentativas")
+
+    def allocate_bulk(self, profiles: List[Dict]) -> Dict[int, str]:
+        """Alocar códigos em lote para vários usuários; retorna {user_id: código}"""
+        affiliates = mongo_db.get_collection('affiliates')
+        pending = {profile['user_id']: profile for profile in profiles}
+
+        for attempt in range(1, self.max_retries + 1):
+            if not pending:
+                break
+
+            user_ids = list(pending)
+            codes = set()
+            ops = []
+            for user_id in user_ids:
+                code = self.generate()
+                while code in codes:
+                    code = self.generate()
+                codes.add(code)
+                ops.append(UpdateOne(
+                    {'user_id': user_id},
+                    {'$setOnInsert': {**self.new_affiliate_fields(pending[user_id]), 'user_id': user_id, 'affiliate_code': code}},
+                    upsert=True
+                ))
+
+            try:
+                affiliates.bulk_write(ops, ordered=False)
+                pending = {}
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if any(error.get('code') != 11000 for error in errors):
+                    raise
+                failed = {user_ids[error['index']] for error in errors}
+                # Quem já existe não precisa de nova tentativa
+                existing = {
+                    doc['user_id'] for doc in affiliates.find({'user_id': {'$in': list(failed)}}, {'user_id': 1})
+                }
+                pending = {user_id: pending[user_id] for user_id in failed - existing}
+                if pending:
+                    logger.warning(f"{len(pending)} colisões na alocação em lote (tentativa {attempt})")
+
+        if pending:
+            logger.error(f"❌ Não foi possível alocar códigos para: {list(pending)}")
+
+        requested = [profile['user_id'] for profile in profiles]
+        allocated = {
+            doc['user_id']: doc['affiliate_code']
+            for doc in affiliates.find({'user_id': {'$in': requested}}, {'user_id': 1, 'affiliate_code': 1})
+        }
+        for user_id, code in allocated.items():
+            affiliate_code_index.add(code, user_id)
+        return allocated
+
+class AffiliateCodeIndex:
+    """Índice em memória dos códigos válidos ({código: user_id do afiliado})"""
+
+    def __init__(self, miss_ttl: int = 60, max_misses: int = 10000):
+        self.codes: Dict[str, int] = {}
+        self.loaded = False
+        # Cache negativo: códigos bem formados que não existem ({código: expira_em}),
+        # para que links inválidos repetidos não consultem o Mongo a cada clique
+        self.miss_ttl = miss_ttl
+        self.max_misses = max_misses
+        self.misses: OrderedDict = OrderedDict()
+
+    def _find_owner(self, affiliate_code: str) -> Optional[int]:
+        affiliates = mongo_db.get_collection('affiliates')
+        affiliate = affiliates.find_one({'affiliate_code': affiliate_code}, {'_id': 0, 'user_id': 1})
+        return affiliate['user_id'] if affiliate else None
+
+    def load(self) -> int:
+        """Carregar todos os códigos (executado na inicialização)"""
+        try:
+            affiliates = mongo_db.get_collection('affiliates')
+            self.codes = {
+                doc['affiliate_code']: doc['user_id']
+                for doc in affiliates.find({}, {'_id': 0, 'affiliate_code': 1, 'user_id': 1})
+            }
+            self.loaded = True
+            logger.info(f"✅ {len(self.codes)} códigos de afiliado carregados em memória")
+            return len(self.codes)
+        except Exception as e:
+            logger.error(f"Erro ao carregar códigos de afiliado: {e}")
+            self.loaded = False
+            return 0
+
+    def add(self, affiliate_code: str, user_id: int):
+        """Manter o índice sincronizado após um novo cadastro"""
+        self.codes[affiliate_code] = user_id
+        self.misses.pop(affiliate_code, None)
+
+    def _remember_miss(self, affiliate_code: str):
+        self.misses[affiliate_code] = time.monotonic() + self.miss_ttl
+        self.misses.move_to_end(affiliate_code)
+        while len(self.misses) > self.max_misses:
+            self.misses.popitem(last=False)
+
+    async def owner(self, affiliate_code: str) -> Optional[int]:
+        """user_id do dono de um código bem formado, ou None se o código não existe"""
+        owner = self.codes.get(affiliate_code)
+        if owner is not None:
+            return owner
+
+        expires_at = self.misses.get(affiliate_code)
+        if expires_at is not None:
+            if time.monotonic() < expires_at:
+                return None
+            del self.misses[affiliate_code]
+
+        # Desconhecido aqui: pode ter sido criado por outro worker/instância depois da carga
+        # (o cache negativo expira em miss_ttl, então o atraso máximo é esse)
+        owner = await asyncio.to_thread(self._find_owner, affiliate_code)
+        if owner is not None:
+            self.add(affiliate_code, owner)
+        else:
+            self._remember_miss(affiliate_code)
+        return owner
+
+    async def start(self, application=None):
+        await asyncio.to_thread(self.load)
+
+# Instância global do alocador de códigos
+affiliate_codes = AffiliateCodeAllocator()
+
+# Índice global de códigos válidos
+affiliate_code_index = AffiliateCodeIndex()
@@ -0,0 +1,157 @@
+import asyncio
+import heapq
+import logging
+import threading
+from typing import Dict, List, Optional
+from app.core.database import mongo_db
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = {'_id': 0, 'affiliate_code': 1, 'total_commission': 1, 'username': 1, 'first_name': 1, 'referral_count': 1}
+
+class AffiliateLeaderboard:
+    """Top-N de afiliados por comissão mantido em memória e atualizado por eventos
+
+    Só os top_n primeiros ficam em memória (min-heap por comissão, semeado
+    pelo índice em total_commission com limit). A posição de quem está fora
+    do top é contada no índice; não há varredura da coleção.
+    """
+
+    def __init__(self, top_n: int = 100, refresh_interval: int = 900):
+        self.top_n = top_n
+        # Ressemeadura periódica (top_n documentos) para incorporar comissões de outras instâncias
+        self.refresh_interval = refresh_interval
+        self.refresh_task: Optional[asyncio.Task] = None
+        # código -> {'total_commission', 'first_name', 'username', 'referral_count'}
+        self.entries: Dict[str, Dict] = {}
+        # Min-heap de (comissão, código): o menor do top fica na raiz, pronto para sair
+        self.heap: List[tuple] = []
+        self.loaded = False
+        # O pipeline atualiza a partir de uma thread de trabalho
+        self.lock = threading.Lock()
+
+    def _collection(self):
+        return mongo_db.get_collection('affiliates')
+
+    @staticmethod
+    def _entry(doc: Dict) -> Dict:
+        return {
+            'total_commission': doc.get('total_commission', 0) or 0,
+            'username': doc.get('username'),
+            'first_name': doc.get('first_name'),
+            'referral_count': doc.get('referral_count', 0) or 0
+        }
+
+    def _rebuild_heap(self):
+        self.heap = [(entry['total_commission'], code) for code, entry in self.entries.items()]
+        heapq.heapify(self.heap)
+
+    def _offer(self, affiliate_code: str, entry: Dict):
+        """Incluir/atualizar no top, removendo o menor quando passar de top_n (com a trava)"""
+        self.entries[affiliate_code] = entry
+        if len(self.entries) > self.top_n:
+            self._rebuild_heap()
+            _, evicted = heapq.heappop(self.heap)
+            del self.entries[evicted]
+        else:
+            self._rebuild_heap()
+
+    def load(self) -> int:
+        """Semear o top a partir do índice em total_commission (só top_n documentos)"""
+        cursor = self._collection().find({}, PROFILE_FIELDS).sort('total_commission', -1).limit(self.top_n)
+        entries = {doc['affiliate_code']: self._entry(doc) for doc in cursor}
+        with self.lock:
+            self.entries = entries
+            self._rebuild_heap()
+            self.loaded = True
+        logger.info(f"✅ Top de afiliados carregado ({len(entries)} afiliados)")
+        return len(entries)
+
+    def add_affiliate(self, affiliate_code: str, profile: Dict):
+        """Incluir um afiliado recém-cadastrado (comissão zero) se ainda houver vaga no top"""
+        with self.lock:
+            if affiliate_code not in self.entries and len(self.entries) < self.top_n:
+                self._offer(affiliate_code, self._entry({**profile, 'total_commission': 0, 'referral_count': 0}))
+
+    def record_referral(self, affiliate_code: str):
+        """Manter o contador de indicações de quem está no top"""
+        with self.lock:
+            entry = self.entries.get(affiliate_code)
+            if entry is not None:
+                entry['referral_count'] += 1
+
+    def apply_commissions(self, deltas: Dict[str, float]):
+        """Aplicar incrementos de comissão (chamado após cada lote do pipeline, fora do loop)"""
+        if not self.loaded or not deltas:
+            return
+        with self.lock:
+            outside = []
+            for affiliate_code, delta in deltas.items():
+                entry = self.entries.get(affiliate_code)
+                if entry is None:
+                    outside.append(affiliate_code)
+                    continue
+                entry['total_commission'] += delta
+            self._rebuild_heap()
+            floor = self.heap[0][0] if len(self.entries) >= self.top_n and self.heap else None
+
+        if not outside:
+            return
+        # Só quem passou o menor do top precisa entrar: uma leitura pelo código do afiliado
+        query = {'affiliate_code': {'$in': outside}}
+        if floor is not None:
+            query['total_commission'] = {'$gt': floor}
+        candidates = list(self._collection().find(query, PROFILE_FIELDS))
+        with self.lock:
+            for doc in candidates:
+                self._offer(doc['affiliate_code'], self._entry(doc))
+
+    def top(self, limit: int = 10) -> List[Dict]:
+        """Top afiliados servido da memória"""
+        with self.lock:
+            ordered = sorted(self.entries.items(), key=lambda item: (-item[1]['total_commission'], item[0]))
+        return [
+            {'rank': i, 'affiliate_code': code, **entry}
+            for i, (code, entry) in enumerate(ordered[:min(limit, self.top_n)], 1)
+        ]
+
+    def _count_rank(self, affiliate_code: str, total_commission: Optional[float]) -> Optional[int]:
+        affiliates = self._collection()
+        if total_commission is None:
+            doc = affiliates.find_one({'affiliate_code': affiliate_code}, {'_id': 0, 'total_commission': 1})
+            if doc is None:
+                return None
+            total_commission = doc.get('total_commission', 0) or 0
+        return affiliates.count_documents({'total_commission': {'$gt': total_commission}}) + 1
+
+    async def rank(self, affiliate_code: str, total_commission: Optional[float] = None) -> Optional[int]:
+        """Posição de um afiliado (empates ficam com a mesma posição)"""
+        with self.lock:
+            entry = self.entries.get(affiliate_code)
+            if entry is not None:
+                return sum(1 for other in self.entries.values() if other['total_commission'] > entry['total_commission']) + 1
+        # Fora do top: contagem no índice em total_commission
+        return await asyncio.to_thread(self._count_rank, affiliate_code, total_commission)
+
+    async def size(self) -> int:
+        return await asyncio.to_thread(self._collection().estimated_document_count)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.error(f"Erro ao carregar ranking de afiliados: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self, application=None):
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self, application=None):
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            self.refresh_task = None
+
+# Instância global do ranking de afiliados
+affiliate_leaderboard = AffiliateLeaderboard()
@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.database import mongo_db
+from app.modules.affiliate_stats import affiliate_stats
+from app.modules.commission_ledger import commission_ledger
+from app.modules.affiliate_leaderboard import affiliate_leaderboard
+
+logger = logging.getLogger(__name__)
+
+# Marcas de eventos mantidas em cada documento incrementado sem transação
+APPLIED_EVENTS_KEPT = 1000
+
+class ConversionPipeline:
+    """Fila de conversões aplicadas em lote por um worker em segundo plano"""
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_queue_size: int = 50000, max_attempts: int = 5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.max_attempts = max_attempts
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker_task: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        """Criar fila e worker no loop em execução (lazy)"""
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self.worker_task is None or self.worker_task.done():
+            self.worker_task = asyncio.get_running_loop().create_task(self._run())
+
+    async def emit(self, user_id: int, service_type: str, amount: float, commission_rate: float,
+                   event_id: Optional[str] = None) -> str:
+        """Enfileirar um evento de conversão e retornar seu event_id"""
+        event = {
+            'event_id': event_id or uuid.uuid4().hex,
+            'user_id': user_id,
+            'service_type': service_type,
+            'amount': amount,
+            'commission': amount * commission_rate,
+            'created_at': datetime.utcnow()
+        }
+        self._ensure_worker()
+        # Só bloqueia quando a fila está cheia (backpressure)
+        await self.queue.put(event)
+        return event['event_id']
+
+    def queue_size(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def _run(self):
+        """Loop do worker: agrupar eventos e aplicar em lote"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict]):
+        """Aplicar lote com retentativas e backoff exponencial"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                affiliates = await asyncio.to_thread(self.apply_batch, batch)
+                logger.debug(f"Lote de {len(batch)} conversões aplicado ({affiliates} afiliados)")
+                break
+            except Exception as e:
+                logger.error(f"Erro ao aplicar lote de conversões (tentativa {attempt}): {e}")
+                if attempt == self.max_attempts:
+                    await asyncio.to_thread(self.park, batch, str(e))
+                else:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+        for _ in batch:
+            self.queue.task_done()
+
+    def park(self, events: List[Dict], error: str):
+        """Guardar um lote que esgotou as tentativas; reaplicado na próxima inicialização"""
+        try:
+            parked = mongo_db.get_collection('conversion_dead_letters')
+            if parked is None:
+                raise ConnectionError("MongoDB indisponível")
+            now = datetime.utcnow()
+            parked.bulk_write([
+                UpdateOne(
+                    {'_id': event['event_id']},
+                    {'$set': {'event': event, 'error': error, 'failed_at': now}, '$inc': {'failures': 1}},
+                    upsert=True
+                )
+                for event in events
+            ], ordered=False)
+            logger.error(f"❌ Lote de {len(events)} conversões guardado em conversion_dead_letters após {self.max_attempts} tentativas")
+        except Exception as e:
+            # Último recurso: o lote completo no log para reaplicação manual
+            logger.critical(f"❌ Lote de conversões perdido ({e}); eventos: {events}")
+
+    def _load_parked(self, limit: int = 10000) -> List[Dict]:
+        parked = mongo_db.get_collection('conversion_dead_letters')
+        if parked is None:
+            return []
+        return [{**doc['event'], 'parked': True} for doc in parked.find({}, {'event': 1}).limit(limit)]
+
+    async def start(self, application=None):
+        """Reenfileirar os lotes guardados por falha (o event_id evita aplicação dupla)"""
+        try:
+            events = await asyncio.to_thread(self._load_parked)
+        except Exception as e:
+            logger.error(f"Erro ao carregar conversões guardadas: {e}")
+            return
+        if not events:
+            return
+        self._ensure_worker()
+        for event in events:
+            await self.queue.put(event)
+        logger.info(f"🔁 {len(events)} conversões guardadas reenfileiradas")
+
+    def apply_batch(self, events: List[Dict]) -> int:
+        """Aplicar lote no MongoDB (fora do event loop); retorna nº de afiliados afetados"""
+        users = mongo_db.get_collection('users')
+        if users is None:
+            raise ConnectionError("MongoDB indisponível")
+
+        # Uma única leitura para descobrir os afiliados de todos os usuários do lote
+        user_ids = list({event['user_id'] for event in events})
+        referred_by = {
+            user['user_id']: user['referred_by']
+            for user in users.find(
+                {'user_id': {'$in': user_ids}, 'referred_by': {'$ne': None}},
+                {'user_id': 1, 'referred_by': 1}
+            )
+        }
+
+        parked = [event['event_id'] for event in events if event.get('parked')]
+        events = [event for event in events if event['user_id'] in referred_by]
+        affiliate_totals = {}
+        if events:
+            affiliate_totals = mongo_db.run_in_transaction(
+                lambda session: self._apply_events(events, referred_by, session)
+            )
+            # Só após o commit: atualizar o ranking em memória
+            affiliate_leaderboard.apply_commissions(affiliate_totals)
+        if parked:
+            mongo_db.get_collection('conversion_dead_letters').delete_many({'_id': {'$in': parked}})
+        return len(affiliate_totals)
+
+    def _claim_events(self, events: List[Dict], session) -> List[Dict]:
+        """Registrar event_ids e retornar apenas os eventos ainda não aplicados
+
+        Com transação o registro já nasce aplicado (desfeito junto se o lote
+        falhar). Sem transação ele fica pendente até o fim do lote: a nova
+        tentativa reprocessa os pendentes e as marcas por evento nos documentos
+        evitam somar de novo o que já foi gravado.
+        """
+        conversion_events = mongo_db.get_collection('conversion_events')
+        event_ids = [event['event_id'] for event in events]
+        # Registros antigos, sem o campo applied, contam como aplicados
+        applied = {
+            doc['_id'] for doc in conversion_events.find(
+                {'_id': {'$in': event_ids}, 'applied': {'$ne': False}}, {'_id': 1}, session=session
+            )
+        }
+        fresh = [event for event in events if event['event_id'] not in applied]
+        if not fresh:
+            return []
+
+        conversion_events.bulk_write([
+            UpdateOne(
+                {'_id': event['event_id']},
+                {'$setOnInsert': {'user_id': event['user_id'], 'created_at': event['created_at'],
+                                  'applied': session is not None}},
+                upsert=True
+            )
+            for event in fresh
+        ], ordered=False, session=session)
+        return fresh
+
+    @staticmethod
+    def _marked(event_id: str, query: Dict, update: Dict) -> tuple:
+        """Condicionar o incremento à ausência da marca do evento no próprio documento"""
+        update = {**update, '$push': {'applied_events': {'$each': [event_id], '$slice': -APPLIED_EVENTS_KEPT}}}
+        return {**query, 'applied_events': {'$ne': event_id}}, update
+
+    @staticmethod
+    def _bulk_write(collection, ops: List, session):
+        if not ops:
+            return
+        try:
+            collection.bulk_write(ops, ordered=False, session=session)
+        except BulkWriteError as e:
+            # Sem transação, upsert com a marca já presente colide com o documento existente
+            errors = e.details.get('writeErrors', [])
+            if session is not None or any(error.get('code') != 11000 for error in errors):
+                raise
+
+    def _apply_events(self, events: List[Dict], referred_by: Dict[int, str], session) -> Dict[str, float]:
+        """Aplicar eventos: marcar indicações e somar comissões; retorna comissão por afiliado"""
+        events = self._claim_events(events, session)
+        if not events:
+            return {}
+
+        now = datetime.utcnow()
+        referrals = mongo_db.get_collection('referrals')
+        affiliates = mongo_db.get_collection('affiliates')
+
+        # Indicações que convertem pela primeira vez neste lote
+        user_ids = list({event['user_id'] for event in events})
+        first_conversions = {
+            (referral['affiliate_code'], referral['referred_user_id'])
+            for referral in referrals.find(
+                {'referred_user_id': {'$in': user_ids}, 'has_converted': False},
+                {'affiliate_code': 1, 'referred_user_id': 1},
+                session=session
+            )
+        }
+
+        first_events = {}
+        affiliate_totals = {}
+        for event in events:
+            key = (referred_by[event['user_id']], event['user_id'])
+            first_events.setdefault(key, event)
+            affiliate_totals[key[0]] = affiliate_totals.get(key[0], 0.0) + event['commission']
+
+        if session is None:
+            referral_ops, affiliate_ops, stats_ops = self._event_ops(events, referred_by, first_events, first_conversions, now)
+        else:
+            referral_ops, affiliate_ops, stats_ops = self._batch_ops(events, referred_by, first_events, first_conversions, now)
+
+        # Sem transação a ordem importa: estatísticas antes das indicações, para que
+        # uma nova tentativa ainda reconheça a primeira conversão
+        commission_ledger.append([
+            commission_ledger.accrual(referred_by[event['user_id']], event['commission'], event)
+            for event in events
+        ], session=session)
+        self._bulk_write(mongo_db.get_collection('affiliate_stats'), stats_ops, session)
+        self._bulk_write(affiliates, affiliate_ops, session)
+        self._bulk_write(referrals, referral_ops, session)
+        if session is None:
+            mongo_db.get_collection('conversion_events').update_many(
+                {'_id': {'$in': [event['event_id'] for event in events]}}, {'$set': {'applied': True}}
+            )
+
+        for affiliate_code, commission in affiliate_totals.items():
+            logger.info(f"Comissão de R$ {commission:.2f} registrada para afiliado {affiliate_code}")
+
+        return affiliate_totals
+
+    @staticmethod
+    def _conversion_set(event: Dict) -> Dict:
+        return {
+            'has_converted': True,
+            'conversion_date': event['created_at'],
+            'conversion_type': event['service_type']
+        }
+
+    def _batch_ops(self, events, referred_by, first_events, first_conversions, now) -> tuple:
+        """Operações agregadas por indicação/afiliado/dia (dentro de transação)"""
+        referral_totals = {}
+        affiliate_totals = {}
+        stats_buckets = {}
+        for event in events:
+            key = (referred_by[event['user_id']], event['user_id'])
+            referral_totals[key] = referral_totals.get(key, 0.0) + event['commission']
+            affiliate_totals[key[0]] = affiliate_totals.get(key[0], 0.0) + event['commission']
+            # Comissão no dia do evento; a conversão no dia do primeiro evento da indicação
+            bucket = stats_buckets.setdefault(
+                (key[0], affiliate_stats.day_key(event['created_at'])), {'conversions': 0, 'commission': 0.0}
+            )
+            bucket['commission'] += event['commission']
+            if first_events[key] is event and key in first_conversions:
+                bucket['conversions'] += 1
+
+        referral_ops = []
+        for (affiliate_code, user_id), commission in referral_totals.items():
+            first_event = first_events[(affiliate_code, user_id)]
+            update = {'$inc': {'commission_amount': commission}}
+            if (affiliate_code, user_id) in first_conversions:
+                update['$set'] = self._conversion_set(first_event)
+            referral_ops.append(UpdateOne(
+                {'affiliate_code': affiliate_code, 'referred_user_id': user_id},
+                update
+            ))
+
+        affiliate_ops = [
+            UpdateOne(
+                {'affiliate_code': affiliate_code},
+                {
+                    '$inc': {'total_commission': commission, 'pending_commission': commission},
+                    '$set': {'last_commission_date': now}
+                }
+            )
+            for affiliate_code, commission in affiliate_totals.items()
+        ]
+        return referral_ops, affiliate_ops, affiliate_stats.conversion_ops(stats_buckets)
+
+    def _event_ops(self, events, referred_by, first_events, first_conversions, now) -> tuple:
+        """Uma operação por evento, condicionada à marca do evento (sem transação)"""
+        referral_ops, affiliate_ops, stats_ops = [], [], []
+        for event in events:
+            affiliate_code, user_id = key = (referred_by[event['user_id']], event['user_id'])
+            event_id, commission = event['event_id'], event['commission']
+            converts = first_events[key] is event and key in first_conversions
+
+            update = {'$inc': {'commission_amount': commission}}
+            if converts:
+                update['$set'] = self._conversion_set(event)
+            referral_ops.append(UpdateOne(*self._marked(
+                event_id, {'affiliate_code': affiliate_code, 'referred_user_id': user_id}, update
+            )))
+            affiliate_ops.append(UpdateOne(*self._marked(
+                event_id,
+                {'affiliate_code': affiliate_code},
+                {
+                    '$inc': {'total_commission': commission, 'pending_commission': commission},
+                    '$set': {'last_commission_date': now}
+                }
+            )))
+            stats_ops.append(UpdateOne(*self._marked(
+                event_id,
+                {'_id': affiliate_code},
+                affiliate_stats.conversion_update(
+                    affiliate_stats.day_key(event['created_at']), int(converts), commission
+                )
+            ), upsert=True))
+        return referral_ops, affiliate_ops, stats_ops
+
+    async def stop(self, application=None):
+        """Drenar a fila e encerrar o worker"""
+        if self.queue is not None and self.worker_task is not None and not self.worker_task.done():
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=30)
+            except asyncio.TimeoutError:
+                logger.warning(f"Encerrando com {self.queue.qsize()} conversões pendentes na fila")
+            self.worker_task.cancel()
+        self.worker_task = None
+
+# Instância global do pipeline de conversões
+conversion_pipeline = ConversionPipeline()
@@ -0,0 +1,172 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+from app.core.database import mongo_db
+
+logger = logging.getLogger(__name__)
+
+class AffiliateStats:
+    """Estatísticas por afiliado em buckets diários mantidos incrementalmente"""
+
+    def __init__(self, retention_days: int = 35):
+        # Janela do dashboard (30 dias) + margem para fuso/atrasos
+        self.retention_days = retention_days
+
+    @staticmethod
+    def day_key(moment: datetime) -> str:
+        return moment.strftime('%Y%m%d')
+
+    def referral_update(self, moment: Optional[datetime] = None) -> Dict:
+        """Documento de incremento para uma nova indicação"""
+        day = self.day_key(moment or datetime.utcnow())
+        return {'$inc': {f'days.{day}.referrals': 1, 'total_referrals': 1}, '$set': {'updated_at': datetime.utcnow()}}
+
+    def referral_op(self, affiliate_code: str, moment: Optional[datetime] = None) -> UpdateOne:
+        """Operação de bulk_write para uma nova indicação"""
+        return UpdateOne({'_id': affiliate_code}, self.referral_update(moment), upsert=True)
+
+    def conversion_update(self, day: str, conversions: int, commission: float) -> Dict:
+        """Documento de incremento para conversões de um afiliado em um dia"""
+        return {
+            '$inc': {
+                f'days.{day}.conversions': conversions,
+                f'days.{day}.commission': commission,
+                'total_conversions': conversions
+            },
+            '$set': {'updated_at': datetime.utcnow()}
+        }
+
+    def conversion_ops(self, buckets: Dict[tuple, Dict[str, float]]) -> List[UpdateOne]:
+        """Operações de incremento para conversões agrupadas por (afiliado, dia)"""
+        return [
+            UpdateOne(
+                {'_id': affiliate_code},
+                self.conversion_update(day, values.get('conversions', 0), values.get('commission', 0.0)),
+                upsert=True
+            )
+            for (affiliate_code, day), values in buckets.items()
+        ]
+
+    def record_referral(self, affiliate_code: str) -> bool:
+        """Incrementar o bucket diário de indicações"""
+        try:
+            stats = mongo_db.get_collection('affiliate_stats')
+            stats.update_one({'_id': affiliate_code}, self.referral_update(), upsert=True)
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao atualizar estatísticas do afiliado: {e}")
+            return False
+
+    def summarize(self, days_map: Optional[Dict], days: int = 30) -> Tuple[Dict, List[str]]:
+        """Resumo da janela recente a partir dos buckets já lidos; devolve também os dias fora da retenção"""
+        summary = {'referrals': 0, 'conversions': 0, 'commission': 0.0}
+        now = datetime.utcnow()
+        window_start = self.day_key(now - timedelta(days=days - 1))
+        retention_start = self.day_key(now - timedelta(days=self.retention_days))
+
+        expired = []
+        for day, bucket in (days_map or {}).items():
+            if day < retention_start:
+                expired.append(day)
+            elif day >= window_start:
+                summary['referrals'] += bucket.get('referrals', 0)
+                summary['conversions'] += bucket.get('conversions', 0)
+                summary['commission'] += bucket.get('commission', 0.0)
+        return summary, expired
+
+    def prune(self, affiliate_code: str, expired: List[str]):
+        """Remover buckets fora da retenção (oportunista, fora do event loop)"""
+        if not expired:
+            return
+        try:
+            stats = mongo_db.get_collection('affiliate_stats')
+            stats.update_one({'_id': affiliate_code}, {'$unset': {f'days.{day}': '' for day in expired}})
+        except Exception as e:
+            logger.warning(f"Erro ao podar buckets antigos de {affiliate_code}: {e}")
+
+    def rebuild(self, affiliate_code: Optional[str] = None) -> int:
+        """Recalcular os buckets: indicações e conversões de referrals, comissão dos lançamentos do ledger
+
+        Como no caminho incremental, a comissão de cada conversão entra no dia
+        do evento e a conversão conta no dia da primeira conversão da indicação.
+        """
+        referrals = mongo_db.get_collection('referrals')
+        ledger = mongo_db.get_collection('commission_ledger')
+        stats = mongo_db.get_collection('affiliate_stats')
+        since = datetime.utcnow() - timedelta(days=self.retention_days)
+
+        match = {'affiliate_code': affiliate_code} if affiliate_code else {}
+
+        def by_day(field: str) -> Dict:
+            return {'$dateToString': {'format': '%Y%m%d', 'date': field}}
+
+        docs: Dict[str, Dict] = {}
+
+        referral_rows = referrals.aggregate([
+            {'$match': {**match, 'created_at': {'$gte': since}}},
+            {'$group': {'_id': {'code': '$affiliate_code', 'day': by_day('$created_at')}, 'referrals': {'$sum': 1}}}
+        ])
+        for row in referral_rows:
+            doc = docs.setdefault(row['_id']['code'], {'days': {}})
+            doc['days'].setdefault(row['_id']['day'], {})['referrals'] = row['referrals']
+
+        conversion_rows = referrals.aggregate([
+            {'$match': {**match, 'has_converted': True, 'conversion_date': {'$gte': since}}},
+            {'$group': {
+                '_id': {'code': '$affiliate_code', 'day': by_day('$conversion_date')},
+                'conversions': {'$sum': 1}
+            }}
+        ])
+        for row in conversion_rows:
+            doc = docs.setdefault(row['_id']['code'], {'days': {}})
+            doc['days'].setdefault(row['_id']['day'], {})['conversions'] = row['conversions']
+
+        # Lançamentos anteriores ao event_at usam a data do lançamento (segundos depois do evento)
+        event_at = {'$ifNull': ['$event_at', '$created_at']}
+        commission_rows = ledger.aggregate([
+            {'$match': {**match, 'type': 'accrual', 'created_at': {'$gte': since - timedelta(days=1)}}},
+            {'$match': {'$expr': {'$gte': [event_at, since]}}},
+            {'$group': {
+                '_id': {'code': '$affiliate_code', 'day': by_day(event_at)},
+                'commission': {'$sum': '$total'}
+            }}
+        ])
+        for row in commission_rows:
+            doc = docs.setdefault(row['_id']['code'], {'days': {}})
+            doc['days'].setdefault(row['_id']['day'], {})['commission'] = row['commission']
+
+        totals = referrals.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': '$affiliate_code',
+                'total_referrals': {'$sum': 1},
+                'total_conversions': {'$sum': {'$cond': ['$has_converted', 1, 0]}}
+            }}
+        ])
+        for row in totals:
+            doc = docs.setdefault(row['_id'], {'days': {}})
+            doc['total_referrals'] = row['total_referrals']
+            doc['total_conversions'] = row['total_conversions']
+
+        now = datetime.utcnow()
+        # $set em vez de substituir: preserva as marcas de eventos do pipeline de conversões
+        ops = [
+            UpdateOne({'_id': code}, {'$set': {**doc, 'updated_at': now, 'rebuilt_at': now}}, upsert=True)
+            for code, doc in docs.items()
+        ]
+        for i in range(0, len(ops), 1000):
+            stats.bulk_write(ops[i:i + 1000], ordered=False)
+
+        # Afiliados sem nenhuma linha no recálculo: buckets antigos não podem sobreviver
+        scope = {'_id': affiliate_code} if affiliate_code else {}
+        stats.update_many(
+            {**scope, 'rebuilt_at': {'$ne': now}},
+            {'$set': {'days': {}, 'total_referrals': 0, 'total_conversions': 0, 'updated_at': now, 'rebuilt_at': now}}
+        )
+
+        logger.info(f"✅ Estatísticas recalculadas para {len(docs)} afiliados")
+        return len(docs)
+
+# Instância global das estatísticas de afiliados
+affiliate_stats = AffiliateStats()
@@ -1,13 +1,22 @@
 import logging
-import random
-import string
+import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+from pymongo.errors import DuplicateKeyError
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler
+from telegram.ext import ContextTypes
+from telegram.helpers import escape_markdown
 from app.core.registry import module_registry
 from app.core.database import mongo_db
+from app.core.cache import NearCache, cache_backend
 from app.core.config import Config
+from app.core.health import health_monitor
+from app.modules.affiliate_pipeline import conversion_pipeline
+from app.modules.affiliate_stats import affiliate_stats
+from app.modules.affiliate_codes import affiliate_codes, affiliate_code_index
+from app.modules.commission_ledger import commission_ledger
+from app.modules.affiliate_leaderboard import affiliate_leaderboard
 
 logger = logging.getLogger(__name__)
 
@@ -18,49 +27,55 @@ class AffiliateSystem:
             'process_consultation': 0.15,  # 15% para consultas de processos
             'document_analysis': 0.20,  # 20% para análise de documentos
         }
+        
+        # Usuários atribuídos recentemente: /start repetido não chega ao banco
+        self.recent_attributions = OrderedDict()
+        self.max_recent_attributions = 100000
+        
+        # Identidade do afiliado por user_id (inclusive "não é afiliado"), compartilhada entre instâncias
+        self.profiles = NearCache('affiliate_profile', cache_backend, ttl=3600, local_ttl=60, cache_none=True)
+    
+    def _find_profile(self, user_id: int) -> Optional[Dict]:
+        affiliates = mongo_db.get_collection('affiliates')
+        return affiliates.find_one({'user_id': user_id}, {'_id': 0, 'affiliate_code': 1, 'first_name': 1, 'username': 1})
+    
+    async def get_profile(self, user_id: int) -> Optional[Dict]:
+        """Código e nome do afiliado (None se não for afiliado); totais devem ser lidos do banco"""
+        return await self.profiles.get(str(user_id), lambda: asyncio.to_thread(self._find_profile, user_id))
     
-    def generate_affiliate_code(self, user_id: int) -> str:
-        """Gerar código de afiliado único"""
-        base_code = f"JURIST{user_id:06d}"
-        random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-        return f"{base_code}{random_suffix}"
+    def generate_affiliate_code(self, user_id: int = None) -> str:
+        """Gerar código de afiliado com dígito verificador"""
+        return affiliate_codes.generate()
     
     async def register_affiliate(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Registrar usuário como afiliado"""
         user_id = update.effective_user.id
         user = update.effective_user
         
-        # Verificar se já é afiliado
-        affiliates = mongo_db.get_collection('affiliates')
-        existing_affiliate = affiliates.find_one({'user_id': user_id})
+        # Upsert atômico: um duplo toque em /afiliado devolve o registro existente
+        try:
+            affiliate, created = affiliate_codes.register(user_id, {
+                'username': user.username,
+                'first_name': user.first_name
+            })
+        except Exception as e:
+            logger.error(f"Erro ao registrar afiliado {user_id}: {e}")
+            await update.message.reply_text("❌ Não foi possível concluir seu cadastro agora. Tente novamente.")
+            return
         
-        if existing_affiliate:
+        if not created:
             await update.message.reply_text(
                 "✅ Você já é um afiliado!\n\n"
-                f"🔗 Seu código: `{existing_affiliate['affiliate_code']}`\n"
-                f"💰 Comissão total: R$ {existing_affiliate.get('total_commission', 0):.2f}\n\n"
+                f"🔗 Seu código: `{affiliate['affiliate_code']}`\n"
+                f"💰 Comissão total: R$ {affiliate.get('total_commission', 0):.2f}\n\n"
                 "Use /meuafiliado para ver seu dashboard."
             )
             return
         
-        # Criar novo afiliado
-        affiliate_code = self.generate_affiliate_code(user_id)
-        affiliate_data = {
-            'user_id': user_id,
-            'username': user.username,
-            'first_name': user.first_name,
-            'affiliate_code': affiliate_code,
-            'joined_at': datetime.utcnow(),
-            'status': 'active',
-            'total_commission': 0,
-            'pending_commission': 0,
-            'paid_commission': 0,
-            'referral_count': 0,
-            'conversion_rate': 0,
-            'last_commission_date': None
-        }
-        
-        affiliates.insert_one(affiliate_data)
+        affiliate_code = affiliate['affiliate_code']
+        affiliate_leaderboard.add_affiliate(affiliate_code, affiliate)
+        # "Não é afiliado" pode estar em cache nesta e em outras instâncias
+        await self.profiles.invalidate(str(user_id))
         
         # Atualizar usuário como afiliado
         users = mongo_db.get_collection('users')
@@ -88,12 +103,28 @@ class AffiliateSystem:
         
         await update.message.reply_text(welcome_message, parse_mode='Markdown')
     
+    def _find_dashboard(self, user_id: int) -> Optional[Dict]:
+        """Afiliado com os buckets diários de affiliate_stats em uma ida ao banco"""
+        affiliates = mongo_db.get_collection('affiliates')
+        rows = list(affiliates.aggregate([
+            {'$match': {'user_id': user_id}},
+            {'$limit': 1},
+            {'$lookup': {'from': 'affiliate_stats', 'localField': 'affiliate_code', 'foreignField': '_id', 'as': 'stats'}},
+            {'$project': {'_id': 0, 'applied_events': 0, 'stats.applied_events': 0}}
+        ]))
+        if not rows:
+            return None
+        affiliate = rows[0]
+        stats = affiliate.pop('stats')
+        affiliate['days'] = stats[0].get('days', {}) if stats else {}
+        return affiliate
+    
     async def affiliate_dashboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Dashboard do afiliado"""
         user_id = update.effective_user.id
         
-        affiliates = mongo_db.get_collection('affiliates')
-        affiliate = affiliates.find_one({'user_id': user_id})
+        # Uma única leitura: afiliado e buckets diários (fora do event loop)
+        affiliate = await asyncio.to_thread(self._find_dashboard, user_id)
         
         if not affiliate:
             await update.message.reply_text(
@@ -102,49 +133,46 @@ class AffiliateSystem:
             )
             return
         
-        # Buscar estatísticas recentes
-        referrals = mongo_db.get_collection('referrals')
-        recent_referrals = list(referrals.find({
-            'affiliate_code': affiliate['affiliate_code'],
-            'created_at': {'$gte': datetime.utcnow() - timedelta(days=30)}
-        }))
-        
-        # Calcular métricas
-        active_referrals = [r for r in recent_referrals if r.get('has_converted', False)]
-        conversion_rate = len(active_referrals) / len(recent_referrals) * 100 if recent_referrals else 0
+        recent, expired = affiliate_stats.summarize(affiliate.get('days'), days=30)
+        conversion_rate = recent['conversions'] / recent['referrals'] * 100 if recent['referrals'] else 0
+        rank = await affiliate_leaderboard.rank(affiliate['affiliate_code'], affiliate.get('total_commission', 0))
+        rank_text = f"🏆 Ranking: #{rank} de {await affiliate_leaderboard.size()}\n" if rank else ""
         
         dashboard_text = (
             "📊 **Dashboard do Afiliado**\n\n"
             f"🔗 Código: `{affiliate['affiliate_code']}`\n"
             f"👥 Indicações totais: {affiliate.get('referral_count', 0)}\n"
-            f"🎯 Taxa de conversão: {conversion_rate:.1f}%\n\n"
+            f"🎯 Taxa de conversão: {conversion_rate:.1f}%\n"
+            f"{rank_text}\n"
             f"💰 **Comissões:**\n"
             f"• Total acumulado: R$ {affiliate.get('total_commission', 0):.2f}\n"
             f"• Pendente: R$ {affiliate.get('pending_commission', 0):.2f}\n"
             f"• Sacado: R$ {affiliate.get('paid_commission', 0):.2f}\n\n"
             f"📈 **Últimos 30 dias:**\n"
-            f"• Novas indicações: {len(recent_referrals)}\n"
-            f"• Conversões: {len(active_referrals)}\n"
+            f"• Novas indicações: {recent['referrals']}\n"
+            f"• Conversões: {recent['conversions']}\n"
+            f"• Comissões: R$ {recent['commission']:.2f}\n"
         )
         
         keyboard = [
-            [InlineKeyboardButton("🔗 Gerar Link", callback_data="generate_link")],
-            [InlineKeyboardButton("💰 Comissões", callback_data="view_commissions")],
-            [InlineKeyboardButton("📤 Compartilhar", callback_data="share_affiliate")],
+            [InlineKeyboardButton("🔗 Gerar Link", callback_data="aff:link")],
+            [InlineKeyboardButton("💰 Comissões", callback_data="aff:commissions")],
+            [InlineKeyboardButton("📤 Compartilhar", callback_data="aff:share")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(dashboard_text, reply_markup=reply_markup, parse_mode='Markdown')
+        if expired:
+            await asyncio.to_thread(affiliate_stats.prune, affiliate['affiliate_code'], expired)
     
     async def generate_affiliate_link(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Gerar link de afiliado personalizado"""
         user_id = update.effective_user.id
         
-        affiliates = mongo_db.get_collection('affiliates')
-        affiliate = affiliates.find_one({'user_id': user_id})
+        affiliate = await self.get_profile(user_id)
         
         if not affiliate:
-            await update.message.reply_text("❌ Você precisa ser um afiliado para gerar links.")
+            await update.effective_message.reply_text("❌ Você precisa ser um afiliado para gerar links.")
             return
         
         bot_username = context.bot.username
@@ -162,126 +190,129 @@ class AffiliateSystem:
             "📊 Cada conversão gera comissão!"
         )
         
-        await update.message.reply_text(message_text, parse_mode='Markdown')
+        await update.effective_message.reply_text(message_text, parse_mode='Markdown')
     
-    async def handle_referral(self, user_id: int, affiliate_code: str) -> bool:
-        """Registrar uma indicação"""
+    async def handle_referral(self, user_id: int, affiliate_code: str, profile: Optional[Dict] = None) -> bool:
+        """Registrar uma indicação (usuário, indicação e contador em uma única transação)"""
+        # Códigos malformados são rejeitados sem consultar o banco
+        affiliate_code = affiliate_codes.normalize(affiliate_code)
+        if not affiliate_code:
+            return False
+        
+        # /start repetido pelo mesmo usuário
+        if user_id in self.recent_attributions:
+            self.recent_attributions.move_to_end(user_id)
+            return False
+        
         try:
-            affiliates = mongo_db.get_collection('affiliates')
-            affiliate = affiliates.find_one({'affiliate_code': affiliate_code})
+            owner = await affiliate_code_index.owner(affiliate_code)
             
-            if not affiliate:
+            # Código inexistente ou autoindicação
+            if owner is None or owner == user_id:
                 return False
             
-            # Registrar a indicação
-            referrals = mongo_db.get_collection('referrals')
-            referral_data = {
-                'affiliate_code': affiliate_code,
-                'referred_user_id': user_id,
-                'created_at': datetime.utcnow(),
-                'has_converted': False,
-                'conversion_date': None,
-                'conversion_type': None,
-                'commission_amount': 0
-            }
-            
-            referrals.insert_one(referral_data)
-            
-            # Atualizar contador do afiliado
-            affiliates.update_one(
-                {'affiliate_code': affiliate_code},
-                {'$inc': {'referral_count': 1}}
-            )
-            
-            return True
+            attributed = await asyncio.to_thread(self._write_referral, user_id, affiliate_code, profile or {})
             
         except Exception as e:
             logger.error(f"Erro ao registrar indicação: {e}")
             return False
+        
+        if attributed:
+            affiliate_leaderboard.record_referral(affiliate_code)
+        self.recent_attributions[user_id] = affiliate_code
+        if len(self.recent_attributions) > self.max_recent_attributions:
+            self.recent_attributions.popitem(last=False)
+        
+        return attributed
     
-    async def record_conversion(self, user_id: int, service_type: str, amount: float) -> bool:
-        """Registrar conversão e calcular comissão"""
-        try:
-            # Buscar usuário para verificar se veio de indicação
-            users = mongo_db.get_collection('users')
-            user = users.find_one({'user_id': user_id})
-            
-            if not user or not user.get('referred_by'):
-                return False
-            
-            affiliate_code = user['referred_by']
-            commission_rate = self.commission_rates.get(service_type, 0.10)
-            commission = amount * commission_rate
-            
-            # Atualizar referência
-            referrals = mongo_db.get_collection('referrals')
-            referrals.update_one(
+    def _write_referral(self, user_id: int, affiliate_code: str, profile: Dict) -> bool:
+        """Gravar usuário, indicação e contadores; False se o usuário já tinha indicação"""
+        users = mongo_db.get_collection('users')
+        referrals = mongo_db.get_collection('referrals')
+        affiliates = mongo_db.get_collection('affiliates')
+        stats = mongo_db.get_collection('affiliate_stats')
+        now = datetime.utcnow()
+        
+        def write(session) -> bool:
+            # Só atribui quem ainda não tem indicação; se já tiver, o upsert colide no user_id
+            users.update_one(
+                {'user_id': user_id, 'referred_by': None},
                 {
-                    'affiliate_code': affiliate_code,
-                    'referred_user_id': user_id
+                    '$set': {**profile, 'referred_by': affiliate_code, 'referred_at': now,
+                             'updated_at': now, 'last_activity': now},
+                    '$setOnInsert': {'created_at': now, 'is_active': True}
                 },
-                {
-                    '$set': {
-                        'has_converted': True,
-                        'conversion_date': datetime.utcnow(),
-                        'conversion_type': service_type,
-                        'commission_amount': commission
-                    }
-                }
+                upsert=True,
+                session=session
+            )
+            
+            referral = referrals.update_one(
+                {'referred_user_id': user_id},
+                {'$setOnInsert': {
+                    'affiliate_code': affiliate_code,
+                    'created_at': now,
+                    'has_converted': False,
+                    'conversion_date': None,
+                    'conversion_type': None,
+                    'commission_amount': 0
+                }},
+                upsert=True,
+                session=session
             )
+            if referral.upserted_id is None:
+                return False
             
-            # Atualizar comissões do afiliado
-            affiliates = mongo_db.get_collection('affiliates')
             affiliates.update_one(
                 {'affiliate_code': affiliate_code},
-                {
-                    '$inc': {
-                        'total_commission': commission,
-                        'pending_commission': commission
-                    },
-                    '$set': {'last_commission_date': datetime.utcnow()}
-                }
+                {'$inc': {'referral_count': 1}},
+                session=session
             )
-            
-            logger.info(f"Comissão de R$ {commission:.2f} registrada para afiliado {affiliate_code}")
+            stats.update_one({'_id': affiliate_code}, affiliate_stats.referral_update(now), upsert=True, session=session)
+            return True
+        
+        try:
+            return mongo_db.run_in_transaction(write)
+        except DuplicateKeyError:
+            return False
+    
+    async def record_conversion(self, user_id: int, service_type: str, amount: float,
+                                event_id: Optional[str] = None) -> bool:
+        """Enfileirar conversão; a comissão é calculada em segundo plano pelo pipeline
+
+        Quem pode repetir o registro (ex.: job reexecutado) passa um event_id estável.
+        """
+        try:
+            commission_rate = self.commission_rates.get(service_type, 0.10)
+            await conversion_pipeline.emit(user_id, service_type, amount, commission_rate, event_id)
             return True
             
         except Exception as e:
             logger.error(f"Erro ao registrar conversão: {e}")
             return False
     
-    async def affiliate_callback_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Manipular callbacks do sistema de afiliados"""
-        query = update.callback_query
-        await query.answer()
-        
-        user_id = query.from_user.id
-        data = query.data
-        
-        if data == "generate_link":
-            await self.generate_affiliate_link(update, context)
-        elif data == "view_commissions":
-            await self.view_commissions(update, context)
-        elif data == "share_affiliate":
-            await self.share_affiliate_link(update, context)
+    def _from_button(self, command: Callable) -> Callable:
+        """Callback de botão do dashboard: responde à query e reaproveita o comando"""
+        async def callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            await update.callback_query.answer()
+            await command(update, context)
+        return callback
     
     async def view_commissions(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Visualizar detalhes das comissões"""
         user_id = update.effective_user.id
         
-        affiliates = mongo_db.get_collection('affiliates')
-        affiliate = affiliates.find_one({'user_id': user_id})
+        affiliate = await self.get_profile(user_id)
         
         if not affiliate:
-            await update.message.reply_text("❌ Você não é um afiliado.")
+            await update.effective_message.reply_text("❌ Você não é um afiliado.")
             return
         
         # Buscar comissões recentes
         referrals = mongo_db.get_collection('referrals')
-        recent_commissions = list(referrals.find({
+        recent_commissions = await asyncio.to_thread(lambda: list(referrals.find({
             'affiliate_code': affiliate['affiliate_code'],
             'has_converted': True
-        }).sort('conversion_date', -1).limit(10))
+        }).sort('conversion_date', -1).limit(10)))
         
         if not recent_commissions:
             message = "💰 **Suas Comissões**\n\nAinda não há comissões registradas."
@@ -293,17 +324,16 @@ class AffiliateSystem:
                 service = commission.get('conversion_type', 'serviço')
                 message += f"• {date}: R$ {amount:.2f} ({service})\n"
         
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.effective_message.reply_text(message, parse_mode='Markdown')
     
     async def share_affiliate_link(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Compartilhar link de afiliado"""
         user_id = update.effective_user.id
         
-        affiliates = mongo_db.get_collection('affiliates')
-        affiliate = affiliates.find_one({'user_id': user_id})
+        affiliate = await self.get_profile(user_id)
         
         if not affiliate:
-            await update.message.reply_text("❌ Você não é um afiliado.")
+            await update.effective_message.reply_text("❌ Você não é um afiliado.")
             return
         
         share_text = (
@@ -317,7 +347,7 @@ class AffiliateSystem:
             "#JuristBot #Direito #IA #Advocacia"
         )
         
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             share_text,
             parse_mode='Markdown',
             reply_markup=InlineKeyboardMarkup([[
@@ -326,6 +356,31 @@ class AffiliateSystem:
             ]])
         )
 
+    async def top_affiliates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ranking público dos afiliados (top servido da memória)"""
+        top = affiliate_leaderboard.top(10)
+        
+        if not top:
+            await update.message.reply_text("🏆 Ainda não há afiliados no ranking.")
+            return
+        
+        medals = {1: '🥇', 2: '🥈', 3: '🥉'}
+        text = "🏆 **Top Afiliados JuristBot**\n\n"
+        for entry in top:
+            # Nomes com _, * ou ` quebrariam o Markdown da mensagem inteira
+            name = escape_markdown(entry.get('first_name') or entry.get('username') or 'Afiliado')
+            position = medals.get(entry['rank'], f"{entry['rank']}.")
+            text += f"{position} {name} - {entry.get('referral_count', 0)} indicações\n"
+        
+        # Posição de quem pediu, se for afiliado
+        affiliate = await self.get_profile(update.effective_user.id)
+        if affiliate:
+            rank = await affiliate_leaderboard.rank(affiliate['affiliate_code'])
+            if rank:
+                text += f"\n📍 Você está em #{rank}"
+        
+        await update.message.reply_text(text, parse_mode='Markdown')
+
 # Instância global do sistema de afiliados
 affiliate_system = AffiliateSystem()
 
@@ -334,8 +389,18 @@ module_registry.register_command("afiliado", affiliate_system.register_affiliate
 module_registry.register_command("meuafiliado", affiliate_system.affiliate_dashboard, "Ver dashboard de afiliado")
 module_registry.register_command("linkafiliado", affiliate_system.generate_affiliate_link, "Gerar link de afiliado")
 module_registry.register_command("comissoes", affiliate_system.view_commissions, "Ver minhas comissões")
-module_registry.register_callback("generate_link", affiliate_system.affiliate_callback_handler)
-module_registry.register_callback("view_commissions", affiliate_system.affiliate_callback_handler)
-module_registry.register_callback("share_affiliate", affiliate_system.affiliate_callback_handler)
+module_registry.register_command("topafiliados", affiliate_system.top_affiliates, "Ranking dos afiliados")
+module_registry.register_route('aff', 'link', affiliate_system._from_button(affiliate_system.generate_affiliate_link))
+module_registry.register_route('aff', 'commissions', affiliate_system._from_button(affiliate_system.view_commissions))
+module_registry.register_route('aff', 'share', affiliate_system._from_button(affiliate_system.share_affiliate_link))
+
+module_registry.register_startup(affiliate_code_index.start)
+module_registry.register_startup(commission_ledger.start)
+module_registry.register_startup(affiliate_leaderboard.start)
+module_registry.register_startup(conversion_pipeline.start)
+module_registry.register_shutdown(conversion_pipeline.stop)
+module_registry.register_shutdown(commission_ledger.stop)
+module_registry.register_shutdown(affiliate_leaderboard.stop)
+health_monitor.register_queue('conversions', conversion_pipeline.queue_size, conversion_pipeline.max_queue_size)
 
 module_registry.register_module("affiliate_system")
@@ -0,0 +1,334 @@
+import asyncio
+import csv
+import logging
+import os
+import re
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+from telegram import Update
+from telegram.ext import ContextTypes, filters
+from app.core.registry import module_registry
+from app.core.database import mongo_db
+from app.modules.cnj import parse_cnj
+from app.modules.process_cache import process_cache
+from app.modules.cpf import validate_cpfs
+from app.modules.tribunal_connectors import tribunal_connectors
+
+logger = logging.getLogger(__name__)
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+REPORT_FIELDS = [
+    'linha', 'entrada', 'tipo', 'status', 'tribunal', 'numero',
+    'situacao', 'assunto', 'ultima_movimentacao', 'dados_obtidos_em'
+]
+
+def iter_csv_rows(path: str) -> Iterator[List[str]]:
+    """Linhas de um CSV lidas sob demanda (delimitador , ; ou tab)"""
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as handle:
+        first_line = handle.readline()
+        handle.seek(0)
+        delimiter = max(';,\t', key=first_line.count)
+        yield from csv.reader(handle, delimiter=delimiter)
+
+def _xlsx_shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as handle:
+        for _, elem in iterparse(handle):
+            if elem.tag == f'{XLSX_NS}si':
+                strings.append(''.join(text.text or '' for text in elem.iter(f'{XLSX_NS}t')))
+                elem.clear()
+    return strings
+
+def _xlsx_column(reference: Optional[str]) -> Optional[int]:
+    """Índice (0-based) da coluna de uma referência de célula como 'C12'"""
+    match = re.match(r'([A-Z]+)\d*$', reference or '')
+    if not match:
+        return None
+    index = 0
+    for letter in match.group(1):
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+def _xlsx_number(text: str) -> str:
+    """Número de célula como dígitos, sem passar por float (CNJ tem 20 dígitos, acima de 2^53)"""
+    if not re.match(r'^\d+(\.\d+)?(E\+?\d+)?$', text, re.I):
+        return text
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return text
+    if number != number.to_integral_value():
+        return text
+    return format(number.quantize(Decimal(1)), 'f')
+
+def iter_xlsx_rows(path: str) -> Iterator[List[str]]:
+    """Linhas da primeira planilha de um XLSX, lidas em streaming sem dependências externas"""
+    with zipfile.ZipFile(path) as archive:
+        sheets = sorted(name for name in archive.namelist() if re.match(r'xl/worksheets/sheet\d+\.xml$', name))
+        if not sheets:
+            return
+        sheet = 'xl/worksheets/sheet1.xml' if 'xl/worksheets/sheet1.xml' in sheets else sheets[0]
+        shared = _xlsx_shared_strings(archive)
+
+        with archive.open(sheet) as handle:
+            for _, elem in iterparse(handle):
+                if elem.tag != f'{XLSX_NS}row':
+                    continue
+                row = []
+                for cell in elem.iter(f'{XLSX_NS}c'):
+                    cell_type = cell.get('t')
+                    value = cell.find(f'{XLSX_NS}v')
+                    if cell_type == 's' and value is not None:
+                        text = shared[int(value.text)]
+                    elif cell_type == 'inlineStr':
+                        text = ''.join(part.text or '' for part in cell.iter(f'{XLSX_NS}t'))
+                    elif value is not None and value.text:
+                        # Números longos (CPF, CNJ) podem vir em notação científica
+                        text = _xlsx_number(value.text) if cell_type in (None, 'n') else value.text
+                    else:
+                        text = ''
+                    # Linhas esparsas omitem células vazias: posicionar pela referência (r="C5")
+                    column = _xlsx_column(cell.get('r'))
+                    if column is not None and column > len(row):
+                        row.extend([''] * (column - len(row)))
+                    row.append(text)
+                elem.clear()
+                yield row
+
+def classify_batch(values: List[str]) -> List[Tuple[str, Optional[str], Optional[Dict]]]:
+    """Validar um bloco de entradas: (tipo, valor normalizado, número CNJ decomposto)"""
+    # Números CNJ e CPFs em células numéricas perdem os zeros à esquerda
+    parsed = [parse_cnj(value.zfill(20) if value.isdigit() and 11 < len(value) < 20 else value) for value in values]
+    candidates = [value.zfill(11) if value.isdigit() and len(value) < 11 else value for value in values]
+    valid_cpfs, normalized = validate_cpfs(candidates)
+
+    results = []
+    for cnj, is_cpf, cpf in zip(parsed, valid_cpfs, normalized):
+        if cnj:
+            results.append(('processo', cnj['numero'], cnj))
+        elif is_cpf:
+            results.append(('cpf', str(cpf), None))
+        else:
+            results.append(('invalido', None, None))
+    return results
+
+class BulkConsultation:
+    """Consulta em lote de processos e CPFs a partir de planilhas CSV/XLSX"""
+
+    def __init__(self, chunk_size: int = 200, per_tribunal_concurrency: int = 5,
+                 max_rows: int = 5000, max_file_size: int = 10 * 1024 * 1024):
+        self.chunk_size = chunk_size
+        self.per_tribunal_concurrency = per_tribunal_concurrency
+        self.max_rows = max_rows
+        self.max_file_size = max_file_size
+        self.progress_interval = 2.0
+        # Um lote por usuário de cada vez
+        self.running = set()
+
+    def _read_chunk(self, rows: Iterator[List[str]], size: int) -> List[str]:
+        """Próximo bloco de entradas: primeira célula preenchida de cada linha"""
+        chunk = []
+        for row in rows:
+            value = next((cell.strip() for cell in row if cell and cell.strip()), '')
+            chunk.append(value)
+            if len(chunk) >= size:
+                break
+        return chunk
+
+    async def _lookup(self, kind: str, value: str, cnj: Optional[Dict],
+                      limits: Dict[str, asyncio.Semaphore]) -> Tuple[str, List[Dict]]:
+        """Consulta de uma entrada válida; retorna (status, resultados)"""
+        if kind == 'processo':
+            connector = tribunal_connectors.get(cnj['connector']) if cnj['connector'] else None
+            if connector is None:
+                return f"tribunal {cnj['tribunal']} não suportado", []
+            async with limits[connector.code]:
+                cached = await process_cache.get(value, connector)
+            details = cached['details']
+            if not details:
+                return 'não encontrado', []
+            return 'encontrado', [{
+                **details,
+                'ultima_movimentacao': ' - '.join(details['movimentacoes'][0].values()) if details.get('movimentacoes') else '',
+                'dados_obtidos_em': cached['fetched_at'].strftime('%d/%m/%Y %H:%M')
+            }]
+
+        # CPF: fan-out em todos os tribunais, respeitando o limite de cada um
+        for semaphore in limits.values():
+            await semaphore.acquire()
+        try:
+            processes, failed = await tribunal_connectors.search_by_cpf(value)
+        finally:
+            for semaphore in limits.values():
+                semaphore.release()
+        status = 'encontrado' if processes else 'nenhum processo'
+        if failed:
+            status += f" (indisponível: {', '.join(failed)})"
+        return status, processes
+
+    async def _process_entry(self, line: int, raw: str, classified: Tuple,
+                             limits: Dict[str, asyncio.Semaphore]) -> List[Dict]:
+        kind, value, cnj = classified
+        base = {'linha': line, 'entrada': raw, 'tipo': kind}
+        if kind == 'invalido':
+            return [{**base, 'status': 'entrada inválida'}]
+        try:
+            status, results = await self._lookup(kind, value, cnj, limits)
+        except Exception as e:
+            logger.error(f"Erro na consulta em lote ({value}): {e}")
+            return [{**base, 'status': 'erro na consulta'}]
+        if not results:
+            return [{**base, 'status': status, 'numero': value if kind == 'processo' else ''}]
+        return [
+            {
+                **base,
+                'status': status,
+                'tribunal': result.get('tribunal', ''),
+                'numero': result.get('numero', ''),
+                'situacao': result.get('situacao', ''),
+                'assunto': result.get('assunto', ''),
+                'ultima_movimentacao': result.get('ultima_movimentacao', ''),
+                'dados_obtidos_em': result.get('dados_obtidos_em', '')
+            }
+            for result in results
+        ]
+
+    async def run(self, rows: Iterator[List[str]], report, on_progress) -> Dict[str, int]:
+        """Processar as linhas em blocos, gravando o relatório à medida que avança"""
+        limits = {code: asyncio.Semaphore(self.per_tribunal_concurrency) for code in tribunal_connectors.connectors}
+        writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS, delimiter=';')
+        writer.writeheader()
+        totals = {'linhas': 0, 'validas': 0, 'encontradas': 0}
+        line = 0
+
+        while totals['linhas'] < self.max_rows:
+            chunk = await asyncio.to_thread(self._read_chunk, rows, min(self.chunk_size, self.max_rows - totals['linhas']))
+            if not chunk:
+                break
+
+            classified = classify_batch(chunk)
+            # Cabeçalho da planilha não conta como entrada inválida
+            if line == 0 and classified[0][0] == 'invalido':
+                chunk, classified, line = chunk[1:], classified[1:], 1
+
+            entries = [
+                self._process_entry(line + i + 1, raw, kind, limits)
+                for i, (raw, kind) in enumerate(zip(chunk, classified)) if raw
+            ]
+            for rows_out in await asyncio.gather(*entries):
+                writer.writerows(rows_out)
+                # Uma por linha de entrada, mesmo quando um CPF gera várias linhas no relatório
+                totals['encontradas'] += any(row['status'].startswith('encontrado') for row in rows_out)
+
+            line += len(chunk)
+            totals['linhas'] += len(entries)
+            totals['validas'] += sum(1 for kind in classified if kind[0] != 'invalido')
+            await on_progress(totals)
+
+        return totals
+
+    async def start_bulk(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Instruções da consulta em lote"""
+        await update.message.reply_text(
+            "📑 **Consulta em Lote**\n\n"
+            "Envie uma planilha **CSV** ou **XLSX** com um número de processo (CNJ) "
+            "ou CPF por linha, na primeira coluna.\n\n"
+            f"• Até {self.max_rows} linhas por arquivo\n"
+            "• Você recebe de volta um relatório CSV consolidado\n\n"
+            "⚠️ *A consulta segue a legislação de proteção de dados.*",
+            parse_mode='Markdown'
+        )
+
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Receber a planilha, processar e devolver o relatório"""
+        user_id = update.effective_user.id
+        document = update.message.document
+        extension = os.path.splitext(document.file_name or '')[1].lower()
+
+        if document.file_size and document.file_size > self.max_file_size:
+            await update.message.reply_text("❌ Arquivo muito grande. Limite: 10 MB.")
+            return
+        if user_id in self.running:
+            await update.message.reply_text("⏳ Você já tem uma consulta em lote em andamento. Aguarde a conclusão.")
+            return
+
+        self.running.add(user_id)
+        status_message = await update.message.reply_text("📥 Recebendo planilha...")
+        source_path = report_path = None
+        try:
+            # Arquivo baixado para disco e lido em streaming
+            with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as source:
+                source_path = source.name
+            telegram_file = await context.bot.get_file(document.file_id)
+            await telegram_file.download_to_drive(source_path)
+
+            rows = iter_xlsx_rows(source_path) if extension == '.xlsx' else iter_csv_rows(source_path)
+            last_update = 0.0
+
+            async def on_progress(totals: Dict[str, int]):
+                nonlocal last_update
+                if time.monotonic() - last_update < self.progress_interval:
+                    return
+                last_update = time.monotonic()
+                try:
+                    await status_message.edit_text(
+                        f"🔍 Consultando... {totals['linhas']} linha(s) processada(s), "
+                        f"{totals['encontradas']} com resultado."
+                    )
+                except Exception as e:
+                    logger.debug(f"Não foi possível atualizar progresso: {e}")
+
+            with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='', encoding='utf-8-sig') as report:
+                report_path = report.name
+                totals = await self.run(rows, report, on_progress)
+
+            summary = (
+                f"✅ Consulta em lote concluída\n\n"
+                f"• Linhas: {totals['linhas']}\n"
+                f"• Entradas válidas: {totals['validas']}\n"
+                f"• Com resultado: {totals['encontradas']}"
+            )
+            if totals['linhas'] >= self.max_rows:
+                summary += f"\n\n⚠️ Limite de {self.max_rows} linhas atingido; o restante foi ignorado."
+            await status_message.edit_text(summary)
+
+            with open(report_path, 'rb') as report:
+                await update.message.reply_document(
+                    document=report,
+                    filename=f"consulta_lote_{datetime.utcnow().strftime('%Y%m%d_%H%M')}.csv",
+                    caption="📄 Relatório da consulta em lote"
+                )
+
+            mongo_db.log_query(user_id, 'bulk_consultation', document.file_name or '', summary)
+
+        except (zipfile.BadZipFile, UnicodeError, csv.Error) as e:
+            logger.warning(f"Planilha inválida enviada por {user_id}: {e}")
+            await status_message.edit_text("❌ Não foi possível ler a planilha. Envie um CSV ou XLSX válido.")
+        except Exception as e:
+            logger.error(f"Erro na consulta em lote: {e}")
+            await status_message.edit_text("❌ Erro ao processar a consulta em lote. Tente novamente mais tarde.")
+        finally:
+            self.running.discard(user_id)
+            for path in (source_path, report_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+# Instância global da consulta em lote
+bulk_consultation = BulkConsultation()
+
+# Registrar comandos
+module_registry.register_command("consultalote", bulk_consultation.start_bulk, "Consultar processos/CPFs em lote (CSV/XLSX)")
+module_registry.register_message(
+    filters.Document.FileExtension("csv") | filters.Document.FileExtension("xlsx"),
+    bulk_consultation.handle_document
+)
+
+module_registry.register_module("bulk_consultation")
@@ -0,0 +1,73 @@
+import re
+from typing import Dict, Optional
+
+# NNNNNNN-DD.AAAA.J.TR.OOOO, com ou sem pontuação (20 dígitos)
+CNJ_PATTERN = re.compile(r'^(\d{7})-?(\d{2})\.?(\d{4})\.?(\d)\.?(\d{2})\.?(\d{4})$')
+
+JUSTICE_SEGMENTS = {
+    '1': 'Supremo Tribunal Federal',
+    '2': 'Conselho Nacional de Justiça',
+    '3': 'Superior Tribunal de Justiça',
+    '4': 'Justiça Federal',
+    '5': 'Justiça do Trabalho',
+    '6': 'Justiça Eleitoral',
+    '7': 'Justiça Militar da União',
+    '8': 'Justiça Estadual',
+    '9': 'Justiça Militar Estadual',
+}
+
+# Código TR da Justiça Estadual (Resolução CNJ 65/2008)
+STATE_CODES = [
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SE', 'SP', 'TO'
+]
+
+# Tribunais com conector implementado
+CONNECTOR_BY_COURT = {'TJSP': 'tjsp', 'TJMG': 'tjmg', 'TJRS': 'tjrs'}
+
+def _build_court_table() -> Dict[tuple, Dict]:
+    """Tabela pré-computada (J, TR) -> tribunal e conector"""
+    table = {}
+    for i, state in enumerate(STATE_CODES, 1):
+        court = 'TJDFT' if state == 'DF' else f'TJ{state}'
+        table[('8', f'{i:02d}')] = {'sigla': court, 'connector': CONNECTOR_BY_COURT.get(court)}
+    for region in range(1, 7):
+        table[('4', f'{region:02d}')] = {'sigla': f'TRF{region}', 'connector': None}
+    for region in range(1, 25):
+        table[('5', f'{region:02d}')] = {'sigla': f'TRT{region}', 'connector': None}
+    for i, state in enumerate(STATE_CODES, 1):
+        table[('6', f'{i:02d}')] = {'sigla': f'TRE-{state}', 'connector': None}
+    table[('3', '00')] = {'sigla': 'STJ', 'connector': None}
+    table[('1', '00')] = {'sigla': 'STF', 'connector': None}
+    return table
+
+COURT_TABLE = _build_court_table()
+
+def check_digits(sequential: str, year: str, segment: str, court: str, origin: str) -> str:
+    """Dígitos verificadores pelo módulo 97 (ISO 7064 MOD 97-10)"""
+    value = int(f'{sequential}{year}{segment}{court}{origin}')
+    return f'{98 - (value * 100) % 97:02d}'
+
+def parse_cnj(number: str) -> Optional[Dict]:
+    """Decompor e validar um número CNJ; retorna None se for inválido"""
+    match = CNJ_PATTERN.match((number or '').strip())
+    if not match:
+        return None
+
+    sequential, digits, year, segment, court, origin = match.groups()
+    if check_digits(sequential, year, segment, court, origin) != digits:
+        return None
+
+    court_info = COURT_TABLE.get((segment, court), {'sigla': f'J{segment}.TR{court}', 'connector': None})
+    return {
+        'numero': f'{sequential}-{digits}.{year}.{segment}.{court}.{origin}',
+        'sequencial': sequential,
+        'digito': digits,
+        'ano': year,
+        'segmento': segment,
+        'justica': JUSTICE_SEGMENTS.get(segment, 'Desconhecida'),
+        'tribunal_codigo': court,
+        'tribunal': court_info['sigla'],
+        'connector': court_info['connector'],
+        'origem': origin,
+    }
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.database import mongo_db
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SNAPSHOT_ID = '__global__'
+BALANCE_FIELDS = ('total', 'pending', 'paid')
+
+class CommissionLedger:
+    """Livro-razão append-only de comissões com saldos materializados em snapshots"""
+
+    def __init__(self, snapshot_interval: int = 3600, settle_lag: int = 60, tolerance: float = 0.01):
+        self.snapshot_interval = snapshot_interval
+        # Lançamentos mais recentes que isso ainda podem estar em trânsito no pipeline
+        self.settle_lag = settle_lag
+        self.tolerance = tolerance
+        self.snapshot_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def entry(affiliate_code: str, entry_type: str, total: float = 0.0, pending: float = 0.0,
+              paid: float = 0.0, entry_id: str = None, **extra) -> Dict:
+        """Montar um lançamento; cada lançamento carrega os deltas dos três saldos"""
+        doc = {
+            'affiliate_code': affiliate_code,
+            'type': entry_type,
+            'total': total,
+            'pending': pending,
+            'paid': paid,
+            'created_at': datetime.utcnow(),
+            **extra
+        }
+        if entry_id:
+            doc['_id'] = entry_id
+        return doc
+
+    def accrual(self, affiliate_code: str, commission: float, event: Dict) -> Dict:
+        """Lançamento de comissão gerada por uma conversão (id = event_id)"""
+        return self.entry(
+            affiliate_code, 'accrual', total=commission, pending=commission,
+            entry_id=event['event_id'], user_id=event['user_id'],
+            service_type=event['service_type'], amount=event['amount'], event_at=event['created_at']
+        )
+
+    def append(self, entries: List[Dict], session=None) -> int:
+        """Inserir lançamentos; ids repetidos são ignorados (idempotente)"""
+        if not entries:
+            return 0
+        ledger = mongo_db.get_collection('commission_ledger')
+        try:
+            result = ledger.insert_many(entries, ordered=False, session=session)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            return e.details.get('nInserted', 0)
+
+    def seed_opening_balances(self) -> int:
+        """Criar lançamentos de abertura: contadores dos afiliados menos o que o ledger já registra
+
+        Conversões aplicadas pelo pipeline já têm o seu lançamento (e já estão
+        nos contadores), então a abertura cobre só o saldo anterior ao ledger.
+        Com transação, contadores e lançamentos são lidos no mesmo snapshot.
+        Afiliados que já têm abertura são ignorados.
+        """
+        affiliates = mongo_db.get_collection('affiliates')
+        ledger = mongo_db.get_collection('commission_ledger')
+
+        def read(session) -> List[Dict]:
+            recorded = self._sum_entries({'type': {'$ne': 'opening'}}, session=session)
+            opened = set(ledger.distinct('affiliate_code', {'type': 'opening'}, session=session))
+            entries = []
+            for affiliate in affiliates.find(
+                {}, {'affiliate_code': 1, 'total_commission': 1, 'pending_commission': 1, 'paid_commission': 1},
+                session=session
+            ):
+                affiliate_code = affiliate['affiliate_code']
+                if affiliate_code in opened:
+                    continue
+                row = recorded.get(affiliate_code, {})
+                balances = {
+                    field: (affiliate.get(f'{field}_commission', 0) or 0) - row.get(field, 0)
+                    for field in BALANCE_FIELDS
+                }
+                if all(abs(value) <= self.tolerance for value in balances.values()):
+                    continue
+                entries.append(self.entry(affiliate_code, 'opening', entry_id=f"opening:{affiliate_code}", **balances))
+            return entries
+
+        entries = mongo_db.run_in_transaction(read)
+        inserted = 0
+        for i in range(0, len(entries), 1000):
+            inserted += self.append(entries[i:i + 1000])
+        return inserted
+
+    def _sum_entries(self, match: Dict, group_by: Optional[str] = '$affiliate_code', session=None) -> Dict:
+        """Somar deltas dos lançamentos agrupados por afiliado (ou no total)"""
+        ledger = mongo_db.get_collection('commission_ledger')
+        rows = ledger.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': group_by,
+                'total': {'$sum': '$total'},
+                'pending': {'$sum': '$pending'},
+                'paid': {'$sum': '$paid'},
+                'entries': {'$sum': 1}
+            }}
+        ], session=session)
+        return {row['_id']: row for row in rows}
+
+    def _window(self, since: Optional[datetime], until: Optional[datetime] = None) -> Dict:
+        window = {}
+        if since:
+            window['$gt'] = since
+        if until:
+            window['$lte'] = until
+        return {'created_at': window} if window else {}
+
+    def materialize(self) -> int:
+        """Incorporar aos snapshots os lançamentos desde o último corte"""
+        snapshots = mongo_db.get_collection('commission_snapshots')
+        cutoff = datetime.utcnow() - timedelta(seconds=self.settle_lag)
+
+        def apply(session) -> int:
+            current = snapshots.find_one({'_id': GLOBAL_SNAPSHOT_ID}, session=session) or {}
+            previous_cutoff = current.get('as_of')
+            if previous_cutoff and previous_cutoff >= cutoff:
+                return 0
+
+            deltas = self._sum_entries(self._window(previous_cutoff, cutoff), session=session)
+
+            # Reivindicar a janela: outra instância que materializou antes faz esta falhar
+            claimed = snapshots.update_one(
+                {'_id': GLOBAL_SNAPSHOT_ID, 'as_of': previous_cutoff},
+                {
+                    '$inc': {
+                        **{field: sum(row[field] for row in deltas.values()) for field in BALANCE_FIELDS},
+                        'entries': sum(row['entries'] for row in deltas.values())
+                    },
+                    '$set': {'as_of': cutoff, 'updated_at': datetime.utcnow()}
+                },
+                upsert=previous_cutoff is None,
+                session=session
+            )
+            if not claimed.matched_count and not claimed.upserted_id:
+                return 0
+
+            if deltas:
+                snapshots.bulk_write([
+                    UpdateOne(
+                        {'_id': affiliate_code},
+                        {
+                            '$inc': {**{field: row[field] for field in BALANCE_FIELDS}, 'entries': row['entries']},
+                            '$set': {'as_of': cutoff}
+                        },
+                        upsert=True
+                    )
+                    for affiliate_code, row in deltas.items()
+                ], ordered=False, session=session)
+
+            return len(deltas)
+
+        updated = mongo_db.run_in_transaction(apply)
+        logger.info(f"✅ Snapshots de comissão materializados ({updated} afiliados)")
+        return updated
+
+    def balances(self, affiliate_code: Optional[str] = None) -> Dict:
+        """Saldos atuais = snapshot + lançamentos posteriores ao corte"""
+        snapshots = mongo_db.get_collection('commission_snapshots')
+        global_snapshot = snapshots.find_one({'_id': GLOBAL_SNAPSHOT_ID}) or {}
+        as_of = global_snapshot.get('as_of')
+
+        if affiliate_code:
+            base = snapshots.find_one({'_id': affiliate_code}) or {}
+            match = {'affiliate_code': affiliate_code, **self._window(as_of)}
+        else:
+            base = global_snapshot
+            match = self._window(as_of)
+
+        delta = self._sum_entries(match, group_by=None).get(None, {})
+        return {field: (base.get(field, 0) or 0) + delta.get(field, 0) for field in BALANCE_FIELDS}
+
+    def sum_since(self, since: datetime) -> Dict:
+        """Somar lançamentos a partir de uma data (ex.: comissões de hoje)"""
+        delta = self._sum_entries({'created_at': {'$gte': since}}, group_by=None).get(None, {})
+        return {field: delta.get(field, 0) for field in BALANCE_FIELDS}
+
+    def verify(self) -> Dict:
+        """Reconciliar o ledger com os snapshots em lote; retorna divergências"""
+        snapshots = mongo_db.get_collection('commission_snapshots')
+        global_snapshot = snapshots.find_one({'_id': GLOBAL_SNAPSHOT_ID})
+        if not global_snapshot:
+            return {'as_of': None, 'checked': 0, 'mismatches': []}
+
+        as_of = global_snapshot['as_of']
+        expected = self._sum_entries({'created_at': {'$lte': as_of}})
+        stored = {doc['_id']: doc for doc in snapshots.find({'_id': {'$ne': GLOBAL_SNAPSHOT_ID}})}
+
+        mismatches = []
+        for affiliate_code in set(expected) | set(stored):
+            ledger_row = expected.get(affiliate_code, {})
+            snapshot_row = stored.get(affiliate_code, {})
+            diffs = {
+                field: (snapshot_row.get(field, 0), ledger_row.get(field, 0))
+                for field in BALANCE_FIELDS
+                if abs(snapshot_row.get(field, 0) - ledger_row.get(field, 0)) > self.tolerance
+            }
+            if diffs:
+                mismatches.append({'affiliate_code': affiliate_code, 'diffs': diffs})
+
+        global_diffs = {
+            field: (global_snapshot.get(field, 0), sum(row[field] for row in expected.values()))
+            for field in BALANCE_FIELDS
+            if abs(global_snapshot.get(field, 0) - sum(row[field] for row in expected.values())) > self.tolerance
+        }
+        if global_diffs:
+            mismatches.append({'affiliate_code': GLOBAL_SNAPSHOT_ID, 'diffs': global_diffs})
+
+        return {'as_of': as_of, 'checked': len(set(expected) | set(stored)), 'mismatches': mismatches}
+
+    async def _snapshot_loop(self):
+        """Materializar snapshots periodicamente"""
+        while True:
+            try:
+                await asyncio.to_thread(self.materialize)
+            except Exception as e:
+                logger.error(f"Erro ao materializar snapshots de comissão: {e}")
+            await asyncio.sleep(self.snapshot_interval)
+
+    async def start(self, application=None):
+        if self.snapshot_task is None or self.snapshot_task.done():
+            self.snapshot_task = asyncio.get_running_loop().create_task(self._snapshot_loop())
+
+    async def stop(self, application=None):
+        if self.snapshot_task is not None:
+            self.snapshot_task.cancel()
+            self.snapshot_task = None
+
+# Instância global do ledger de comissões
+commission_ledger = CommissionLedger()
@@ -0,0 +1,43 @@
+from typing import Iterable, Tuple
+import numpy as np
+
+# Pesos dos dígitos verificadores
+FIRST_WEIGHTS = np.arange(10, 1, -1)
+SECOND_WEIGHTS = np.arange(11, 1, -1)
+
+def validate_cpfs(values: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Validar CPFs em lote com operações vetorizadas.
+
+    Aceita qualquer iterável (ou array) de strings, com ou sem pontuação.
+    Retorna (máscara de válidos, CPFs normalizados com 11 dígitos); entradas
+    que não têm 11 dígitos ficam com string vazia.
+    """
+    strings = np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=str)
+    count = strings.shape[0]
+    if count == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype='U11')
+
+    # Cada caractere vira um code point; a pontuação é descartada pela máscara de dígitos
+    width = max(strings.dtype.itemsize // 4, 1)
+    chars = np.ascontiguousarray(strings).view(np.uint32).reshape(count, width)
+    is_digit = (chars >= 48) & (chars <= 57)
+    has_eleven = is_digit.sum(axis=1) == 11
+
+    # Compactar os dígitos à esquerda preservando a ordem
+    order = np.argsort(~is_digit, axis=1, kind='stable')
+    packed = np.take_along_axis(chars, order, axis=1)
+    if width < 11:
+        packed = np.pad(packed, ((0, 0), (0, 11 - width)))
+    digits = packed[:, :11].astype(np.int64) - 48
+    digits[~has_eleven] = 0
+
+    # d = (10 * soma mod 11) mod 10 equivale à regra "resto < 2 -> 0, senão 11 - resto"
+    first = (digits[:, :9] @ FIRST_WEIGHTS * 10) % 11 % 10
+    second = (digits[:, :10] @ SECOND_WEIGHTS * 10) % 11 % 10
+    repeated = (digits == digits[:, :1]).all(axis=1)
+
+    valid = has_eleven & ~repeated & (digits[:, 9] == first) & (digits[:, 10] == second)
+
+    normalized = np.ascontiguousarray((digits + 48).astype(np.uint32)).view('U11').ravel()
+    normalized = np.where(has_eleven, normalized, '')
+    return valid, normalized
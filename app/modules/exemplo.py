@@ -10,21 +10,21 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_id = user.id
     
-    # Verificar se veio de um link de afiliado
+    profile = {
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'language_code': user.language_code,
+        'is_bot': user.is_bot
+    }
+    
+    # Verificar se veio de um link de afiliado. Códigos inválidos são descartados
+    # em memória; a atribuição grava usuário, indicação e contador de uma vez.
+    attributed = False
     if context.args and len(context.args) > 0:
-        affiliate_code = context.args[0]
-        
-        # Registrar o usuário como indicado
-        users = mongo_db.get_collection('users')
-        users.update_one(
-            {'user_id': user_id},
-            {'$set': {'referred_by': affiliate_code}},
-            upsert=True
-        )
-        
-        # Registrar a indicação no sistema de afiliados
-        await affiliate_system.handle_referral(user_id, affiliate_code)
-        
+        attributed = await affiliate_system.handle_referral(user_id, context.args[0], profile)
+    
+    if attributed:
         welcome_affiliate = (
             f"👋 Olá {user.first_name}! Você foi indicado por um afiliado.\n\n"
             "🤖 Bem-vindo ao **JuristBot 2.0** - Seu assistente jurídico inteligente!\n\n"
@@ -38,16 +38,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(welcome_affiliate, parse_mode='Markdown')
         
     else:
-        # Comando start normal
-        user_data = {
-            'user_id': user_id,
-            'username': user.username,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'language_code': user.language_code,
-            'is_bot': user.is_bot,
-            'referred_by': None
-        }
+        # Comando start normal (sem sobrescrever uma indicação existente)
+        user_data = {'user_id': user_id, **profile}
         mongo_db.insert_user(user_data)
 
         # Obter estatísticas do usuário
@@ -85,3 +77,7 @@ Use /afiliado para saber mais.
         await update.message.reply_text(welcome_text)
 
 # ... (outras funções do example.py permanecem iguais)
+
+module_registry.register_command("start", start, "Iniciar o JuristBot")
+
+module_registry.register_module("exemplo")
@@ -1,23 +1,66 @@
 import os
+import time
+import hashlib
 import httpx
 import logging
-from typing import Optional, Dict, Any
-import google.generativeai as genai
-from openai import OpenAI
+from typing import Optional, Dict, Any, Tuple
+from app.core.cache import NearCache, cache_backend
 from app.core.config import Config
+from app.core.health import health_monitor
+from app.core.metrics import ai_duration, ai_requests
+from app.core.registry import module_registry
 
 logger = logging.getLogger(__name__)
 
+class ProviderCircuit:
+    """Circuito de um provedor de IA: após `failures` erros seguidos fica aberto por `cooldown` segundos.
+
+    Aberto, o provedor é pulado e a pergunta vai direto ao próximo; vencido o
+    cooldown, uma chamada de teste (meio aberto) decide se ele volta à rotação.
+    """
+    
+    def __init__(self, failures: int, cooldown: float):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'open' if time.monotonic() - self.opened_at < self.cooldown else 'half_open'
+    
+    def allow(self) -> bool:
+        return self.state != 'open'
+    
+    def record(self, success: bool):
+        if success:
+            self.failures, self.opened_at = 0, None
+            return
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            if self.opened_at is None:
+                logger.warning(f"⚠️ Circuito de IA aberto após {self.failures} falhas seguidas")
+            self.opened_at = time.monotonic()
+
 class AIServiceManager:
     def __init__(self):
         self.setup_apis()
+        # Respostas reaproveitáveis (mesma pergunta, mesmo contexto), compartilhadas entre instâncias
+        self.answers = NearCache('ai_answers', cache_backend, ttl=Config.AI_CACHE_TTL, local_ttl=300, local_size=2000)
+        self.circuits = {source: ProviderCircuit(Config.AI_CIRCUIT_FAILURES, Config.AI_CIRCUIT_COOLDOWN)
+                         for source in ("DeepSeek", "Gemini", "OpenAI")}
     
     def setup_apis(self):
         """Configurar todas as APIs de IA"""
         # Configurar Gemini
+        # SDKs importados só quando a chave existe: juntos custam ~1 s de import
         if Config.GEMINI_API_KEY:
             try:
+                import google.generativeai as genai
                 genai.configure(api_key=Config.GEMINI_API_KEY)
+                self.genai = genai
                 self.gemini_available = True
                 logger.info("✅ Gemini API configurada")
             except Exception as e:
@@ -29,7 +72,8 @@ class AIServiceManager:
         # Configurar OpenAI
         if Config.OPENAI_API_KEY:
             try:
-                self.openai_client = OpenAI(api_key=Config.OPENAI_API_KEY)
+                from openai import AsyncOpenAI
+                self.openai_client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
                 self.openai_available = True
                 logger.info("✅ OpenAI API configurada")
             except Exception as e:
@@ -38,7 +82,8 @@ class AIServiceManager:
         else:
             self.openai_available = False
             
-        # DeepSeek
+        # DeepSeek (cliente HTTP compartilhado, criado sob demanda no loop do bot)
+        self.http_client: Optional[httpx.AsyncClient] = None
         self.deepseek_available = bool(Config.DEEPSEEK_API_KEY)
         if self.deepseek_available:
             logger.info("✅ DeepSeek API configurada")
@@ -49,10 +94,10 @@ class AIServiceManager:
             return None
             
         try:
-            model = genai.GenerativeModel('gemini-pro')
+            model = self.genai.GenerativeModel('gemini-pro')
             full_prompt = f"{context}\n\nPergunta: {prompt}" if context else prompt
             
-            response = model.generate_content(full_prompt)
+            response = await model.generate_content_async(full_prompt)
             return response.text if response else None
             
         except Exception as e:
@@ -79,20 +124,20 @@ class AIServiceManager:
                 "stream": False
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result['choices'][0]['message']['content']
-                else:
-                    logger.error(f"Erro DeepSeek API: {response.status_code}")
-                    return None
+            if self.http_client is None or self.http_client.is_closed:
+                self.http_client = httpx.AsyncClient(timeout=30.0)
+            response = await self.http_client.post(
+                "https://api.deepseek.com/v1/chat/completions",
+                headers=headers,
+                json=data
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result['choices'][0]['message']['content']
+            else:
+                logger.error(f"Erro DeepSeek API: {response.status_code}")
+                return None
                     
         except Exception as e:
             logger.error(f"Erro na consulta DeepSeek: {e}")
@@ -109,7 +154,7 @@ class AIServiceManager:
                 messages.append({"role": "system", "content": context})
             messages.append({"role": "user", "content": prompt})
             
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=messages,
                 max_tokens=1000
@@ -121,8 +166,21 @@ class AIServiceManager:
             logger.error(f"Erro na API OpenAI: {e}")
             return None
     
-    async def get_legal_advice(self, prompt: str, user_context: str = "") -> str:
-        """Obter resposta jurídica usando a melhor API disponível"""
+    async def ask(self, prompt: str, user_context: str = "", cacheable: bool = False) -> Optional[Tuple[str, str]]:
+        """Consultar as APIs em ordem de preferência; retorna (fonte, resposta) ou None se todas falharem.
+
+        Com `cacheable=True` a resposta é reaproveitada para a mesma pergunta
+        (normalizada) e o mesmo contexto; falhas não entram no cache.
+        """
+        if not cacheable:
+            return await self._ask_providers(prompt, user_context)
+        normalized = ' '.join(prompt.lower().split())
+        key = hashlib.sha1(f"{normalized}\x00{user_context}".encode()).hexdigest()
+        result = await self.answers.get(key, lambda: self._ask_providers(prompt, user_context))
+        # O cache serializa a tupla como lista
+        return tuple(result) if result else None
+    
+    async def _ask_providers(self, prompt: str, user_context: str) -> Optional[Tuple[str, str]]:
         context = """
         Você é um assistente jurídico especializado em direito brasileiro. 
         Forneça respostas precisas, citando legislação quando aplicável.
@@ -130,31 +188,52 @@ class AIServiceManager:
         consultar um advogado para análise específica do caso.
         """
         
-        # Tentar APIs em ordem de preferência
-        responses = []
-        
-        # DeepSeek (prioridade por ser gratuito)
-        response = await self.ask_deepseek(prompt, context + user_context)
-        if response:
-            responses.append(("DeepSeek", response))
-        
-        # Gemini
-        if not responses:
-            response = await self.ask_gemini(prompt, context + user_context)
-            if response:
-                responses.append(("Gemini", response))
-        
-        # OpenAI
-        if not responses:
-            response = await self.ask_openai(prompt, context + user_context)
+        # DeepSeek (prioridade por ser gratuito), depois Gemini e OpenAI; provedores com circuito aberto são pulados
+        for source, provider in (("DeepSeek", self.ask_deepseek), ("Gemini", self.ask_gemini), ("OpenAI", self.ask_openai)):
+            circuit = self.circuits[source]
+            if not self.configured()[source]:
+                continue
+            if not circuit.allow():
+                ai_requests.labels(source, 'skipped').inc()
+                continue
+            started = time.perf_counter()
+            response = await provider(prompt, context + user_context)
+            ai_duration.labels(source).observe(time.perf_counter() - started)
+            ai_requests.labels(source, 'ok' if response else 'error').inc()
+            circuit.record(bool(response))
             if response:
-                responses.append(("OpenAI", response))
-        
-        if responses:
-            source, answer = responses[0]
-            return f"🔍 **Resposta ({source}):**\n\n{answer}\n\n*Fonte: {source} - Consulte um advogado para orientação específica.*"
-        else:
-            return "❌ Desculpe, não foi possível processar sua consulta no momento. Tente novamente mais tarde."
+                return source, response
+        return None
+    
+    def configured(self) -> Dict[str, bool]:
+        return {"DeepSeek": self.deepseek_available, "Gemini": self.gemini_available, "OpenAI": self.openai_available}
+    
+    def circuit_report(self) -> Dict:
+        """Sonda de saúde: estado do circuito de cada provedor configurado"""
+        states = {source: self.circuits[source].state for source, available in self.configured().items() if available}
+        return {'ok': any(state != 'open' for state in states.values()), **states}
+    
+    def format_answer(self, source: str, answer: str) -> str:
+        return f"🔍 **Resposta ({source}):**\n\n{answer}\n\n*Fonte: {source} - Consulte um advogado para orientação específica.*"
+    
+    async def get_legal_advice(self, prompt: str, user_context: str = "") -> str:
+        """Obter resposta jurídica usando a melhor API disponível"""
+        result = await self.ask(prompt, user_context, cacheable=True)
+        if result:
+            return self.format_answer(*result)
+        return "❌ Desculpe, não foi possível processar sua consulta no momento. Tente novamente mais tarde."
+    
+    async def close(self, application=None):
+        """Fechar clientes HTTP das APIs"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+        if self.openai_available:
+            await self.openai_client.close()
 
 # Instância global do serviço de IA
 ai_service = AIServiceManager()
+
+health_monitor.register_probe('ai', ai_service.circuit_report)
+
+module_registry.register_shutdown(ai_service.close)
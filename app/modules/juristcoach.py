@@ -3,10 +3,11 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import CommandHandler, ContextTypes, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
+from telegram.ext import CommandHandler, ContextTypes, ConversationHandler, MessageHandler, filters
 from app.core.registry import module_registry
 from app.core.database import mongo_db
 from app.core.config import Config
+from app.core.jobs import job_queue, JobRetry
 from app.modules.ia_services import ai_service
 from app.modules.affiliate_system import affiliate_system
 
@@ -39,7 +40,29 @@ class JuristCoach:
             'ingles': '🌎 Inglês Jurídico'
         }
 
-    def start_juristcoach(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    def _load_coach_data(self, user_id: int) -> Optional[Dict]:
+        coach_collection = mongo_db.get_collection('juristcoach')
+        return coach_collection.find_one({'user_id': user_id}) if coach_collection is not None else None
+
+    def _save_coach_data(self, user_id: int, changes: Dict, upsert: bool = False):
+        coach_collection = mongo_db.get_collection('juristcoach')
+        if coach_collection is not None:
+            coach_collection.update_one({'user_id': user_id}, changes, upsert=upsert)
+
+    async def _generate(self, prompt: str, user_context: str, cacheable: bool = False) -> str:
+        """Gerar conteúdo com IA; sem nenhuma API disponível o job volta para a fila"""
+        result = await ai_service.ask(prompt, user_context, cacheable)
+        if result is None:
+            raise JobRetry("nenhuma API de IA respondeu")
+        return ai_service.format_answer(*result)
+
+    async def _enqueue(self, update: Update, kind: str, payload: Dict, waiting_text: str):
+        """Gerações longas rodam na fila de jobs: o handler responde na hora e a entrega sobrevive a reinícios"""
+        job_id = await job_queue.enqueue(kind, payload, update.effective_user.id, update.effective_chat.id, waiting_text)
+        if job_id is None:
+            await update.effective_message.reply_text("❌ Não foi possível registrar sua solicitação. Tente novamente mais tarde.")
+
+    async def start_juristcoach(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Iniciar o JuristCoach - Assistente de Carreira Jurídica"""
         user = update.effective_user
         
@@ -57,27 +80,28 @@ class JuristCoach:
         )
         
         keyboard = [
-            [InlineKeyboardButton("🎯 Análise de Perfil", callback_data="coach_analysis")],
-            [InlineKeyboardButton("🚀 Planejamento de Carreira", callback_data="coach_planning")],
-            [InlineKeyboardButton("📚 Roteiro de Estudos", callback_data="coach_studyplan")],
-            [InlineKeyboardButton("💼 Simulador de Entrevista", callback_data="coach_interview")],
-            [InlineKeyboardButton("📈 Meu Progresso", callback_data="coach_progress")],
-            [InlineKeyboardButton("🔮 Tendências do Mercado", callback_data="coach_trends")]
+            [InlineKeyboardButton("🎯 Análise de Perfil", callback_data="coach:analysis")],
+            [InlineKeyboardButton("🚀 Planejamento de Carreira", callback_data="coach:planning")],
+            [InlineKeyboardButton("📚 Roteiro de Estudos", callback_data="coach:studyplan")],
+            [InlineKeyboardButton("💼 Simulador de Entrevista", callback_data="coach:interview")],
+            [InlineKeyboardButton("📈 Meu Progresso", callback_data="coach:progress")],
+            [InlineKeyboardButton("🔮 Tendências do Mercado", callback_data="coach:trends")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         # 'update' pode ser de uma mensagem ou de um callback de botão
         message = update.message if update.message else update.callback_query.message
-        message.reply_text(welcome_text, reply_markup=reply_markup, parse_mode='Markdown')
-        
-        mongo_db.log_query(user.id, 'juristcoach_start', 'Iniciou JuristCoach', 'Análise de carreira iniciada')
+        await asyncio.gather(
+            message.reply_text(welcome_text, reply_markup=reply_markup, parse_mode='Markdown'),
+            asyncio.to_thread(mongo_db.log_query, user.id, 'juristcoach_start', 'Iniciou JuristCoach', 'Análise de carreira iniciada')
+        )
         
         return CHOOSING
 
-    def career_analysis(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def career_analysis(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Análise completa de perfil profissional"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
         analysis_text = (
             "🎯 **ANÁLISE DE PERFIL PROFISSIONAL**\n\n"
@@ -91,196 +115,84 @@ class JuristCoach:
             "💡 *Escreva tudo em uma única mensagem*"
         )
         
-        keyboard = [[InlineKeyboardButton("🔙 Voltar", callback_data="coach_back")]]
+        keyboard = [[InlineKeyboardButton("🔙 Voltar", callback_data="coach:back")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        query.edit_message_text(analysis_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await query.edit_message_text(analysis_text, reply_markup=reply_markup, parse_mode='Markdown')
         return ANALYZING_CAREER
 
-    def analyze_profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def analyze_profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Processar análise de perfil com IA"""
         user_profile = update.message.text
-        user_id = update.effective_user.id
-        
-        update.message.reply_text("🔮 **Analisando seu perfil com IA...**")
-        
-        analysis_prompt = f"""
-        ANALISE ESTE PERFIL JURÍDICO E FORNEÇA:
-        PERFIL DO USUÁRIO: {user_profile}
-        FORNEÇA UMA ANÁLISE ESTRUTURADA COM:
-        1. ANÁLISE SWOT PERSONALIZADA (Pontos Fortes, Fracos, Oportunidades, Ameaças)
-        2. CARREIRAS RECOMENDADAS (Top 3 com justificativa)
-        3. PLANO DE DESENVOLVIMENTO (Habilidades, cursos, experiências)
-        4. PREVISÃO DE MERCADO (Tendências, salários)
-        Formate a resposta de forma clara e motivadora!
-        """
-
-        analysis = asyncio.run(ai_service.get_legal_advice(analysis_prompt, "Você é um coach de carreira jurídica especializado."))
         
-        coach_data = {'user_id': user_id, 'profile_analysis': user_profile, 'ia_analysis': analysis, 'analysis_date': datetime.utcnow(), 'coach_stage': 'profile_analyzed'}
-        coach_collection = mongo_db.get_collection('juristcoach')
-        coach_collection.update_one({'user_id': user_id}, {'$set': coach_data}, upsert=True)
-        
-        response_text = f"🎉 **ANÁLISE COMPLETA DO SEU PERFIL!**\n\n{analysis}\n\n💫 *Use essas insights para impulsionar sua carreira!*"
-        
-        if len(response_text) > 4096:
-            parts = [response_text[i:i+4096] for i in range(0, len(response_text), 4096)]
-            for part in parts:
-                update.message.reply_text(part, parse_mode='Markdown')
-        else:
-            update.message.reply_text(response_text, parse_mode='Markdown')
-        
-        asyncio.run(affiliate_system.record_conversion(user_id, 'career_coaching', 50.0))
-        
-        keyboard = [[InlineKeyboardButton("🚀 Criar Plano de Ação", callback_data="coach_action_plan")], [InlineKeyboardButton("📚 Ver Roteiro de Estudos", callback_data="coach_studyplan")], [InlineKeyboardButton("🔙 Menu Principal", callback_data="coach_back_main")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        update.message.reply_text("🎯 **Qual o próximo passo?**", reply_markup=reply_markup)
+        await self._enqueue(update, 'coach.analysis', {'profile': user_profile}, "🔮 Analisando seu perfil com IA... Você receberá a análise aqui assim que ficar pronta.")
         return RECEIVING_ADVICE
 
-    def create_study_plan(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def create_study_plan(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Criar roteiro de estudos personalizado"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         user_id = query.from_user.id
         
-        coach_collection = mongo_db.get_collection('juristcoach')
-        user_data = coach_collection.find_one({'user_id': user_id})
+        user_data = await asyncio.to_thread(self._load_coach_data, user_id)
         
         if not user_data or 'ia_analysis' not in user_data:
-            query.edit_message_text("❌ Primeiro preciso analisar seu perfil!\n\nUse a opção 'Análise de Perfil' para começar.")
+            await query.edit_message_text("❌ Primeiro preciso analisar seu perfil!\n\nUse a opção 'Análise de Perfil' para começar.")
             return CHOOSING
         
-        query.edit_message_text("📚 **Criando seu roteiro de estudos personalizado...**")
-        
-        study_prompt = f"""
-        BASEADO NA ANÁLISE ANTERIOR, CRIE UM ROTEIRO DE ESTUDOS DETALHADO COM:
-        ANÁLISE DO USUÁRIO: {user_data.get('ia_analysis', '')}
-        1. CRONOGRAMA SEMANAL (distribuição, revisões, pausas)
-        2. MATERIAIS RECOMENDADOS (livros, cursos, sites)
-        3. METODOLOGIA DE ESTUDO (técnicas, mapas mentais, exercícios)
-        4. ACOMPANHAMENTO DE PROGRESSO (métricas, verificações)
-        Formate como um plano executável de 3-6 meses!
-        """
-
-        study_plan = asyncio.run(ai_service.get_legal_advice(study_prompt, "Você é um especialista em métodos de estudo jurídico."))
-        
-        coach_collection.update_one({'user_id': user_id}, {'$set': {'study_plan': study_plan, 'study_plan_date': datetime.utcnow()}})
-        
-        response_text = f"📚 **SEU ROTEIRO DE ESTUDOS PERSONALIZADO!**\n\n{study_plan}\n\n🎯 *Siga este plano para maximizar seus resultados!*"
-        
-        if len(response_text) > 4096:
-            parts = [response_text[i:i+4096] for i in range(0, len(response_text), 4096)]
-            for part in parts:
-                query.message.reply_text(part, parse_mode='Markdown')
-        else:
-            query.message.reply_text(response_text, parse_mode='Markdown')
-        
-        keyboard = [[InlineKeyboardButton("💼 Simulador de Entrevista", callback_data="coach_interview")], [InlineKeyboardButton("📈 Acompanhar Progresso", callback_data="coach_progress")], [InlineKeyboardButton("🔙 Menu Principal", callback_data="coach_back_main")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        query.message.reply_text("🎓 **Preparado para os próximos passos?**", reply_markup=reply_markup)
+        await asyncio.gather(
+            query.edit_message_text("📚 **Criando seu roteiro de estudos personalizado...**"),
+            self._enqueue(update, 'coach.study_plan', {'analysis': user_data['ia_analysis']}, "⏳ Seu roteiro entrou na fila. Você receberá a resposta aqui.")
+        )
         return RECEIVING_ADVICE
 
-    def interview_simulator(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def interview_simulator(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Simulador de entrevistas e provas"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
         simulator_text = "💼 **SIMULADOR DE ENTREVISTAS E PROVAS**\n\nEscolha o tipo de simulação:\n\n• 🏛️ **Entrevista Advocacia Privada**\n• ⚖️ **Entrevista Setor Público**\n• 👨‍⚖️ **Simulado para Magistratura**\n• 🔍 **Simulado para MP**\n• 🕵️‍♂️ **Simulado para Polícia**\n• 💼 **Case Empresarial**\n"
         
-        keyboard = [[InlineKeyboardButton("🏛️ Advocacia Privada", callback_data="sim_private")], [InlineKeyboardButton("⚖️ Setor Público", callback_data="sim_public")], [InlineKeyboardButton("👨‍⚖️ Magistratura", callback_data="sim_judge")], [InlineKeyboardButton("🔍 Ministério Público", callback_data="sim_mp")], [InlineKeyboardButton("🕵️‍♂️ Polícia", callback_data="sim_police")], [InlineKeyboardButton("💼 Case Empresarial", callback_data="sim_business")], [InlineKeyboardButton("🔙 Voltar", callback_data="coach_back")]]
+        keyboard = [[InlineKeyboardButton("🏛️ Advocacia Privada", callback_data="coach:sim:private")], [InlineKeyboardButton("⚖️ Setor Público", callback_data="coach:sim:public")], [InlineKeyboardButton("👨‍⚖️ Magistratura", callback_data="coach:sim:judge")], [InlineKeyboardButton("🔍 Ministério Público", callback_data="coach:sim:mp")], [InlineKeyboardButton("🕵️‍♂️ Polícia", callback_data="coach:sim:police")], [InlineKeyboardButton("💼 Case Empresarial", callback_data="coach:sim:business")], [InlineKeyboardButton("🔙 Voltar", callback_data="coach:back")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        query.edit_message_text(simulator_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await query.edit_message_text(simulator_text, reply_markup=reply_markup, parse_mode='Markdown')
         return CHOOSING
 
-    def start_interview_simulation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def start_interview_simulation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Iniciar simulação específica"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
-        simulation_type = query.data.replace('sim_', '')
-        user_id = query.from_user.id
+        simulation_type = context.args[0] if context.args else ''
         
         simulation_types = {'private': 'advocacia privada', 'public': 'setor público', 'judge': 'magistratura', 'mp': 'ministério público', 'police': 'carreira policial', 'business': 'direito empresarial'}
         sim_type = simulation_types.get(simulation_type, 'entrevista')
         
-        query.edit_message_text(f"🎭 **Preparando simulação para {sim_type}...**")
-        
-        simulation_prompt = f"""
-        CRIE UMA SIMULAÇÃO DE ENTREVISTA/PROVA PARA: CARREIRA: {sim_type.upper()}
-        FORNEÇA:
-        1. 3 PERGUNTAS TÉCNICAS específicas da área
-        2. 2 PERGUNTAS COMPORTAMENTAIS típicas
-        3. 1 CASE PRÁTICO para resolução
-        4. RESPOSTAS IDEIAS para cada item
-        5. DICAS DE APRESENTAÇÃO específicos
-        Formate como um simulado interativo e realista!
-        """
-
-        simulation = asyncio.run(ai_service.get_legal_advice(simulation_prompt, "Você é um especialista em recrutamento jurídico."))
-        
-        coach_collection = mongo_db.get_collection('juristcoach')
-        coach_collection.update_one({'user_id': user_id}, {'$push': {'simulations': {'type': sim_type, 'content': simulation, 'date': datetime.utcnow()}}})
-        
-        response_text = f"💼 **SIMULAÇÃO - {sim_type.upper()}**\n\n{simulation}\n\n🎯 *Treine suas respostas e melhore seu desempenho!*"
-        
-        if len(response_text) > 4096:
-            parts = [response_text[i:i+4096] for i in range(0, len(response_text), 4096)]
-            for part in parts:
-                query.message.reply_text(part, parse_mode='Markdown')
-        else:
-            query.message.reply_text(response_text, parse_mode='Markdown')
-        
-        keyboard = [[InlineKeyboardButton("🔄 Nova Simulação", callback_data="coach_interview")], [InlineKeyboardButton("📈 Meu Progresso", callback_data="coach_progress")], [InlineKeyboardButton("🔙 Menu Principal", callback_data="coach_back_main")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        query.message.reply_text("🎭 **Como foi sua performance?**", reply_markup=reply_markup)
+        await asyncio.gather(
+            query.edit_message_text(f"🎭 **Preparando simulação para {sim_type}...**"),
+            self._enqueue(update, 'coach.simulation', {'sim_type': sim_type}, "⏳ Sua simulação entrou na fila. Você receberá a resposta aqui.")
+        )
         return RECEIVING_ADVICE
 
-    def career_trends(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def career_trends(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Tendências do mercado jurídico"""
         query = update.callback_query
-        query.answer()
-        
-        query.edit_message_text("🔮 **Analisando tendências do mercado jurídico...**")
+        await query.answer()
         
-        trends_prompt = """
-        ANALISE AS PRINCIPAIS TENDÊNCIAS DO MERCADO JURÍDICO BRASILEIRO PARA OS PRÓXIMOS 2 ANOS, INCLUINDO:
-        1. ÁREAS EM ALTA (setores, nichos)
-        2. HABILIDADES MAIS VALORIZADAS (técnicas, comportamentais, tech)
-        3. IMPACTOS DA TECNOLOGIA (Lawtechs, IA)
-        4. MUDANÇAS NO RECRUTAMENTO (processos, perfis)
-        5. RECOMENDAÇÕES ESTRATÉGICAS (como se preparar)
-        Baseie-se em dados reais e projeções de mercado!
-        """
-
-        trends = asyncio.run(ai_service.get_legal_advice(trends_prompt, "Você é um analista de mercado jurídico especializado."))
-        
-        response_text = f"🔮 **TENDÊNCIAS DO MERCADO JURÍDICO**\n\n{trends}\n\n💫 *Prepare-se para o futuro do Direito!*"
-        
-        if len(response_text) > 4096:
-            parts = [response_text[i:i+4096] for i in range(0, len(response_text), 4096)]
-            for part in parts:
-                query.message.reply_text(part, parse_mode='Markdown')
-        else:
-            query.message.reply_text(response_text, parse_mode='Markdown')
-        
-        keyboard = [[InlineKeyboardButton("🎯 Análise de Perfil", callback_data="coach_analysis")], [InlineKeyboardButton("🚀 Planejamento", callback_data="coach_planning")], [InlineKeyboardButton("🔙 Menu Principal", callback_data="coach_back_main")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        query.message.reply_text("🎯 **Como você vai se preparar?**", reply_markup=reply_markup)
+        await asyncio.gather(
+            query.edit_message_text("🔮 **Analisando tendências do mercado jurídico...**"),
+            self._enqueue(update, 'coach.trends', {}, "⏳ Sua análise entrou na fila. Você receberá a resposta aqui.")
+        )
         return RECEIVING_ADVICE
 
-    def progress_tracker(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def progress_tracker(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Acompanhamento de progresso"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
         user_id = query.from_user.id
-        coach_collection = mongo_db.get_collection('juristcoach')
-        user_data = coach_collection.find_one({'user_id': user_id})
+        user_data = await asyncio.to_thread(self._load_coach_data, user_id)
         
         if not user_data:
             progress_text = "📈 **ACOMPANHAMENTO DE PROGRESSO**\n\nVocê ainda não começou sua jornada no JuristCoach!\n\n🎯 Use a *Análise de Perfil* para dar o primeiro passo."
@@ -296,39 +208,128 @@ class JuristCoach:
             if simulations_count == 0: progress_text += "\n💡 **Dica:** Experimente o simulador de entrevistas!\n"
             elif not has_study_plan: progress_text += "\n💡 **Dica:** Crie seu roteiro de estudos personalizado!\n"
         
-        keyboard = [[InlineKeyboardButton("🔄 Atualizar Progresso", callback_data="coach_progress")], [InlineKeyboardButton("🎯 Nova Análise", callback_data="coach_analysis")], [InlineKeyboardButton("🔙 Menu Principal", callback_data="coach_back_main")]]
+        keyboard = [[InlineKeyboardButton("🔄 Atualizar Progresso", callback_data="coach:progress")], [InlineKeyboardButton("🎯 Nova Análise", callback_data="coach:analysis")], [InlineKeyboardButton("🔙 Menu Principal", callback_data="coach:menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        query.edit_message_text(progress_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await query.edit_message_text(progress_text, reply_markup=reply_markup, parse_mode='Markdown')
         return CHOOSING
 
-    def career_planning(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def career_planning(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Planejamento estratégico de carreira"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
         planning_text = "🚀 **PLANEJAMENTO ESTRATÉGICO DE CARREIRA**\n\nVou criar um *plano personalizado* para sua trajetória!\n\nEscolha o horizonte temporal:\n\n• 🎯 **Curto Prazo** (6-12 meses)\n• 🚀 **Médio Prazo** (1-3 anos)\n• 🌟 **Longo Prazo** (3-5 anos)\n"
         
-        keyboard = [[InlineKeyboardButton("🎯 Curto Prazo (6-12 meses)", callback_data="plan_short")], [InlineKeyboardButton("🚀 Médio Prazo (1-3 anos)", callback_data="plan_medium")], [InlineKeyboardButton("🌟 Longo Prazo (3-5 anos)", callback_data="plan_long")], [InlineKeyboardButton("🔙 Voltar", callback_data="coach_back")]]
+        keyboard = [[InlineKeyboardButton("🎯 Curto Prazo (6-12 meses)", callback_data="coach:plan:short")], [InlineKeyboardButton("🚀 Médio Prazo (1-3 anos)", callback_data="coach:plan:medium")], [InlineKeyboardButton("🌟 Longo Prazo (3-5 anos)", callback_data="coach:plan:long")], [InlineKeyboardButton("🔙 Voltar", callback_data="coach:back")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        query.edit_message_text(planning_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await query.edit_message_text(planning_text, reply_markup=reply_markup, parse_mode='Markdown')
         return CHOOSING
 
-    def generate_career_plan(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def generate_career_plan(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Gerar plano de carreira com IA"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
-        plan_type = query.data.replace('plan_', '')
-        user_id = query.from_user.id
+        plan_type = context.args[0] if context.args else ''
         periods = {'short': '6 a 12 meses', 'medium': '1 a 3 anos', 'long': '3 a 5 anos'}
         period = periods.get(plan_type, 'curto prazo')
         
-        query.edit_message_text(f"🚀 **Criando seu plano para {period}...**")
+        await asyncio.gather(
+            query.edit_message_text(f"🚀 **Criando seu plano para {period}...**"),
+            self._enqueue(update, 'coach.career_plan', {'plan_type': plan_type, 'period': period}, "⏳ Seu plano entrou na fila. Você receberá a resposta aqui.")
+        )
+        return RECEIVING_ADVICE
+
+    # Executores dos jobs: rodam nos workers da fila, fora da conversa
+
+    async def run_analysis_job(self, job: Dict, progress) -> Dict:
+        user_id = job['user_id']
+        analysis_prompt = f"""
+        ANALISE ESTE PERFIL JURÍDICO E FORNEÇA:
+        PERFIL DO USUÁRIO: {job['payload']['profile']}
+        FORNEÇA UMA ANÁLISE ESTRUTURADA COM:
+        1. ANÁLISE SWOT PERSONALIZADA (Pontos Fortes, Fracos, Oportunidades, Ameaças)
+        2. CARREIRAS RECOMENDADAS (Top 3 com justificativa)
+        3. PLANO DE DESENVOLVIMENTO (Habilidades, cursos, experiências)
+        4. PREVISÃO DE MERCADO (Tendências, salários)
+        Formate a resposta de forma clara e motivadora!
+        """
+        analysis = await self._generate(analysis_prompt, "Você é um coach de carreira jurídica especializado.")
         
-        coach_collection = mongo_db.get_collection('juristcoach')
-        user_data = coach_collection.find_one({'user_id': user_id})
+        coach_data = {'user_id': user_id, 'profile_analysis': job['payload']['profile'], 'ia_analysis': analysis, 'analysis_date': datetime.utcnow(), 'coach_stage': 'profile_analyzed'}
+        await asyncio.gather(
+            asyncio.to_thread(self._save_coach_data, user_id, {'$set': coach_data}, True),
+            # event_id do job: uma reexecução (lease perdido, reinício) não cobra a comissão de novo
+            affiliate_system.record_conversion(user_id, 'career_coaching', 50.0, event_id=f"job:{job['_id']}")
+        )
+        return {
+            'text': f"🎉 **ANÁLISE COMPLETA DO SEU PERFIL!**\n\n{analysis}\n\n💫 *Use essas insights para impulsionar sua carreira!*",
+            'follow_up': "🎯 **Qual o próximo passo?**",
+            'buttons': [("🚀 Criar Plano de Ação", "coach:planning"), ("📚 Ver Roteiro de Estudos", "coach:studyplan"), ("🔙 Menu Principal", "coach:menu")]
+        }
+
+    async def run_study_plan_job(self, job: Dict, progress) -> Dict:
+        study_prompt = f"""
+        BASEADO NA ANÁLISE ANTERIOR, CRIE UM ROTEIRO DE ESTUDOS DETALHADO COM:
+        ANÁLISE DO USUÁRIO: {job['payload']['analysis']}
+        1. CRONOGRAMA SEMANAL (distribuição, revisões, pausas)
+        2. MATERIAIS RECOMENDADOS (livros, cursos, sites)
+        3. METODOLOGIA DE ESTUDO (técnicas, mapas mentais, exercícios)
+        4. ACOMPANHAMENTO DE PROGRESSO (métricas, verificações)
+        Formate como um plano executável de 3-6 meses!
+        """
+        study_plan = await self._generate(study_prompt, "Você é um especialista em métodos de estudo jurídico.")
+        await asyncio.to_thread(self._save_coach_data, job['user_id'], {'$set': {'study_plan': study_plan, 'study_plan_date': datetime.utcnow()}})
+        return {
+            'text': f"📚 **SEU ROTEIRO DE ESTUDOS PERSONALIZADO!**\n\n{study_plan}\n\n🎯 *Siga este plano para maximizar seus resultados!*",
+            'follow_up': "🎓 **Preparado para os próximos passos?**",
+            'buttons': [("💼 Simulador de Entrevista", "coach:interview"), ("📈 Acompanhar Progresso", "coach:progress"), ("🔙 Menu Principal", "coach:menu")]
+        }
+
+    async def run_simulation_job(self, job: Dict, progress) -> Dict:
+        sim_type = job['payload']['sim_type']
+        simulation_prompt = f"""
+        CRIE UMA SIMULAÇÃO DE ENTREVISTA/PROVA PARA: CARREIRA: {sim_type.upper()}
+        FORNEÇA:
+        1. 3 PERGUNTAS TÉCNICAS específicas da área
+        2. 2 PERGUNTAS COMPORTAMENTAIS típicas
+        3. 1 CASE PRÁTICO para resolução
+        4. RESPOSTAS IDEIAS para cada item
+        5. DICAS DE APRESENTAÇÃO específicos
+        Formate como um simulado interativo e realista!
+        """
+        simulation = await self._generate(simulation_prompt, "Você é um especialista em recrutamento jurídico.")
+        await asyncio.to_thread(self._save_coach_data, job['user_id'], {'$push': {'simulations': {'type': sim_type, 'content': simulation, 'date': datetime.utcnow()}}})
+        return {
+            'text': f"💼 **SIMULAÇÃO - {sim_type.upper()}**\n\n{simulation}\n\n🎯 *Treine suas respostas e melhore seu desempenho!*",
+            'follow_up': "🎭 **Como foi sua performance?**",
+            'buttons': [("🔄 Nova Simulação", "coach:interview"), ("📈 Meu Progresso", "coach:progress"), ("🔙 Menu Principal", "coach:menu")]
+        }
+
+    async def run_trends_job(self, job: Dict, progress) -> Dict:
+        trends_prompt = """
+        ANALISE AS PRINCIPAIS TENDÊNCIAS DO MERCADO JURÍDICO BRASILEIRO PARA OS PRÓXIMOS 2 ANOS, INCLUINDO:
+        1. ÁREAS EM ALTA (setores, nichos)
+        2. HABILIDADES MAIS VALORIZADAS (técnicas, comportamentais, tech)
+        3. IMPACTOS DA TECNOLOGIA (Lawtechs, IA)
+        4. MUDANÇAS NO RECRUTAMENTO (processos, perfis)
+        5. RECOMENDAÇÕES ESTRATÉGICAS (como se preparar)
+        Baseie-se em dados reais e projeções de mercado!
+        """
+        # Mesmo texto para todos os usuários: resposta compartilhada pelo cache
+        trends = await self._generate(trends_prompt, "Você é um analista de mercado jurídico especializado.", cacheable=True)
+        return {
+            'text': f"🔮 **TENDÊNCIAS DO MERCADO JURÍDICO**\n\n{trends}\n\n💫 *Prepare-se para o futuro do Direito!*",
+            'follow_up': "🎯 **Como você vai se preparar?**",
+            'buttons': [("🎯 Análise de Perfil", "coach:analysis"), ("🚀 Planejamento", "coach:planning"), ("🔙 Menu Principal", "coach:menu")]
+        }
+
+    async def run_career_plan_job(self, job: Dict, progress) -> Dict:
+        user_id = job['user_id']
+        plan_type, period = job['payload']['plan_type'], job['payload']['period']
+        user_data = await asyncio.to_thread(self._load_coach_data, user_id)
         user_context = user_data.get('ia_analysis', '') if user_data else "Perfil jurídico em desenvolvimento"
         
         plan_prompt = f"""
@@ -343,36 +344,24 @@ class JuristCoach:
         5. ACOMPANHAMENTO (métricas, revisões)
         Torne o plano prático, realista e motivador!
         """
+        career_plan = await self._generate(plan_prompt, "Você é um estrategista de carreira jurídica especializado.")
+        await asyncio.to_thread(self._save_coach_data, user_id, {'$set': {f'career_plan_{plan_type}': career_plan, f'plan_{plan_type}_date': datetime.utcnow()}})
+        return {
+            'text': f"🚀 **SEU PLANO DE CARREIRA - {period.upper()}**\n\n{career_plan}\n\n💫 *Execute este plano e transforme sua carreira!*",
+            'follow_up': "🎯 **Pronto para colocar em prática?**",
+            'buttons': [("📚 Roteiro de Estudos", "coach:studyplan"), ("💼 Simulador", "coach:interview"), ("🔙 Menu Principal", "coach:menu")]
+        }
 
-        career_plan = asyncio.run(ai_service.get_legal_advice(plan_prompt, "Você é um estrategista de carreira jurídica especializado."))
-        
-        coach_collection.update_one({'user_id': user_id}, {'$set': {f'career_plan_{plan_type}': career_plan, f'plan_{plan_type}_date': datetime.utcnow()}})
-        
-        response_text = f"🚀 **SEU PLANO DE CARREIRA - {period.upper()}**\n\n{career_plan}\n\n💫 *Execute este plano e transforme sua carreira!*"
-        
-        if len(response_text) > 4096:
-            parts = [response_text[i:i+4096] for i in range(0, len(response_text), 4096)]
-            for part in parts:
-                query.message.reply_text(part, parse_mode='Markdown')
-        else:
-            query.message.reply_text(response_text, parse_mode='Markdown')
-        
-        keyboard = [[InlineKeyboardButton("📚 Roteiro de Estudos", callback_data="coach_studyplan")], [InlineKeyboardButton("💼 Simulador", callback_data="coach_interview")], [InlineKeyboardButton("🔙 Menu Principal", callback_data="coach_back_main")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        query.message.reply_text("🎯 **Pronto para colocar em prática?**", reply_markup=reply_markup)
-        return RECEIVING_ADVICE
-
-    def back_to_main(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def back_to_main(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Voltar ao menu principal"""
         query = update.callback_query
-        query.answer()
-        return self.start_juristcoach(update, context)
+        await query.answer()
+        return await self.start_juristcoach(update, context)
 
-    def back_to_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def back_to_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Voltar ao menu do JuristCoach"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
         welcome_text = (
             "🎯 **JURISTCOACH - MENU PRINCIPAL**\n\n"
@@ -387,63 +376,91 @@ class JuristCoach:
         )
         
         keyboard = [
-            [InlineKeyboardButton("🎯 Análise de Perfil", callback_data="coach_analysis")],
-            [InlineKeyboardButton("🚀 Planejamento de Carreira", callback_data="coach_planning")],
-            [InlineKeyboardButton("📚 Roteiro de Estudos", callback_data="coach_studyplan")],
-            [InlineKeyboardButton("💼 Simulador de Entrevista", callback_data="coach_interview")],
-            [InlineKeyboardButton("📈 Meu Progresso", callback_data="coach_progress")],
-            [InlineKeyboardButton("🔮 Tendências do Mercado", callback_data="coach_trends")]
+            [InlineKeyboardButton("🎯 Análise de Perfil", callback_data="coach:analysis")],
+            [InlineKeyboardButton("🚀 Planejamento de Carreira", callback_data="coach:planning")],
+            [InlineKeyboardButton("📚 Roteiro de Estudos", callback_data="coach:studyplan")],
+            [InlineKeyboardButton("💼 Simulador de Entrevista", callback_data="coach:interview")],
+            [InlineKeyboardButton("📈 Meu Progresso", callback_data="coach:progress")],
+            [InlineKeyboardButton("🔮 Tendências do Mercado", callback_data="coach:trends")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        query.edit_message_text(welcome_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await query.edit_message_text(welcome_text, reply_markup=reply_markup, parse_mode='Markdown')
         return CHOOSING
 
-    def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Cancelar conversação"""
-        update.message.reply_text(
+        if update.callback_query:
+            await update.callback_query.answer()
+        await update.effective_message.reply_text(
             "👋 Até logo! Lembre-se: *sua carreira jurídica é uma jornada* 🚀\n\n"
             "Volte ao JuristCoach quando quiser continuar sua evolução!",
             parse_mode='Markdown'
         )
         return ConversationHandler.END
 
+    async def expired_button(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Botão do coach fora da conversa (sessão encerrada ou resultado entregue depois dela)"""
+        await update.callback_query.answer("Sessão do JuristCoach encerrada")
+        keyboard = [[InlineKeyboardButton("🎯 Abrir JuristCoach", callback_data="coach:start")]]
+        await update.effective_message.reply_text(
+            "⌛ Sua sessão do JuristCoach foi encerrada.\n\n"
+            "Toque no botão abaixo ou use /juristcoach para recomeçar.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
 # Instância global do JuristCoach
 jurist_coach = JuristCoach()
 
+# Gerações longas de IA executadas pela fila de jobs
+job_queue.register('coach.analysis', jurist_coach.run_analysis_job)
+job_queue.register('coach.study_plan', jurist_coach.run_study_plan_job)
+job_queue.register('coach.simulation', jurist_coach.run_simulation_job)
+job_queue.register('coach.trends', jurist_coach.run_trends_job)
+job_queue.register('coach.career_plan', jurist_coach.run_career_plan_job)
+
+# Rotas coach:<ação>; sim e plan levam o tipo como argumento (coach:sim:private)
+module_registry.register_route('coach', 'start', jurist_coach.start_juristcoach)
+module_registry.register_route('coach', 'analysis', jurist_coach.career_analysis)
+module_registry.register_route('coach', 'planning', jurist_coach.career_planning)
+module_registry.register_route('coach', 'studyplan', jurist_coach.create_study_plan)
+module_registry.register_route('coach', 'interview', jurist_coach.interview_simulator)
+module_registry.register_route('coach', 'progress', jurist_coach.progress_tracker)
+module_registry.register_route('coach', 'trends', jurist_coach.career_trends)
+module_registry.register_route('coach', 'sim', jurist_coach.start_interview_simulation)
+module_registry.register_route('coach', 'plan', jurist_coach.generate_career_plan)
+module_registry.register_route('coach', 'back', jurist_coach.back_to_menu)
+module_registry.register_route('coach', 'menu', jurist_coach.back_to_main)
+module_registry.register_route('coach', 'cancel', jurist_coach.cancel)
+
+# Os botões do coach só são atendidos dentro da conversa (o roteador global ignora o prefixo);
+# fora dela, o roteador global oferece recomeçar a sessão
+coach_routes = module_registry.callbacks.handler('coach')
+module_registry.register_route_fallback('coach', jurist_coach.expired_button)
+
 # Configurar Conversation Handler
-# Note que a entry_point do CallbackQueryHandler foi ajustada para chamar a função diretamente
 coach_conversation = ConversationHandler(
     entry_points=[
         CommandHandler('juristcoach', jurist_coach.start_juristcoach),
-        CallbackQueryHandler(jurist_coach.start_juristcoach, pattern='^juristcoach_start$')
+        CommandHandler('coach', jurist_coach.start_juristcoach),
+        module_registry.callbacks.handler('coach', actions={'start'})
     ],
     states={
-        CHOOSING: [
-            CallbackQueryHandler(jurist_coach.career_analysis, pattern='^coach_analysis$'),
-            CallbackQueryHandler(jurist_coach.career_planning, pattern='^coach_planning$'),
-            CallbackQueryHandler(jurist_coach.create_study_plan, pattern='^coach_studyplan$'),
-            CallbackQueryHandler(jurist_coach.interview_simulator, pattern='^coach_interview$'),
-            CallbackQueryHandler(jurist_coach.progress_tracker, pattern='^coach_progress$'),
-            CallbackQueryHandler(jurist_coach.career_trends, pattern='^coach_trends$'),
-            CallbackQueryHandler(jurist_coach.start_interview_simulation, pattern='^sim_'),
-            CallbackQueryHandler(jurist_coach.generate_career_plan, pattern='^plan_'),
-            CallbackQueryHandler(jurist_coach.back_to_menu, pattern='^coach_back$'),
-            CallbackQueryHandler(jurist_coach.back_to_main, pattern='^coach_back_main$'),
-        ],
+        CHOOSING: [coach_routes],
+        # Os botões de próximo passo chegam junto com o resultado do job
+        RECEIVING_ADVICE: [coach_routes],
         ANALYZING_CAREER: [
             MessageHandler(filters.TEXT & ~filters.COMMAND, jurist_coach.analyze_profile),
-            CallbackQueryHandler(jurist_coach.back_to_menu, pattern='^coach_back$'),
+            module_registry.callbacks.handler('coach', actions={'back'}),
         ],
-        RECEIVING_ADVICE: [
-            CallbackQueryHandler(jurist_coach.back_to_main, pattern='^coach_back_main$'),
-            CallbackQueryHandler(jurist_coach.back_to_menu, pattern='^coach_back$'),
-        ]
     },
     fallbacks=[
         CommandHandler('cancel', jurist_coach.cancel),
-        CallbackQueryHandler(jurist_coach.cancel, pattern='^cancel$')
-    ]
+        module_registry.callbacks.handler('coach', actions={'cancel'})
+    ],
+    # Estado salvo no MongoDB: a conversa continua após um redeploy
+    name='juristcoach',
+    persistent=True
 )
 
 # Registrar handlers
@@ -1,7 +1,10 @@
+import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes
 from app.core.registry import module_registry
 from app.core.database import mongo_db
+from app.core.config import Config
+from app.core.jobs import job_queue, JobRetry
 from app.modules.ia_services import ai_service  # ✅ AGORA ESTE IMPORT FUNCIONA
 
 async def legal_advice(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -23,17 +26,39 @@ async def legal_advice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'first_name': update.effective_user.first_name,
         'last_name': update.effective_user.last_name
     }
-    mongo_db.insert_user(user_data)
-    
-    await update.message.reply_text("⚖️ Analisando sua consulta jurídica...")
+    # Perguntas longas geram respostas longas: vão para a fila de jobs em vez de prender o handler
+    if len(question) > Config.DIREITO_INLINE_MAX_CHARS:
+        _, job_id = await asyncio.gather(
+            asyncio.to_thread(mongo_db.insert_user, user_data),
+            job_queue.enqueue('legal.advice', {'question': question}, user_id, update.effective_chat.id,
+                              "⚖️ Sua consulta é detalhada e entrou na fila. Você receberá a resposta aqui.")
+        )
+        if job_id is None:
+            await update.message.reply_text("❌ Não foi possível registrar sua consulta. Tente novamente mais tarde.")
+        return
     
-    # Obter resposta da IA
-    response = await ai_service.get_legal_advice(question)
+    # Cadastro, aviso e consulta à IA em paralelo; o MongoDB roda fora do loop de eventos
+    _, _, response = await asyncio.gather(
+        asyncio.to_thread(mongo_db.insert_user, user_data),
+        update.message.reply_text("⚖️ Analisando sua consulta jurídica..."),
+        ai_service.get_legal_advice(question)
+    )
     
     # Log da consulta
-    mongo_db.log_query(user_id, 'legal_advice', question, response[:200] + "..." if len(response) > 200 else response)
-    
-    await update.message.reply_text(response)
+    await asyncio.gather(
+        asyncio.to_thread(mongo_db.log_query, user_id, 'legal_advice', question, response[:200] + "..." if len(response) > 200 else response),
+        update.message.reply_text(response)
+    )
+
+async def run_legal_advice_job(job, progress):
+    """Executor do job de consulta longa do /direito"""
+    question = job['payload']['question']
+    result = await ai_service.ask(question, cacheable=True)
+    if result is None:
+        raise JobRetry("nenhuma API de IA respondeu")
+    response = ai_service.format_answer(*result)
+    await asyncio.to_thread(mongo_db.log_query, job['user_id'], 'legal_advice', question, response[:200] + "..." if len(response) > 200 else response)
+    return {'text': response}
 
 async def document_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Analisar documento jurídico"""
@@ -43,6 +68,8 @@ async def document_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Em breve: integração com PDF e documentos jurídicos."
     )
 
+job_queue.register('legal.advice', run_legal_advice_job)
+
 # Registrar comandos jurídicos
 module_registry.register_command("direito", legal_advice, "Consultar sobre questões jurídicas")
 module_registry.register_command("analisar", document_analysis, "Analisar documento jurídico")
@@ -0,0 +1,115 @@
+"""Manifesto dos módulos do bot.
+
+Declara o que cada módulo atende (comandos, prefixos de callback, filtros de
+mensagem e tipos de job) sem importá-lo. O ModuleRegistry usa o manifesto para
+publicar os comandos e instalar handlers provisórios; o módulo só é importado
+no primeiro update que precisa dele. Módulos com `warm` são carregados em
+segundo plano logo após a inicialização (tarefas periódicas, índices em memória
+ou conversas persistidas que podem continuar a qualquer momento).
+
+Callbacks seguem o formato `prefixo:ação:args` do CallbackRouter; `routes`
+lista os prefixos de cada módulo. Ao adicionar um comando ou prefixo em um
+módulo, declare-o aqui também: scripts/check_manifest.py acusa divergências
+(rode no build), o import de um módulo divergente registra um erro e, com
+LAZY_MODULES=0, a inicialização falha.
+"""
+from telegram.ext import filters
+
+MODULES = [
+    {
+        'name': 'exemplo',
+        'commands': [('start', "Iniciar o JuristBot")],
+    },
+    {
+        'name': 'legal_assistant',
+        'commands': [
+            ('direito', "Consultar sobre questões jurídicas"),
+            ('analisar', "Analisar documento jurídico"),
+        ],
+        'jobs': ['legal.advice'],
+    },
+    {
+        'name': 'affiliate_system',
+        'commands': [
+            ('afiliado', "Tornar-se um afiliado"),
+            ('meuafiliado', "Ver dashboard de afiliado"),
+            ('linkafiliado', "Gerar link de afiliado"),
+            ('comissoes', "Ver minhas comissões"),
+            ('topafiliados', "Ranking dos afiliados"),
+        ],
+        'routes': ['aff'],
+        # Índice de códigos, ledger e ranking carregados na inicialização do módulo
+        'warm': True,
+    },
+    {
+        'name': 'process_consultation',
+        'commands': [
+            ('consultarcpf', "Consultar processos por CPF"),
+            ('consultarprocesso', "Consultar processo por número"),
+        ],
+        'routes': ['cpfpg'],
+    },
+    {
+        'name': 'process_watchlist',
+        'commands': [
+            ('acompanhar', "Acompanhar movimentações de um processo"),
+            ('pararacompanhar', "Deixar de acompanhar um processo"),
+            ('acompanhando', "Listar processos acompanhados"),
+        ],
+        # Verificação periódica dos processos acompanhados
+        'warm': True,
+    },
+    {
+        'name': 'text_scanner',
+        'messages': [(filters.TEXT & ~filters.COMMAND, 1)],
+        'routes': ['scan'],
+    },
+    {
+        'name': 'bulk_consultation',
+        'commands': [('consultalote', "Consultar processos/CPFs em lote (CSV/XLSX)")],
+        'messages': [(filters.Document.FileExtension("csv") | filters.Document.FileExtension("xlsx"), 0)],
+    },
+    {
+        'name': 'admin',
+        'commands': [
+            ('admin', "Painel administrativo (apenas admin)"),
+            ('broadcast', "Enviar mensagem para todos os usuários (apenas admin)"),
+            ('afiliadoslote', "Cadastrar afiliados em lote (apenas admin)"),
+            ('verificarledger', "Reconciliar ledger de comissões (apenas admin)"),
+            ('qualidadedados', "Verificar qualidade dos CPFs armazenados (apenas admin)"),
+            ('recalcularstats', "Recalcular estatísticas de afiliados (apenas admin)"),
+        ],
+        'routes': ['admin', 'bcast'],
+    },
+    {
+        'name': 'juristcoach',
+        'commands': [
+            ('juristcoach', "Assistente de carreira jurídica com IA"),
+            ('coach', "JuristCoach - Mentoria de carreira"),
+        ],
+        # Entrada da conversa e botões enviados com resultados de jobs
+        'routes': ['coach'],
+        'jobs': ['coach.analysis', 'coach.study_plan', 'coach.simulation', 'coach.trends', 'coach.career_plan'],
+        # Conversas persistidas continuam com texto livre, que não tem handler provisório
+        'warm': True,
+    },
+]
+
+# callback_data de botões enviados antes do formato `prefixo:ação` (mensagens antigas continuam funcionando)
+LEGACY_CALLBACKS = {
+    'generate_link': 'aff:link',
+    'view_commissions': 'aff:commissions',
+    'share_affiliate': 'aff:share',
+    'juristcoach_start': 'coach:start',
+    'cancel': 'coach:cancel',
+    'coach_back_main': 'coach:menu',
+    **{f"admin_{action}": f"admin:{action}" for action in (
+        'stats', 'users', 'affiliates', 'queries', 'finance', 'settings', 'export_users',
+        'export_affiliates', 'export_queries', 'check_connections', 'back'
+    )},
+    **{f"coach_{action}": f"coach:{action}" for action in (
+        'analysis', 'planning', 'studyplan', 'interview', 'progress', 'trends', 'back'
+    )},
+    **{f"sim_{kind}": f"coach:sim:{kind}" for kind in ('private', 'public', 'judge', 'mp', 'police', 'business')},
+    **{f"plan_{term}": f"coach:plan:{term}" for term in ('short', 'medium', 'long')},
+}
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from pymongo.errors import DuplicateKeyError
+from app.core.database import mongo_db
+
+logger = logging.getLogger(__name__)
+
+# Situações que indicam processo encerrado (dados praticamente imutáveis)
+ARCHIVED_MARKERS = ('arquiv', 'conclu', 'baixad', 'extint', 'transitad', 'encerrad')
+
+def describe_age(fetched_at: datetime, now: Optional[datetime] = None) -> str:
+    """Idade dos dados em texto curto"""
+    seconds = int(((now or datetime.utcnow()) - fetched_at).total_seconds())
+    if seconds < 60:
+        return "agora mesmo"
+    if seconds < 3600:
+        return f"há {seconds // 60} min"
+    if seconds < 86400:
+        return f"há {seconds // 3600} h"
+    return f"há {seconds // 86400} dia(s)"
+
+class ProcessCache:
+    """Cache de detalhes de processos na coleção processes com stale-while-revalidate"""
+
+    def __init__(self, active_ttl: int = 3600, archived_ttl: int = 7 * 86400, missing_ttl: int = 600):
+        self.active_ttl = active_ttl
+        self.archived_ttl = archived_ttl
+        # Processos não encontrados também ficam em cache para poupar a cota do tribunal
+        self.missing_ttl = missing_ttl
+        # Uma única atualização em andamento por número de processo
+        self.inflight: Dict[str, asyncio.Task] = {}
+
+    def is_archived(self, details: Optional[Dict]) -> bool:
+        situacao = (details or {}).get('situacao', '').lower()
+        return any(marker in situacao for marker in ARCHIVED_MARKERS)
+
+    def ttl_for(self, details: Optional[Dict]) -> int:
+        if details is None:
+            return self.missing_ttl
+        return self.archived_ttl if self.is_archived(details) else self.active_ttl
+
+    def _load(self, process_number: str) -> Optional[Dict]:
+        processes = mongo_db.get_collection('processes')
+        if processes is None:
+            return None
+        return processes.find_one({'process_number': process_number}, {'_id': 0})
+
+    def _store(self, process_number: str, tribunal: str, details: Optional[Dict]) -> Dict:
+        now = datetime.utcnow()
+        doc = {
+            'process_number': process_number,
+            'tribunal': tribunal,
+            'details': details,
+            'status': 'missing' if details is None else ('archived' if self.is_archived(details) else 'active'),
+            'fetched_at': now,
+            'expires_at': now + timedelta(seconds=self.ttl_for(details))
+        }
+        processes = mongo_db.get_collection('processes')
+        if processes is not None:
+            try:
+                processes.update_one(
+                    {'process_number': process_number},
+                    {'$set': doc, '$setOnInsert': {'created_at': now}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                # Outra instância inseriu o mesmo número ao mesmo tempo
+                processes.update_one({'process_number': process_number}, {'$set': doc})
+            except Exception as e:
+                logger.error(f"Erro ao gravar processo em cache: {e}")
+        return doc
+
+    async def _fetch(self, process_number: str, connector) -> Dict:
+        details = await connector.get_process(process_number)
+        return await asyncio.to_thread(self._store, process_number, connector.code, details)
+
+    def refresh(self, process_number: str, connector) -> asyncio.Task:
+        """Atualizar a partir do tribunal, reaproveitando uma atualização já em andamento"""
+        task = self.inflight.get(process_number)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch(process_number, connector))
+            self.inflight[process_number] = task
+            task.add_done_callback(lambda finished: self._on_refreshed(process_number, finished))
+        return task
+
+    def _on_refreshed(self, process_number: str, task: asyncio.Task):
+        self.inflight.pop(process_number, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Falha ao atualizar processo {process_number}: {task.exception()}")
+
+    async def peek(self, process_number: str) -> Optional[Dict]:
+        """Entrada do cache, se existir, sem consultar o tribunal"""
+        try:
+            return await asyncio.to_thread(self._load, process_number)
+        except Exception as e:
+            logger.error(f"Erro ao ler processo do cache: {e}")
+            return None
+
+    async def get(self, process_number: str, connector) -> Dict:
+        """Entrada do cache; expirada é servida na hora enquanto a atualização roda em segundo plano"""
+        doc = await self.peek(process_number)
+        # Documentos gravados antes do cache não têm details/fetched_at: contam como ausentes
+        if doc is None or 'fetched_at' not in doc:
+            # Sem cópia local: aguardar o tribunal (shield para não cancelar quem compartilha a tarefa)
+            return {**await asyncio.shield(self.refresh(process_number, connector)), 'stale': False}
+
+        # Sem expires_at (documento antigo): tratar como expirado
+        expires_at = doc.get('expires_at')
+        if expires_at is None or expires_at <= datetime.utcnow():
+            self.refresh(process_number, connector)
+            return {**doc, 'stale': True}
+        return {**doc, 'stale': False}
+
+    async def stop(self, application=None):
+        for task in list(self.inflight.values()):
+            task.cancel()
+        self.inflight.clear()
+
+# Instância global do cache de processos
+process_cache = ProcessCache()
@@ -4,29 +4,23 @@ import httpx
 from datetime import datetime
 from typing import Dict, List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes, CallbackQueryHandler
-from app.core.registry import module_registry
+from app.core.registry import CallbackRouter, module_registry
 from app.core.database import mongo_db
 from app.core.config import Config
 from app.modules.affiliate_system import affiliate_system
+from app.modules.tribunal_connectors import tribunal_connectors, close_http_client
+from app.modules.cnj import parse_cnj
+from app.modules.process_cache import process_cache, describe_age
+from app.modules.result_pages import result_pages
 
 logger = logging.getLogger(__name__)
 
 class ProcessConsultation:
     def __init__(self):
-        # APIs de consulta de processos (exemplos)
-        self.apis = {
-            'tjsp': 'https://api.tjsp.jus.br/v1/processos',
-            'tjmg': 'https://api.tjmg.jus.br/v1/processos',
-            'tjrs': 'https://api.tjrs.jus.br/v1/processos'
-        }
-        
-        # Padrões de números de processo
-        self.process_patterns = {
-            'cnj': r'^\d{7}-\d{2}\.\d{4}\.\d{1,2}\.\d{2}\.\d{4}$',
-            'tjsp': r'^\d{7}-\d{2}\.\d{4}\.\d{1,2}\.\d{2}\.\d{4}$',
-            'custom': r'^\d{4}\.\d{3}\.\d{6}-\d{1}$'
-        }
+        # APIs de consulta de processos (um conector assíncrono por tribunal)
+        self.apis = {code: connector.base_url for code, connector in tribunal_connectors.connectors.items()}
     
     def validate_cpf(self, cpf: str) -> bool:
         """Validar CPF brasileiro"""
@@ -61,18 +55,19 @@ class ProcessConsultation:
         return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
     
     def validate_process_number(self, process_number: str) -> Dict:
-        """Validar e identificar tipo de número de processo"""
-        process_number = process_number.strip().upper()
-        
-        for process_type, pattern in self.process_patterns.items():
-            if re.match(pattern, process_number):
-                return {
-                    'valid': True,
-                    'type': process_type,
-                    'formatted': process_number
-                }
-        
-        return {'valid': False, 'type': 'invalid', 'formatted': process_number}
+        """Validar número CNJ (dígito verificador) e identificar o tribunal"""
+        process_number = process_number.strip()
+        cnj = parse_cnj(process_number)
+        
+        if cnj:
+            return {
+                'valid': True,
+                'type': 'cnj',
+                'formatted': cnj['numero'],
+                'cnj': cnj
+            }
+        
+        return {'valid': False, 'type': 'invalid', 'formatted': process_number, 'cnj': None}
     
     async def consult_by_cpf(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Consultar processos por CPF"""
@@ -104,37 +99,108 @@ class ProcessConsultation:
         cpf_clean = re.sub(r'\D', '', cpf_input)
         cpf_formatted = self.format_cpf(cpf_clean)
         
-        await update.message.reply_text(f"🔍 Consultando processos para CPF: `{cpf_formatted}`...", parse_mode='Markdown')
+        status_message = await update.message.reply_text(
+            f"🔍 Consultando processos para CPF: `{cpf_formatted}`...", parse_mode='Markdown'
+        )
         
-        # Simular consulta (substituir por API real)
-        processes = await self.mock_consult_by_cpf(cpf_clean)
+        # Consulta concorrente em todos os tribunais; o progresso é exibido conforme cada um responde
+        processes = []
+        progress = []
+        async for tribunal, fresh, error in tribunal_connectors.fan_out_by_cpf(cpf_clean):
+            processes.extend(fresh)
+            connector = tribunal_connectors.get(tribunal)
+            progress.append(f"{'⚠️' if error else '✅'} {connector.name}: {'indisponível' if error else f'{len(fresh)} processo(s)'}")
+            try:
+                await status_message.edit_text(
+                    f"🔍 Consultando processos para CPF: `{cpf_formatted}`...\n\n" + "\n".join(progress),
+                    parse_mode='Markdown'
+                )
+            except Exception as e:
+                logger.debug(f"Não foi possível atualizar progresso: {e}")
         
         if processes:
-            response = f"📄 **Processos encontrados para CPF {cpf_formatted}:**\n\n"
-            
-            for i, process in enumerate(processes, 1):
-                response += (
-                    f"**Processo {i}:**\n"
-                    f"• Número: `{process['numero']}`\n"
-                    f"• Tribunal: {process['tribunal']}\n"
-                    f"• Assunto: {process['assunto']}\n"
-                    f"• Situação: {process['situacao']}\n"
-                    f"• Última movimentação: {process['ultima_movimentacao']}\n"
-                    f"• Valor da causa: {process.get('valor_causa', 'Não informado')}\n\n"
-                )
-            
-            response += "💡 *Use /consultarprocesso <número> para detalhes completos.*"
+            # Resultado guardado uma vez; só a página pedida é renderizada
+            token = result_pages.put(user_id, processes, {'cpf': cpf_formatted})
+            entry = result_pages.get(token, user_id)
+            response, keyboard = self.render_cpf_page(token, entry, 0)
             
             # Registrar conversão para afiliados
             await affiliate_system.record_conversion(user_id, 'process_consultation', 25.0)
-            
         else:
-            response = f"❌ Nenhum processo encontrado para o CPF `{cpf_formatted}`."
+            response, keyboard = f"❌ Nenhum processo encontrado para o CPF `{cpf_formatted}`.", None
         
         # Log da consulta
         mongo_db.log_query(user_id, 'cpf_consultation', cpf_formatted, response[:200] + "..." if len(response) > 200 else response)
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await update.message.reply_text(response, parse_mode='Markdown', reply_markup=keyboard)
+    
+    def render_cpf_page(self, token: str, entry: Dict, page: int):
+        """Renderizar uma página do resultado da consulta por CPF"""
+        pages = result_pages.page_count(entry)
+        page = max(0, min(page, pages - 1))
+        offset = page * result_pages.page_size
+        
+        lines = [f"📄 **Processos encontrados para CPF {entry['meta']['cpf']}** ({len(entry['items'])}):\n"]
+        for i, process in enumerate(result_pages.page(entry, page), offset + 1):
+            lines.append(
+                f"**Processo {i}:**\n"
+                f"• Número: `{process['numero']}`\n"
+                f"• Tribunal: {process['tribunal']}\n"
+                f"• Assunto: {process['assunto']}\n"
+                f"• Situação: {process['situacao']}\n"
+                f"• Última movimentação: {process['ultima_movimentacao']}\n"
+                f"• Valor da causa: {process.get('valor_causa', 'Não informado')}\n"
+            )
+        lines.append("💡 *Use /consultarprocesso <número> para detalhes completos.*")
+        return "\n".join(lines), result_pages.keyboard('cpfpg', token, page, pages)
+    
+    async def cpf_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Trocar de página servindo o resultado guardado em memória"""
+        query = update.callback_query
+        token, page = context.args
+        entry = result_pages.get(token, query.from_user.id)
+        
+        if entry is None:
+            await query.answer("⏱️ Consulta expirada. Refaça a consulta com /consultarcpf.", show_alert=True)
+            return
+        
+        await query.answer()
+        response, keyboard = self.render_cpf_page(token, entry, CallbackRouter.unpack_int(page))
+        try:
+            await query.edit_message_text(response, parse_mode='Markdown', reply_markup=keyboard)
+        except BadRequest as e:
+            # Mesma página clicada novamente: conteúdo inalterado
+            logger.debug(f"Página não alterada: {e}")
+    
+    def render_process_details(self, cached: Dict) -> str:
+        """Texto dos detalhes de um processo a partir da entrada do cache"""
+        process_details = cached['details']
+        response = (
+            f"⚖️ **Processo: {process_details['numero']}**\n\n"
+            f"📋 **Detalhes:**\n"
+            f"• Tribunal: {process_details['tribunal']}\n"
+            f"• Classe: {process_details['classe']}\n"
+            f"• Assunto: {process_details['assunto']}\n"
+            f"• Situação: {process_details['situacao']}\n"
+            f"• Distribuição: {process_details['distribuicao']}\n"
+            f"• Valor: {process_details.get('valor_causa', 'Não informado')}\n\n"
+            
+            f"👥 **Partes:**\n"
+        )
+        
+        for parte in process_details['partes'][:4]:  # Limitar a 4 partes
+            response += f"• {parte['tipo']}: {parte['nome']}\n"
+        
+        if len(process_details['partes']) > 4:
+            response += f"• ... e mais {len(process_details['partes']) - 4} partes\n"
+        
+        response += f"\n📅 **Últimas Movimentações:**\n"
+        for mov in process_details['movimentacoes'][:3]:  # Últimas 3 movimentações
+            response += f"• {mov['data']}: {mov['descricao']}\n"
+        
+        response += f"\n🕒 _Dados obtidos {describe_age(cached['fetched_at'])}"
+        response += " (atualizando em segundo plano)_" if cached['stale'] else "_"
+        return response
     
     async def consult_by_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Consultar processo por número"""
@@ -145,9 +211,9 @@ class ProcessConsultation:
                 "⚖️ **Consulta de Processo**\n\n"
                 "💡 **Uso:** /consultarprocesso <número do processo>\n\n"
                 "Exemplos:\n"
-                "`/consultarprocesso 0001234-56.2023.8.26.0100`\n"
-                "`/consultarprocesso 1234567-89.2023.8.26.0100`\n\n"
-                "📝 *Formatos aceitos: CNJ, TJSP, customizado*",
+                "`/consultarprocesso 0001234-08.2023.8.26.0100`\n"
+                "`/consultarprocesso 00012340820238260100`\n\n"
+                "📝 *Formato aceito: numeração única CNJ*",
                 parse_mode='Markdown'
             )
             return
@@ -158,41 +224,35 @@ class ProcessConsultation:
         if not validation['valid']:
             await update.message.reply_text(
                 "❌ Número de processo inválido.\n\n"
-                "💡 **Formatos válidos:**\n"
-                "• CNJ: 0001234-56.2023.8.26.0100\n"
-                "• TJSP: 1234567-89.2023.8.26.0100\n"
-                "• Custom: 2023.001.123456-7"
+                "💡 **Formato CNJ:** NNNNNNN-DD.AAAA.J.TR.OOOO\n"
+                "• Exemplo: 0001234-08.2023.8.26.0100\n"
+                "• Confira os dígitos verificadores (DD)"
             )
             return
         
-        await update.message.reply_text(f"🔍 Consultando processo: `{validation['formatted']}`...", parse_mode='Markdown')
-        
-        # Simular consulta detalhada
-        process_details = await self.mock_consult_process_details(validation['formatted'])
-        
-        if process_details:
-            response = (
-                f"⚖️ **Processo: {process_details['numero']}**\n\n"
-                f"📋 **Detalhes:**\n"
-                f"• Tribunal: {process_details['tribunal']}\n"
-                f"• Classe: {process_details['classe']}\n"
-                f"• Assunto: {process_details['assunto']}\n"
-                f"• Situação: {process_details['situacao']}\n"
-                f"• Distribuição: {process_details['distribuicao']}\n"
-                f"• Valor: {process_details.get('valor_causa', 'Não informado')}\n\n"
-                
-                f"👥 **Partes:**\n"
+        # O número CNJ já indica o tribunal: consulta direta em um único conector
+        cnj = validation['cnj']
+        connector = tribunal_connectors.get(cnj['connector']) if cnj['connector'] else None
+        if not connector:
+            await update.message.reply_text(
+                f"⚠️ O tribunal {cnj['tribunal']} ({cnj['justica']}) ainda não é suportado.\n\n"
+                "Tribunais disponíveis: TJSP, TJMG e TJRS."
             )
-            
-            for parte in process_details['partes'][:4]:  # Limitar a 4 partes
-                response += f"• {parte['tipo']}: {parte['nome']}\n"
-            
-            if len(process_details['partes']) > 4:
-                response += f"• ... e mais {len(process_details['partes']) - 4} partes\n"
-            
-            response += f"\n📅 **Últimas Movimentações:**\n"
-            for mov in process_details['movimentacoes'][:3]:  # Últimas 3 movimentações
-                response += f"• {mov['data']}: {mov['descricao']}\n"
+            return
+        
+        await update.message.reply_text(
+            f"🔍 Consultando processo `{validation['formatted']}` no {connector.name}...", parse_mode='Markdown'
+        )
+        
+        try:
+            cached = await process_cache.get(validation['formatted'], connector)
+        except Exception as e:
+            logger.error(f"Erro ao consultar processo no {connector.name}: {e}")
+            await update.message.reply_text(f"⚠️ {connector.name} indisponível no momento. Tente novamente mais tarde.")
+            return
+        
+        if cached['details']:
+            response = self.render_process_details(cached)
             
             # Registrar conversão para afiliados
             await affiliate_system.record_conversion(user_id, 'process_consultation', 35.0)
@@ -204,69 +264,6 @@ class ProcessConsultation:
         mongo_db.log_query(user_id, 'process_consultation', validation['formatted'], response[:200] + "..." if len(response) > 200 else response)
         
         await update.message.reply_text(response, parse_mode='Markdown')
-    
-    async def mock_consult_by_cpf(self, cpf: str) -> List[Dict]:
-        """Simular consulta por CPF (substituir por API real)"""
-        # Dados mock para demonstração
-        mock_data = {
-            "12345678900": [
-                {
-                    "numero": "0001234-56.2023.8.26.0100",
-                    "tribunal": "TJSP - São Paulo",
-                    "assunto": "Ação de Indenização por Danos Morais",
-                    "situacao": "Em andamento",
-                    "ultima_movimentacao": "15/10/2023 - Julgamento",
-                    "valor_causa": "R$ 50.000,00"
-                },
-                {
-                    "numero": "0005678-90.2022.8.26.0200", 
-                    "tribunal": "TJSP - São Paulo",
-                    "assunto": "Execução de Título Extrajudicial",
-                    "situacao": "Concluído",
-                    "ultima_movimentacao": "20/12/2022 - Arquivo",
-                    "valor_causa": "R$ 25.000,00"
-                }
-            ],
-            "98765432100": [
-                {
-                    "numero": "2023.001.123456-7",
-                    "tribunal": "TJMG - Minas Gerais", 
-                    "assunto": "Ação Trabalhista",
-                    "situacao": "Em andamento",
-                    "ultima_movimentacao": "10/11/2023 - Audiência",
-                    "valor_causa": "R$ 30.000,00"
-                }
-            ]
-        }
-        
-        return mock_data.get(cpf, [])
-    
-    async def mock_consult_process_details(self, process_number: str) -> Optional[Dict]:
-        """Simular consulta detalhada de processo (substituir por API real)"""
-        mock_details = {
-            "0001234-56.2023.8.26.0100": {
-                "numero": "0001234-56.2023.8.26.0100",
-                "tribunal": "TJSP - São Paulo",
-                "classe": "Ação de Indenização por Danos Morais",
-                "assunto": "Indenização por Danos Morais",
-                "situacao": "Em andamento",
-                "distribuicao": "15/03/2023 - Distribuição por sorteio",
-                "valor_causa": "R$ 50.000,00",
-                "partes": [
-                    {"tipo": "Autor", "nome": "João Silva"},
-                    {"tipo": "Réu", "nome": "Empresa XYZ Ltda"},
-                    {"tipo": "Advogado", "nome": "Dr. Carlos Santos"},
-                    {"tipo": "Advogado", "nome": "Dra. Maria Oliveira"}
-                ],
-                "movimentacoes": [
-                    {"data": "15/10/2023", "descricao": "Julgamento - Aguardando despacho"},
-                    {"data": "10/09/2023", "descricao": "Audiência de Conciliação - Não houve acordo"},
-                    {"data": "15/03/2023", "descricao": "Distribuição por sorteio"}
-                ]
-            }
-        }
-        
-        return mock_details.get(process_number)
 
 # Instância global do sistema de consulta
 process_consultation = ProcessConsultation()
@@ -275,4 +272,9 @@ process_consultation = ProcessConsultation()
 module_registry.register_command("consultarcpf", process_consultation.consult_by_cpf, "Consultar processos por CPF")
 module_registry.register_command("consultarprocesso", process_consultation.consult_by_process, "Consultar processo por número")
 
+module_registry.register_route('cpfpg', 'go', process_consultation.cpf_page_callback)
+
+module_registry.register_shutdown(process_cache.stop)
+module_registry.register_shutdown(close_http_client)
+
 module_registry.register_module("process_consultation")
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import random
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from telegram import Update
+from telegram.error import Forbidden
+from telegram.ext import ContextTypes
+from app.core.registry import module_registry
+from app.core.database import mongo_db
+from app.modules.cnj import parse_cnj
+from app.modules.process_cache import process_cache
+from app.modules.tribunal_connectors import tribunal_connectors
+
+logger = logging.getLogger(__name__)
+
+def movement_key(movement: Dict) -> str:
+    return f"{movement.get('data', '')}|{movement.get('descricao', '')}"
+
+class ProcessWatchlist:
+    """Acompanhamento de processos: um documento por processo com a lista de inscritos"""
+
+    def __init__(self, check_interval: int = 6 * 3600, tick_interval: int = 60, batch_size: int = 100,
+                 per_tribunal_concurrency: int = 3, max_per_user: int = 20):
+        # Intervalo entre verificações de um mesmo processo (com jitter de até 25%)
+        self.check_interval = check_interval
+        self.tick_interval = tick_interval
+        self.batch_size = batch_size
+        self.per_tribunal_concurrency = per_tribunal_concurrency
+        self.max_per_user = max_per_user
+        self.keep_movements = 200
+        # Um processo reivindicado volta a vencer depois disso se o worker cair no meio
+        self.lease_seconds = 900
+        self.poll_task: Optional[asyncio.Task] = None
+        self.application = None
+
+    def next_check(self) -> datetime:
+        jitter = random.uniform(0, self.check_interval * 0.25)
+        return datetime.utcnow() + timedelta(seconds=self.check_interval + jitter)
+
+    def _subscribe(self, user_id: int, process_number: str, tribunal: str, movements: List[Dict]) -> str:
+        watches = mongo_db.get_collection('process_watches')
+        if watches.count_documents({'subscribers': user_id}) >= self.max_per_user:
+            if not watches.find_one({'_id': process_number, 'subscribers': user_id}, {'_id': 1}):
+                return 'limit'
+        result = watches.update_one(
+            {'_id': process_number},
+            {
+                '$addToSet': {'subscribers': user_id},
+                '$setOnInsert': {
+                    'tribunal': tribunal,
+                    'seen_movements': [movement_key(m) for m in movements][:self.keep_movements],
+                    'next_check_at': self.next_check(),
+                    'created_at': datetime.utcnow()
+                }
+            },
+            upsert=True
+        )
+        return 'added' if result.modified_count or result.upserted_id else 'exists'
+
+    def _unsubscribe(self, user_id: int, process_number: str) -> bool:
+        watches = mongo_db.get_collection('process_watches')
+        result = watches.update_one({'_id': process_number}, {'$pull': {'subscribers': user_id}})
+        watches.delete_one({'_id': process_number, 'subscribers': {'$size': 0}})
+        return result.modified_count > 0
+
+    def _list(self, user_id: int) -> List[Dict]:
+        watches = mongo_db.get_collection('process_watches')
+        return list(watches.find({'subscribers': user_id}, {'tribunal': 1, 'last_checked_at': 1}).sort('_id', 1))
+
+    def _due(self) -> List[Dict]:
+        """Reivindicar de uma vez até batch_size processos vencidos
+
+        Os candidatos recebem um token de reivindicação e o next_check_at adiado
+        pelo lease num único update_many condicionado a ainda estarem vencidos;
+        só os que ficaram com o token deste lote são verificados, então outro
+        worker ou instância não os verifica (nem notifica os inscritos) de novo.
+        """
+        watches = mongo_db.get_collection('process_watches')
+        now = datetime.utcnow()
+        candidates = [
+            doc['_id'] for doc in
+            watches.find({'next_check_at': {'$lte': now}}, {'_id': 1}).sort('next_check_at', 1).limit(self.batch_size)
+        ]
+        if not candidates:
+            return []
+
+        token = uuid.uuid4().hex
+        watches.update_many(
+            {'_id': {'$in': candidates}, 'next_check_at': {'$lte': now}},
+            {'$set': {'next_check_at': now + timedelta(seconds=self.lease_seconds), 'claim_token': token}}
+        )
+        return list(watches.find({'claim_token': token}, {'subscribers': 1, 'tribunal': 1, 'seen_movements': 1}))
+
+    def _save_checks(self, updates: List[UpdateOne]):
+        if updates:
+            mongo_db.get_collection('process_watches').bulk_write(updates, ordered=False)
+
+    def _remove_subscriber(self, user_id: int):
+        watches = mongo_db.get_collection('process_watches')
+        watches.update_many({'subscribers': user_id}, {'$pull': {'subscribers': user_id}})
+        watches.delete_many({'subscribers': {'$size': 0}})
+
+    async def _check(self, watch: Dict, connector, semaphore: asyncio.Semaphore) -> Optional[UpdateOne]:
+        """Buscar o processo uma única vez e avisar os inscritos sobre movimentações novas"""
+        async with semaphore:
+            try:
+                cached = await process_cache.refresh(watch['_id'], connector)
+            except Exception as e:
+                logger.warning(f"Falha ao verificar processo acompanhado {watch['_id']}: {e}")
+                return UpdateOne(
+                    {'_id': watch['_id']},
+                    {'$set': {'next_check_at': self.next_check()}, '$unset': {'claim_token': ''}}
+                )
+
+        movements = (cached['details'] or {}).get('movimentacoes', [])
+        seen = set(watch.get('seen_movements', []))
+        fresh = [movement for movement in movements if movement_key(movement) not in seen]
+
+        if fresh:
+            try:
+                await self._notify(watch, fresh)
+            except Exception as e:
+                # As movimentações ficam registradas mesmo assim: quem já foi avisado não recebe de novo
+                logger.error(f"Erro ao notificar inscritos do processo {watch['_id']}: {e}")
+
+        keys = [movement_key(m) for m in movements]
+        return UpdateOne(
+            {'_id': watch['_id']},
+            {'$set': {
+                'seen_movements': (keys + [key for key in watch.get('seen_movements', []) if key not in keys])[:self.keep_movements],
+                'last_checked_at': datetime.utcnow(),
+                'next_check_at': self.next_check()
+            }, '$unset': {'claim_token': ''}}
+        )
+
+    async def _notify(self, watch: Dict, movements: List[Dict]):
+        text = f"🔔 **Novas movimentações no processo** `{watch['_id']}`\n\n"
+        text += "\n".join(f"• {m.get('data', '')}: {m.get('descricao', '')}" for m in movements[:10])
+        if len(movements) > 10:
+            text += f"\n• ... e mais {len(movements) - 10}"
+        text += "\n\n💡 *Use /consultarprocesso para ver os detalhes.*"
+
+        for user_id in watch.get('subscribers', []):
+            try:
+                await self.application.bot.send_message(user_id, text, parse_mode='Markdown')
+            except Forbidden:
+                # Usuário bloqueou o bot: deixa de acompanhar tudo
+                try:
+                    await asyncio.to_thread(self._remove_subscriber, user_id)
+                except Exception as e:
+                    logger.warning(f"Não foi possível remover inscrito {user_id}: {e}")
+            except Exception as e:
+                logger.warning(f"Não foi possível notificar {user_id}: {e}")
+
+    async def poll_once(self) -> int:
+        """Verificar um lote de processos vencidos, agrupados por tribunal"""
+        due = await asyncio.to_thread(self._due)
+        if not due:
+            return 0
+
+        by_tribunal = defaultdict(list)
+        for watch in due:
+            by_tribunal[watch['tribunal']].append(watch)
+
+        checks = []
+        for tribunal, watches in by_tribunal.items():
+            connector = tribunal_connectors.get(tribunal)
+            if connector is None:
+                continue
+            # Concorrência limitada por tribunal; o rate limit do conector espaça as chamadas
+            semaphore = asyncio.Semaphore(self.per_tribunal_concurrency)
+            checks.extend(self._check(watch, connector, semaphore) for watch in watches)
+
+        # Uma verificação que falhar não descarta as demais do lote (o lease a devolve depois)
+        updates = []
+        for result in await asyncio.gather(*checks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Erro ao verificar processo acompanhado: {result}")
+            elif result is not None:
+                updates.append(result)
+        await asyncio.to_thread(self._save_checks, updates)
+        return len(updates)
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                checked = await self.poll_once()
+                if checked:
+                    logger.info(f"🔔 {checked} processo(s) acompanhado(s) verificado(s)")
+            except Exception as e:
+                logger.error(f"Erro ao verificar processos acompanhados: {e}")
+            await asyncio.sleep(self.tick_interval)
+
+    async def start(self, application=None):
+        self.application = application
+        if self.poll_task is None or self.poll_task.done():
+            self.poll_task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def stop(self, application=None):
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+            self.poll_task = None
+
+    async def watch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Acompanhar movimentações de um processo"""
+        if not context.args:
+            await update.message.reply_text(
+                "🔔 **Acompanhar Processo**\n\n"
+                "💡 **Uso:** /acompanhar <número do processo>\n\n"
+                "Exemplo:\n"
+                "`/acompanhar 0001234-08.2023.8.26.0100`\n\n"
+                "Você será avisado quando houver novas movimentações.\n"
+                "📋 /acompanhando — processos acompanhados\n"
+                "🔕 /pararacompanhar <número> — deixar de acompanhar",
+                parse_mode='Markdown'
+            )
+            return
+
+        cnj = parse_cnj(" ".join(context.args))
+        if not cnj:
+            await update.message.reply_text("❌ Número de processo inválido. Use a numeração única CNJ.")
+            return
+        connector = tribunal_connectors.get(cnj['connector']) if cnj['connector'] else None
+        if connector is None:
+            await update.message.reply_text(f"⚠️ O tribunal {cnj['tribunal']} ainda não é suportado.")
+            return
+
+        try:
+            cached = await process_cache.get(cnj['numero'], connector)
+        except Exception as e:
+            logger.error(f"Erro ao consultar processo para acompanhamento: {e}")
+            await update.message.reply_text(f"⚠️ {connector.name} indisponível no momento. Tente novamente mais tarde.")
+            return
+        if not cached['details']:
+            await update.message.reply_text(f"❌ Processo `{cnj['numero']}` não encontrado.", parse_mode='Markdown')
+            return
+
+        try:
+            result = await asyncio.to_thread(
+                self._subscribe, update.effective_user.id, cnj['numero'], connector.code,
+                cached['details'].get('movimentacoes', [])
+            )
+        except Exception as e:
+            logger.error(f"Erro ao registrar acompanhamento: {e}")
+            await update.message.reply_text("❌ Erro ao registrar acompanhamento. Tente novamente.")
+            return
+
+        messages = {
+            'added': f"✅ Acompanhando o processo `{cnj['numero']}`. Você será avisado sobre novas movimentações.",
+            'exists': f"ℹ️ Você já acompanha o processo `{cnj['numero']}`.",
+            'limit': f"⚠️ Limite de {self.max_per_user} processos acompanhados atingido. Use /pararacompanhar para liberar."
+        }
+        await update.message.reply_text(messages[result], parse_mode='Markdown')
+
+    async def unwatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Deixar de acompanhar um processo"""
+        cnj = parse_cnj(" ".join(context.args)) if context.args else None
+        if not cnj:
+            await update.message.reply_text("💡 **Uso:** /pararacompanhar <número do processo>", parse_mode='Markdown')
+            return
+
+        try:
+            removed = await asyncio.to_thread(self._unsubscribe, update.effective_user.id, cnj['numero'])
+        except Exception as e:
+            logger.error(f"Erro ao remover acompanhamento: {e}")
+            await update.message.reply_text("❌ Erro ao remover acompanhamento. Tente novamente.")
+            return
+
+        if removed:
+            await update.message.reply_text(f"🔕 Você deixou de acompanhar o processo `{cnj['numero']}`.", parse_mode='Markdown')
+        else:
+            await update.message.reply_text(f"ℹ️ Você não acompanha o processo `{cnj['numero']}`.", parse_mode='Markdown')
+
+    async def list_watches(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Listar processos acompanhados"""
+        try:
+            watches = await asyncio.to_thread(self._list, update.effective_user.id)
+        except Exception as e:
+            logger.error(f"Erro ao listar acompanhamentos: {e}")
+            await update.message.reply_text("❌ Erro ao carregar seus acompanhamentos.")
+            return
+
+        if not watches:
+            await update.message.reply_text("📋 Você não acompanha nenhum processo.\n\n💡 Use /acompanhar <número>.")
+            return
+
+        text = f"📋 **Processos acompanhados ({len(watches)}/{self.max_per_user}):**\n\n"
+        for watch in watches:
+            checked = watch.get('last_checked_at')
+            text += f"• `{watch['_id']}` ({watch['tribunal'].upper()})"
+            text += f" — verificado em {checked.strftime('%d/%m %H:%M')}\n" if checked else "\n"
+        await update.message.reply_text(text, parse_mode='Markdown')
+
+# Instância global do acompanhamento de processos
+process_watchlist = ProcessWatchlist()
+
+# Registrar comandos
+module_registry.register_command("acompanhar", process_watchlist.watch, "Acompanhar movimentações de um processo")
+module_registry.register_command("pararacompanhar", process_watchlist.unwatch, "Deixar de acompanhar um processo")
+module_registry.register_command("acompanhando", process_watchlist.list_watches, "Listar processos acompanhados")
+
+module_registry.register_startup(process_watchlist.start)
+module_registry.register_shutdown(process_watchlist.stop)
+
+module_registry.register_module("process_watchlist")
@@ -0,0 +1,69 @@
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from app.core.registry import CallbackRouter
+
+class ResultPageStore:
+    """Resultados de consultas guardados em memória sob um token de curta duração"""
+
+    def __init__(self, ttl: int = 900, max_entries: int = 10000, page_size: int = 5):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.page_size = page_size
+        self.entries: OrderedDict = OrderedDict()
+
+    def _evict(self):
+        """Remover da frente (menos usados) os expirados e o que passar de max_entries"""
+        now = time.monotonic()
+        while self.entries:
+            token, entry = next(iter(self.entries.items()))
+            if entry['expires_at'] > now and len(self.entries) <= self.max_entries:
+                break
+            self.entries.pop(token)
+
+    def put(self, user_id: int, items: List[Dict], meta: Optional[Dict] = None) -> str:
+        """Guardar o resultado completo uma única vez e devolver o token"""
+        token = secrets.token_urlsafe(6)
+        self.entries[token] = {
+            'user_id': user_id,
+            'items': items,
+            'meta': meta or {},
+            'expires_at': time.monotonic() + self.ttl
+        }
+        self._evict()
+        return token
+
+    def get(self, token: str, user_id: int) -> Optional[Dict]:
+        entry = self.entries.get(token)
+        if entry is None or entry['user_id'] != user_id:
+            return None
+        if entry['expires_at'] <= time.monotonic():
+            self.entries.pop(token, None)
+            return None
+        # LRU: quem está paginando vai para o fim da fila de remoção
+        self.entries.move_to_end(token)
+        return entry
+
+    def page_count(self, entry: Dict) -> int:
+        return max(1, -(-len(entry['items']) // self.page_size))
+
+    def page(self, entry: Dict, page: int) -> List[Dict]:
+        start = page * self.page_size
+        return entry['items'][start:start + self.page_size]
+
+    def keyboard(self, prefix: str, token: str, page: int, pages: int) -> Optional[InlineKeyboardMarkup]:
+        """Botões ◀️ ▶️ com callback `prefixo:go:token:página` (None quando tudo cabe em uma página)"""
+        if pages <= 1:
+            return None
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("◀️", callback_data=CallbackRouter.pack(prefix, 'go', token, page - 1)))
+        buttons.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=CallbackRouter.pack(prefix, 'go', token, page)))
+        if page < pages - 1:
+            buttons.append(InlineKeyboardButton("▶️", callback_data=CallbackRouter.pack(prefix, 'go', token, page + 1)))
+        return InlineKeyboardMarkup([buttons])
+
+# Instância global das páginas de resultado
+result_pages = ResultPageStore()
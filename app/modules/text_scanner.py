@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import re
+from datetime import datetime
+from typing import List, Tuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, filters
+from app.core.registry import module_registry
+from app.core.database import mongo_db
+from app.modules.affiliate_system import affiliate_system
+from app.modules.cnj import parse_cnj
+from app.modules.process_cache import process_cache, describe_age
+from app.modules.process_consultation import process_consultation
+from app.modules.result_pages import result_pages
+from app.modules.tribunal_connectors import tribunal_connectors
+
+logger = logging.getLogger(__name__)
+
+# Uma única passada: números CNJ (com ou sem pontuação) têm prioridade sobre CPFs
+SCANNER = re.compile(
+    r'(?<![\d.-])(?:'
+    r'(?P<cnj>\d{7}-?\d{2}\.?\d{4}\.?\d\.?\d{2}\.?\d{4})'
+    r'|(?P<cpf>\d{3}\.?\d{3}\.?\d{3}-?\d{2})'
+    r')(?![\d])'
+)
+
+class TextScanner:
+    """Detecção de números de processo e CPFs em mensagens de texto livre"""
+
+    def __init__(self, max_matches: int = 5):
+        self.max_matches = max_matches
+
+    def scan(self, text: str) -> List[Tuple[str, str, dict]]:
+        """Extrair (tipo, valor normalizado, número CNJ decomposto) sem repetições"""
+        found, seen = [], set()
+        for match in SCANNER.finditer(text):
+            if match.group('cnj'):
+                cnj = parse_cnj(match.group('cnj'))
+                key = ('processo', cnj['numero']) if cnj else None
+            else:
+                cnj = None
+                digits = re.sub(r'\D', '', match.group('cpf'))
+                key = ('cpf', digits) if process_consultation.validate_cpf(digits) else None
+
+            if key and key not in seen:
+                seen.add(key)
+                found.append((key[0], key[1], cnj))
+                if len(found) >= self.max_matches:
+                    break
+        return found
+
+    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Oferecer consulta com um toque para os números encontrados na mensagem"""
+        message = update.effective_message
+        if not message or not message.text:
+            return
+        # Texto que uma conversa está esperando (ex.: perfil no JuristCoach) não é uma busca
+        if module_registry.in_conversation(update):
+            return
+
+        found = self.scan(message.text)
+        if not found:
+            return
+
+        lines = ["🔎 **Encontrei na sua mensagem:**\n"]
+        buttons = []
+        for kind, value, cnj in found:
+            if kind == 'processo':
+                cached = await process_cache.peek(value)
+                status = f" — em cache, {describe_age(cached['fetched_at'])}" if cached and cached.get('details') and cached.get('fetched_at') else ""
+                lines.append(f"⚖️ Processo `{value}` ({cnj['tribunal']}){status}")
+                if cnj['connector']:
+                    digits = re.sub(r'\D', '', value)
+                    buttons.append([InlineKeyboardButton(f"⚖️ Consultar {value}", callback_data=f"scan:p:{digits}")])
+            else:
+                formatted = process_consultation.format_cpf(value)
+                lines.append(f"🔍 CPF `{formatted}`")
+                buttons.append([InlineKeyboardButton(f"🔍 Processos do CPF {formatted}", callback_data=f"scan:c:{value}")])
+
+        if not buttons:
+            lines.append("\n⚠️ Tribunal ainda não suportado.")
+        await message.reply_text(
+            "\n".join(lines), parse_mode='Markdown',
+            reply_markup=InlineKeyboardMarkup(buttons) if buttons else None
+        )
+
+    async def lookup_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Consulta disparada pelo botão, servida do cache quando disponível"""
+        query = update.callback_query
+        user_id = query.from_user.id
+        _, kind, value = query.data.split(':')
+        if not value.isdigit():
+            await query.answer()
+            return
+        await query.answer("🔍 Consultando...")
+        # Mesmo botão tocado de novo no dia (ou update reentregue) gera uma única comissão
+        event_id = f"scan:{user_id}:{value}:{datetime.utcnow():%Y%m%d}"
+
+        if kind == 'p':
+            cnj = parse_cnj(value)
+            connector = tribunal_connectors.get(cnj['connector']) if cnj and cnj['connector'] else None
+            if connector is None:
+                await query.message.reply_text("⚠️ Tribunal ainda não suportado.")
+                return
+            try:
+                cached = await process_cache.get(cnj['numero'], connector)
+            except Exception as e:
+                logger.error(f"Erro ao consultar processo no {connector.name}: {e}")
+                await query.message.reply_text(f"⚠️ {connector.name} indisponível no momento. Tente novamente mais tarde.")
+                return
+
+            if cached['details']:
+                response = process_consultation.render_process_details(cached)
+                await affiliate_system.record_conversion(user_id, 'process_consultation', 35.0, event_id)
+            else:
+                response = f"❌ Processo `{cnj['numero']}` não encontrado."
+            await asyncio.to_thread(mongo_db.log_query, user_id, 'process_consultation', cnj['numero'], response[:200])
+            await query.message.reply_text(response, parse_mode='Markdown')
+            return
+
+        cpf_formatted = process_consultation.format_cpf(value)
+        processes, failed = await tribunal_connectors.search_by_cpf(value)
+        if processes:
+            token = result_pages.put(user_id, processes, {'cpf': cpf_formatted})
+            response, keyboard = process_consultation.render_cpf_page(token, result_pages.get(token, user_id), 0)
+            await affiliate_system.record_conversion(user_id, 'process_consultation', 25.0, event_id)
+        else:
+            response, keyboard = f"❌ Nenhum processo encontrado para o CPF `{cpf_formatted}`.", None
+        if failed:
+            response += f"\n\n⚠️ Indisponíveis no momento: {', '.join(code.upper() for code in failed)}"
+        await asyncio.to_thread(mongo_db.log_query, user_id, 'cpf_consultation', cpf_formatted, response[:200])
+        await query.message.reply_text(response, parse_mode='Markdown', reply_markup=keyboard)
+
+# Instância global do scanner de texto livre
+text_scanner = TextScanner()
+
+# Grupo próprio: roda depois dos demais handlers de texto, mas cede a vez às conversas ativas
+module_registry.register_message(filters.TEXT & ~filters.COMMAND, text_scanner.handle_text, group=1)
+module_registry.register_route('scan', 'p', text_scanner.lookup_callback)
+module_registry.register_route('scan', 'c', text_scanner.lookup_callback)
+
+module_registry.register_module("text_scanner")
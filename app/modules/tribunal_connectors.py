@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import re
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from app.core.config import Config
+from app.core.rate_limit import TokenBucket
+from app.modules.tribunal_mock import mock_transport, mock_base_url
+from app.modules.cnj import parse_cnj
+
+logger = logging.getLogger(__name__)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente HTTP compartilhado (pool de conexões) entre todos os conectores"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        options = {
+            'limits': httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            'headers': {'User-Agent': f"{Config.BOT_NAME}"}
+        }
+        if Config.TRIBUNAL_API_MODE == 'mock':
+            options['transport'] = mock_transport()
+        _http_client = httpx.AsyncClient(**options)
+    return _http_client
+
+async def close_http_client(application=None):
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def process_key(numero: str) -> str:
+    """Chave de deduplicação: apenas os dígitos do número do processo"""
+    return re.sub(r'\D', '', numero or '')
+
+class TribunalConnector:
+    """Conector assíncrono base para a API de um tribunal"""
+
+    code = ''
+    name = ''
+    timeout = 10.0
+    rate = 5.0  # requisições por segundo
+
+    def __init__(self, base_url: str):
+        if Config.TRIBUNAL_API_MODE == 'mock':
+            base_url = mock_base_url(self.code)
+        self.base_url = base_url.rstrip('/')
+        self.limiter = TokenBucket(self.rate, capacity=self.rate)
+
+    async def _get(self, url: str, params: Dict = None) -> Optional[httpx.Response]:
+        await self.limiter.acquire()
+        response = await get_http_client().get(url, params=params, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response
+
+    def normalize_summary(self, item: Dict) -> Dict:
+        """Adaptar o item retornado pela API ao formato usado pelo bot"""
+        return {
+            'numero': item.get('numero', ''),
+            'tribunal': item.get('tribunal', self.name),
+            'assunto': item.get('assunto', 'Não informado'),
+            'situacao': item.get('situacao', 'Não informado'),
+            'ultima_movimentacao': item.get('ultima_movimentacao', 'Não informado'),
+            'valor_causa': item.get('valor_causa', 'Não informado')
+        }
+
+    def normalize_details(self, item: Dict) -> Dict:
+        return {
+            **item,
+            'tribunal': item.get('tribunal', self.name),
+            'partes': item.get('partes', []),
+            'movimentacoes': item.get('movimentacoes', [])
+        }
+
+    async def search_by_cpf(self, cpf: str) -> List[Dict]:
+        """Buscar processos de um CPF neste tribunal"""
+        response = await self._get(self.base_url, params={'cpf': cpf})
+        if response is None:
+            return []
+        return [self.normalize_summary(item) for item in response.json().get('processos', [])]
+
+    async def get_process(self, process_number: str) -> Optional[Dict]:
+        """Buscar detalhes de um processo neste tribunal"""
+        response = await self._get(f"{self.base_url}/{process_number}")
+        if response is None:
+            return None
+        return self.normalize_details(response.json())
+
+class TJSPConnector(TribunalConnector):
+    code = 'tjsp'
+    name = 'TJSP - São Paulo'
+    timeout = 8.0
+    rate = 10.0
+
+class TJMGConnector(TribunalConnector):
+    code = 'tjmg'
+    name = 'TJMG - Minas Gerais'
+    timeout = 10.0
+    rate = 5.0
+
+class TJRSConnector(TribunalConnector):
+    code = 'tjrs'
+    name = 'TJRS - Rio Grande do Sul'
+    timeout = 10.0
+    rate = 5.0
+
+class ConnectorRegistry:
+    """Registro dos conectores e fan-out concorrente de consultas"""
+
+    def __init__(self):
+        self.connectors: Dict[str, TribunalConnector] = {
+            'tjsp': TJSPConnector(Config.TJSP_API_URL),
+            'tjmg': TJMGConnector(Config.TJMG_API_URL),
+            'tjrs': TJRSConnector(Config.TJRS_API_URL),
+        }
+
+    def get(self, code: str) -> Optional[TribunalConnector]:
+        return self.connectors.get(code)
+
+    async def _search(self, connector: TribunalConnector, cpf: str) -> Tuple[str, List[Dict], Optional[str]]:
+        try:
+            return connector.code, await connector.search_by_cpf(cpf), None
+        except Exception as e:
+            logger.error(f"Erro na consulta ao {connector.name}: {e}")
+            return connector.code, [], str(e) or e.__class__.__name__
+
+    async def fan_out_by_cpf(self, cpf: str) -> AsyncIterator[Tuple[str, List[Dict], Optional[str]]]:
+        """Consultar todos os tribunais em paralelo, entregando resultados novos conforme chegam"""
+        seen = set()
+        tasks = [asyncio.ensure_future(self._search(connector, cpf)) for connector in self.connectors.values()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                code, processes, error = await finished
+                fresh = []
+                for process in processes:
+                    key = process_key(process['numero'])
+                    if key and key not in seen:
+                        seen.add(key)
+                        fresh.append(process)
+                yield code, fresh, error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def search_by_cpf(self, cpf: str) -> Tuple[List[Dict], List[str]]:
+        """Resultado consolidado e deduplicado; retorna (processos, tribunais com falha)"""
+        processes, failed = [], []
+        async for code, fresh, error in self.fan_out_by_cpf(cpf):
+            processes.extend(fresh)
+            if error:
+                failed.append(code)
+        return processes, failed
+
+    def connector_for(self, process_number: str) -> Optional[TribunalConnector]:
+        """Conector responsável pelo número CNJ (None se inválido ou não suportado)"""
+        cnj = parse_cnj(process_number)
+        if not cnj or not cnj['connector']:
+            return None
+        return self.get(cnj['connector'])
+
+    async def find_process(self, process_number: str) -> Optional[Dict]:
+        """Buscar detalhes apenas no tribunal indicado pelo número CNJ"""
+        connector = self.connector_for(process_number)
+        if connector is None:
+            return None
+        try:
+            return await connector.get_process(parse_cnj(process_number)['numero'])
+        except Exception as e:
+            logger.error(f"Erro ao buscar processo no {connector.name}: {e}")
+            return None
+
+# Instância global dos conectores de tribunais
+tribunal_connectors = ConnectorRegistry()
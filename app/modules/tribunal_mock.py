@@ -0,0 +1,93 @@
+from typing import Dict, Tuple
+from urllib.parse import parse_qs
+
+# Dados mock para demonstração, separados por tribunal
+MOCK_PROCESSES_BY_CPF = {
+    'tjsp': {
+        "12345678900": [
+            {
+                "numero": "0001234-08.2023.8.26.0100",
+                "tribunal": "TJSP - São Paulo",
+                "assunto": "Ação de Indenização por Danos Morais",
+                "situacao": "Em andamento",
+                "ultima_movimentacao": "15/10/2023 - Julgamento",
+                "valor_causa": "R$ 50.000,00"
+            },
+            {
+                "numero": "0005678-12.2022.8.26.0200",
+                "tribunal": "TJSP - São Paulo",
+                "assunto": "Execução de Título Extrajudicial",
+                "situacao": "Concluído",
+                "ultima_movimentacao": "20/12/2022 - Arquivo",
+                "valor_causa": "R$ 25.000,00"
+            }
+        ]
+    },
+    'tjmg': {
+        "98765432100": [
+            {
+                "numero": "1234567-44.2023.8.13.0024",
+                "tribunal": "TJMG - Minas Gerais",
+                "assunto": "Ação Trabalhista",
+                "situacao": "Em andamento",
+                "ultima_movimentacao": "10/11/2023 - Audiência",
+                "valor_causa": "R$ 30.000,00"
+            }
+        ]
+    },
+    'tjrs': {}
+}
+
+MOCK_PROCESS_DETAILS = {
+    'tjsp': {
+        "0001234-08.2023.8.26.0100": {
+            "numero": "0001234-08.2023.8.26.0100",
+            "tribunal": "TJSP - São Paulo",
+            "classe": "Ação de Indenização por Danos Morais",
+            "assunto": "Indenização por Danos Morais",
+            "situacao": "Em andamento",
+            "distribuicao": "15/03/2023 - Distribuição por sorteio",
+            "valor_causa": "R$ 50.000,00",
+            "partes": [
+                {"tipo": "Autor", "nome": "João Silva"},
+                {"tipo": "Réu", "nome": "Empresa XYZ Ltda"},
+                {"tipo": "Advogado", "nome": "Dr. Carlos Santos"},
+                {"tipo": "Advogado", "nome": "Dra. Maria Oliveira"}
+            ],
+            "movimentacoes": [
+                {"data": "15/10/2023", "descricao": "Julgamento - Aguardando despacho"},
+                {"data": "10/09/2023", "descricao": "Audiência de Conciliação - Não houve acordo"},
+                {"data": "15/03/2023", "descricao": "Distribuição por sorteio"}
+            ]
+        }
+    },
+    'tjmg': {},
+    'tjrs': {}
+}
+
+def handle_request(path: str, query: str = '') -> Tuple[int, Dict]:
+    """Responder como a API de um tribunal: /{tribunal}/processos[/{numero}]?cpf="""
+    parts = [part for part in path.split('/') if part]
+    if len(parts) < 2 or parts[0] not in MOCK_PROCESSES_BY_CPF or parts[1] != 'processos':
+        return 404, {'erro': 'rota não encontrada'}
+
+    tribunal = parts[0]
+    if len(parts) == 3:
+        details = MOCK_PROCESS_DETAILS[tribunal].get(parts[2])
+        return (200, details) if details else (404, {'erro': 'processo não encontrado'})
+
+    cpf = parse_qs(query).get('cpf', [''])[0]
+    return 200, {'processos': MOCK_PROCESSES_BY_CPF[tribunal].get(cpf, [])}
+
+def mock_transport():
+    """Transport httpx em processo que responde com os dados mock"""
+    import httpx
+
+    def handler(request: 'httpx.Request') -> 'httpx.Response':
+        status, payload = handle_request(request.url.path, request.url.query.decode())
+        return httpx.Response(status, json=payload)
+
+    return httpx.MockTransport(handler)
+
+def mock_base_url(tribunal: str, host: str = 'http://tribunal.mock') -> str:
+    return f"{host}/{tribunal}/processos"
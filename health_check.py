@@ -1,10 +0,0 @@
-from flask import Flask
-
-app = Flask(__name__)
-
-@app.route('/health')
-def health_check():
-    return {'status': 'healthy', 'service': 'JuristBot'}, 200
-
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000)
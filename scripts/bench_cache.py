@@ -0,0 +1,143 @@
+"""Cache compartilhado: duas instâncias com NearCache sobre cada backend.
+
+Simula duas instâncias do bot (dois NearCache com o mesmo namespace) lendo
+chaves com distribuição concentrada, como perfis de afiliados, e mede quantas
+leituras chegam à "origem" (o MongoDB, simulado com latência), quantas vão ao
+backend compartilhado e a vazão. Em seguida confere a invalidação entre
+instâncias: um valor alterado na instância A tem que aparecer na B em até
+`version_interval` segundos.
+
+    python scripts/bench_cache.py --reads 20000 --keys 500 --backend-latency 0.001
+
+O backend redis usa o servidor local de scripts/mock_redis_server.py; o mongo,
+uma coleção em memória com a mesma interface usada pelo MongoTTLBackend.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+
+from mock_redis_server import make_server
+
+class MemoryCacheCollection:
+    """Coleção `cache` em memória: só as operações usadas pelo MongoTTLBackend"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.documents = {}
+
+    def find_one(self, query, projection=None):
+        time.sleep(self.latency)
+        document = self.documents.get(query['_id'])
+        if document is None:
+            return None
+        if 'expires_at' in query and document.get('expires_at', datetime.max) <= query['expires_at']['$gt']:
+            return None
+        return dict(document)
+
+    def replace_one(self, query, document, upsert=False):
+        time.sleep(self.latency)
+        self.documents[query['_id']] = dict(document)
+
+    def delete_one(self, query):
+        time.sleep(self.latency)
+        self.documents.pop(query['_id'], None)
+        return SimpleNamespace(deleted_count=1)
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        time.sleep(self.latency)
+        document = self.documents.setdefault(query['_id'], {'_id': query['_id']})
+        for field, amount in update['$inc'].items():
+            document[field] = document.get(field, 0) + amount
+        return dict(document)
+
+async def scenario(name: str, backend, args) -> None:
+    from app.core.cache import NearCache
+
+    origin = {'reads': 0}
+    values = {f"user{i}": {'affiliate_code': f"JB{i:06d}", 'first_name': f"Afiliado {i}"} for i in range(args.keys)}
+
+    def loader(key: str):
+        async def load():
+            origin['reads'] += 1
+            await asyncio.sleep(args.origin_latency)
+            return values.get(key)
+        return load
+
+    instances = [NearCache('bench', backend, ttl=600, local_ttl=args.local_ttl, version_interval=args.version_interval)
+                 for _ in range(2)]
+    # Poucas chaves concentram a maior parte das leituras
+    keys = [f"user{min(int(random.paretovariate(1.2)) - 1, args.keys - 1)}" for _ in range(args.reads)]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def read(index: int, key: str):
+        async with semaphore:
+            await instances[index % 2].get(key, loader(key))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(read(index, key) for index, key in enumerate(keys)))
+    elapsed = time.perf_counter() - started
+
+    l1 = sum(cache.stats['l1'] for cache in instances)
+    l2 = sum(cache.stats['l2'] for cache in instances)
+    errors = sum(cache.stats['errors'] for cache in instances)
+    print(f"{name:>7}: {args.reads} leituras em {elapsed:.2f} s ({args.reads / elapsed:,.0f}/s) | "
+          f"L1 {l1} | L2 {l2} | origem {origin['reads']} | erros {errors}")
+
+    # Invalidação entre instâncias
+    first, second = instances
+    key = 'user0'
+    await second.get(key, loader(key))
+    values[key] = {'affiliate_code': 'JB999999', 'first_name': 'Alterado'}
+    await first.invalidate(key)
+    started = time.perf_counter()
+    while (await second.get(key, loader(key)))['affiliate_code'] != 'JB999999':
+        if time.perf_counter() - started > args.version_interval * 3:
+            print(f"{'':>7}  invalidação: FALHA, instância B continua com o valor antigo")
+            return
+        await asyncio.sleep(0.05)
+    print(f"{'':>7}  invalidação: instância B atualizada em {(time.perf_counter() - started) * 1000:.0f} ms -> OK")
+
+async def main(args: argparse.Namespace):
+    from app.core.cache import MemoryLRUBackend, MongoTTLBackend, RedisBackend
+    from app.core.database import mongo_db
+
+    print(f"origem com {args.origin_latency * 1000:.1f} ms por leitura, backend com {args.backend_latency * 1000:.1f} ms")
+
+    # Memória: cada instância teria o seu, mas aqui as duas compartilham para comparação
+    await scenario('memory', MemoryLRUBackend(), args)
+
+    collection = MemoryCacheCollection(args.backend_latency)
+    mongo_db.get_collection = lambda name: collection if name == 'cache' else None
+    await scenario('mongo', MongoTTLBackend(), args)
+
+    server, mock = await make_server(password='bench', latency=args.backend_latency)
+    port = server.sockets[0].getsockname()[1]
+    backend = RedisBackend(f"redis://:bench@127.0.0.1:{port}/1")
+    await scenario('redis', backend, args)
+    print(f"{'':>7}  comandos recebidos pelo servidor: {mock.commands}")
+    await backend.close()
+
+    # Backend fora do ar: o cache vira pass-through para a origem, sem exceções
+    server.close()
+    await server.wait_closed()
+    await scenario('offline', RedisBackend(f"redis://127.0.0.1:{port}/0", timeout=0.2), args)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reads', type=int, default=20000)
+    parser.add_argument('--keys', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--origin-latency', type=float, default=0.005, help='latência de uma leitura no MongoDB')
+    parser.add_argument('--backend-latency', type=float, default=0.001, help='latência de um comando no backend')
+    parser.add_argument('--local-ttl', type=float, default=30)
+    parser.add_argument('--version-interval', type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,164 @@
+"""Custo de despacho de callback queries: cadeia de regex x CallbackRouter.
+
+Monta o grupo 0 da Application como antes (ConversationHandler do JuristCoach
+com um CallbackQueryHandler por padrão, comandos e os CallbackQueryHandlers de
+afiliados, páginas de CPF, scanner, admin e broadcast) e como agora (mesma
+conversa com os handlers do roteador e um único handler global) e mede, para
+cada callback_data, o tempo para encontrar o handler que atende o update, como
+o Application.process_update faz: check_update em cada handler até o primeiro
+que aceitar. O if/elif do painel administrativo entra na conta da cadeia antiga.
+
+Os callbacks não são executados; só a seleção do handler é medida. O usuário
+tem uma conversa do coach em andamento, o caso mais caro para a cadeia antiga.
+
+    python scripts/bench_callback_dispatch.py --rounds 20000
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+
+from telegram import Bot, Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandler
+from telegram.warnings import PTBUserWarning
+
+from bench_coach_load import BOT_USER
+
+CHOOSING = 0
+USER_ID = 4242
+COMMANDS = [
+    'start', 'direito', 'analisar', 'afiliado', 'meuafiliado', 'linkafiliado', 'comissoes', 'topafiliados',
+    'consultarcpf', 'consultarprocesso', 'acompanhar', 'pararacompanhar', 'acompanhando', 'consultalote',
+    'admin', 'broadcast', 'afiliadoslote', 'verificarledger', 'qualidadedados', 'recalcularstats'
+]
+ADMIN_ACTIONS = ['stats', 'users', 'affiliates', 'queries', 'finance', 'settings', 'export_users', 'check_connections', 'back']
+
+# (antes, agora) para cada botão medido
+CASES = [
+    ('admin_stats', 'admin:stats'),
+    ('admin_back', 'admin:back'),
+    ('generate_link', 'aff:link'),
+    ('share_affiliate', 'aff:share'),
+    ('cpfpg:Ab3_x-Yz:3', 'cpfpg:go:Ab3_x-Yz:3'),
+    ('scan:p:00012345620238260100', 'scan:p:00012345620238260100'),
+    ('bcast_cancel:65f1c0ffee0123456789abcd', 'bcast:cancel:65f1c0ffee0123456789abcd'),
+    ('coach_analysis', 'coach:analysis'),
+    ('sim_judge', 'coach:sim:judge'),
+    ('coach_back_main', 'coach:menu'),
+]
+
+async def noop(update, context):
+    pass
+
+def callback_update(data: str, bot: Bot) -> Update:
+    user = {'id': USER_ID, 'is_bot': False, 'first_name': 'Usuário'}
+    return Update.de_json({
+        'update_id': 1,
+        'callback_query': {
+            'id': '1', 'from': user, 'chat_instance': '1', 'data': data,
+            'message': {'message_id': 1, 'date': int(time.time()), 'chat': {'id': USER_ID, 'type': 'private'},
+                        'from': BOT_USER, 'text': 'menu'}
+        }
+    }, bot)
+
+def coach_conversation(entry_points: list, choosing: list) -> ConversationHandler:
+    conversation = ConversationHandler(
+        entry_points=[CommandHandler('juristcoach', noop), CommandHandler('coach', noop)] + entry_points,
+        states={CHOOSING: choosing},
+        fallbacks=[CommandHandler('cancel', noop)]
+    )
+    conversation._conversations[(USER_ID, USER_ID)] = CHOOSING
+    return conversation
+
+def old_chain() -> list:
+    patterns = ['^coach_analysis$', '^coach_planning$', '^coach_studyplan$', '^coach_interview$', '^coach_progress$',
+                '^coach_trends$', '^sim_', '^plan_', '^coach_back$', '^coach_back_main$']
+    conversation = coach_conversation(
+        [CallbackQueryHandler(noop, pattern='^juristcoach_start$')],
+        [CallbackQueryHandler(noop, pattern=pattern) for pattern in patterns]
+    )
+    callbacks = ['generate_link', 'view_commissions', 'share_affiliate', r"^cpfpg:", r"^scan:[pc]:\d+$",
+                 "admin_.*", r"^bcast_cancel:[0-9a-f]+$"]
+    return ([conversation] + [CommandHandler(command, noop) for command in COMMANDS]
+            + [CallbackQueryHandler(noop, pattern=pattern) for pattern in callbacks])
+
+def new_chain():
+    from app.core.registry import CallbackRouter
+
+    router = CallbackRouter()
+    for prefix, actions in (('admin', ADMIN_ACTIONS + ['*']), ('aff', ['link', 'commissions', 'share']),
+                            ('cpfpg', ['go']), ('scan', ['p', 'c']), ('bcast', ['cancel']),
+                            ('coach', ['start', 'analysis', 'planning', 'studyplan', 'interview', 'progress',
+                                       'trends', 'sim', 'plan', 'back', 'menu', 'cancel'])):
+        for action in actions:
+            router.add(prefix, action, noop)
+    conversation = coach_conversation([router.handler('coach', actions={'start'})], [router.handler('coach')])
+    return [conversation] + [CommandHandler(command, noop) for command in COMMANDS] + [router.handler()], router
+
+def admin_if_elif(data: str) -> None:
+    """O antigo admin_callback_handler comparava o callback_data com cada ação em sequência"""
+    for action in ADMIN_ACTIONS:
+        if data == f"admin_{action}":
+            return
+
+def select(chain: list, update: Update):
+    for handler in chain:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return handler, check
+    return None, None
+
+def measure(chain: list, update: Update, rounds: int, legacy_admin: bool = False) -> float:
+    data = update.callback_query.data
+    started = time.perf_counter()
+    for _ in range(rounds):
+        select(chain, update)
+        if legacy_admin and data.startswith('admin_'):
+            admin_if_elif(data)
+    return (time.perf_counter() - started) / rounds
+
+def main(args: argparse.Namespace):
+    # A cadeia antiga usava CallbackQueryHandlers com per_message=False, como o módulo original
+    warnings.filterwarnings('ignore', category=PTBUserWarning)
+    bot = Bot('1:bench')
+    old = old_chain()
+    new, router = new_chain()
+
+    print(f"{args.rounds} despachos por botão; tempo para selecionar o handler ({len(old)} handlers no grupo 0 antes, {len(new)} agora)")
+    print(f"{'botão':>42} | {'regex':>9} | {'roteador':>9} | ganho")
+    totals = [0.0, 0.0]
+    for old_data, new_data in CASES:
+        old_update, new_update = callback_update(old_data, bot), callback_update(new_data, bot)
+        # Os dois caminhos têm que escolher um handler, senão a comparação não vale
+        if select(old, old_update)[0] is None or select(new, new_update)[0] is None:
+            print(f"{new_data:>42} | sem handler -> FALHA")
+            return
+        before = measure(old, old_update, args.rounds, legacy_admin=True)
+        after = measure(new, new_update, args.rounds)
+        totals[0] += before
+        totals[1] += after
+        print(f"{new_data:>42} | {before * 1e6:6.2f} µs | {after * 1e6:6.2f} µs | {before / after:4.1f}x")
+    print(f"{'média':>42} | {totals[0] / len(CASES) * 1e6:6.2f} µs | {totals[1] / len(CASES) * 1e6:6.2f} µs | "
+          f"{totals[0] / totals[1]:4.1f}x")
+
+    # Botões antigos ainda em mensagens enviadas: traduzidos antes da consulta às rotas
+    from app.modules.manifest import LEGACY_CALLBACKS
+    router.legacy.update(LEGACY_CALLBACKS)
+    legacy = measure(new, callback_update('admin_stats', bot), args.rounds)
+    print(f"{'admin_stats (formato antigo)':>42} | {'':>9} | {legacy * 1e6:6.2f} µs |")
+
+    started = time.perf_counter()
+    for page in range(args.rounds):
+        data = router.pack('cpfpg', 'go', 'Ab3_x-Yz', page)
+        router.unpack_int(router.resolve(data)[3][1])
+    print(f"pack + resolve: {(time.perf_counter() - started) / args.rounds * 1e6:.2f} µs | "
+          f"maior callback_data medido: {max(len(new_data.encode()) for _, new_data in CASES)} de 64 bytes")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    main(parser.parse_args())
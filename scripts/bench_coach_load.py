@@ -0,0 +1,264 @@
+"""Teste de carga: sessões do JuristCoach x latência do /direito.
+
+Monta uma Application real (API do Telegram simulada por um BaseRequest local,
+sem rede) com o ConversationHandler do JuristCoach e o comando /direito, e
+dispara sessões completas do coach (/juristcoach -> Análise de Perfil -> texto
+do perfil) junto com consultas /direito de outros usuários. A IA é simulada
+com latência fixa e o MongoDB com chamadas bloqueantes curtas, como o pymongo;
+a coleção de jobs fica em memória e a análise do coach roda nos workers da fila.
+
+Mede a latência do /direito (update enfileirado -> resposta enviada) sem e com
+sessões do coach em andamento; com o coach assíncrono as duas devem ficar
+próximas da latência da própria IA.
+
+    python scripts/bench_coach_load.py --coach-users 50 --direito-users 50 --job-workers 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler
+from telegram.request import RequestData
+
+from bench_update_concurrency import OfflineRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'JuristBot', 'username': 'juristbot_bench'}
+
+class RecordingRequest(OfflineRequest):
+    """Simula os métodos da Bot API usados pelos handlers e registra cada envio por chat"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent: Dict[int, list] = {}
+        self.message_id = 0
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if api_method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            self.sent.setdefault(chat_id, []).append((time.perf_counter(), params.get('text', '')))
+            self.message_id += 1
+            result = {
+                'message_id': self.message_id, 'date': int(time.time()), 'from': BOT_USER,
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')
+            }
+        elif api_method == 'getMe':
+            result = BOT_USER
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+class BlockingCollection:
+    """Coleção falsa com latência bloqueante, como uma ida e volta ao MongoDB"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def _call(self, result=None):
+        time.sleep(self.latency)
+        return result
+
+    def find_one(self, *args, **kwargs):
+        return self._call({'ia_analysis': 'Perfil simulado'})
+
+    def update_one(self, *args, **kwargs):
+        return self._call()
+
+    def insert_one(self, *args, **kwargs):
+        return self._call()
+
+class MemoryJobs:
+    """Coleção de jobs em memória com as operações usadas pela fila"""
+
+    def __init__(self):
+        self.docs: Dict[str, dict] = {}
+
+    def insert_one(self, doc):
+        self.docs[doc['_id']] = dict(doc)
+
+    def find_one_and_update(self, query, update, **kwargs):
+        for doc in self.docs.values():
+            if doc['status'] == 'queued':
+                doc.update(update['$set'])
+                doc['attempts'] += 1
+                return dict(doc)
+        return None
+
+    def update_one(self, query, update, **kwargs):
+        doc = self.docs.get(query['_id'])
+        if doc is not None:
+            doc.update(update['$set'])
+        return SimpleNamespace(modified_count=1 if doc is not None else 0)
+
+class PersistenceCollection(BlockingCollection):
+    """Coleções da persistência: vazias, com a mesma latência bloqueante"""
+
+    def find_one(self, *args, **kwargs):
+        return self._call()
+
+    def find(self, *args, **kwargs):
+        return self._call([])
+
+    def bulk_write(self, *args, **kwargs):
+        return self._call()
+
+def user_payload(user_id: int) -> Dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'Usuário {user_id}'}
+
+def message_update(bot, update_id: int, user_id: int, text: str) -> Update:
+    payload = {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': user_id, 'type': 'private'}, 'from': user_payload(user_id)
+        }
+    }
+    if text.startswith('/'):
+        payload['message']['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return Update.de_json(payload, bot)
+
+def callback_update(bot, update_id: int, user_id: int, data: str) -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'chat_instance': str(user_id), 'data': data, 'from': user_payload(user_id),
+            'message': {
+                'message_id': update_id, 'date': int(time.time()), 'text': 'menu',
+                'chat': {'id': user_id, 'type': 'private'}, 'from': BOT_USER
+            }
+        }
+    }, bot)
+
+async def scenario(coach_users: int, direito_users: int, ai_latency: float, coach_latency: float,
+                   db_latency: float, workers: int, job_workers: int) -> Dict[str, list]:
+    from app.core.database import mongo_db
+    from app.core.jobs import job_queue
+    from app.core.persistence import MongoPersistence
+    from app.core.sequencer import SequencedUpdateProcessor
+    from app.modules.affiliate_system import affiliate_system
+    from app.modules.ia_services import ai_service
+    from app.modules.juristcoach import coach_conversation
+    from app.modules.legal_assistant import legal_advice
+
+    async def fake_ask(prompt: str, user_context: str = ""):
+        await asyncio.sleep(coach_latency if user_context else ai_latency)
+        return "Simulada", "Resposta simulada"
+
+    async def no_conversion(*args, **kwargs):
+        return True
+
+    collection = BlockingCollection(db_latency)
+    jobs = MemoryJobs()
+    persistence = PersistenceCollection(db_latency)
+    mongo_db.get_collection = lambda name: (
+        jobs if name == 'jobs' else persistence if name.startswith('ptb_') else collection
+    )
+    ai_service.ask = fake_ask
+    job_queue.workers = job_workers
+    affiliate_system.record_conversion = no_conversion
+
+    request = RecordingRequest()
+    application = (
+        Application.builder()
+        .token('1:bench')
+        .request(request)
+        .get_updates_request(OfflineRequest())
+        .updater(None)
+        .concurrent_updates(SequencedUpdateProcessor(workers))
+        .persistence(MongoPersistence())
+        .build()
+    )
+    application.add_handler(coach_conversation)
+    application.add_handler(CommandHandler('direito', legal_advice))
+
+    bot = application.bot
+    update_id = 0
+    direito_started: Dict[int, float] = {}
+    coach_started: Dict[int, float] = {}
+
+    async with application:
+        await application.start()
+        await job_queue.start(application)
+
+        for i in range(coach_users):
+            user_id = 10000 + i
+            coach_started[user_id] = time.perf_counter()
+            for build, payload in ((message_update, '/juristcoach'), (callback_update, 'coach_analysis'),
+                                   (message_update, 'Sou advogada há 3 anos e quero prestar concurso.')):
+                update_id += 1
+                await application.update_queue.put(build(bot, update_id, user_id, payload))
+
+        for i in range(direito_users):
+            user_id = 20000 + i
+            update_id += 1
+            direito_started[user_id] = time.perf_counter()
+            await application.update_queue.put(message_update(bot, update_id, user_id, '/direito Qual o prazo prescricional?'))
+
+        # Aguardar a resposta final de todos
+        def finished(chat_id: int, marker: str) -> bool:
+            return any(marker in text for _, text in request.sent.get(chat_id, []))
+
+        deadline = time.perf_counter() + 120
+        while time.perf_counter() < deadline:
+            if all(finished(u, 'Resposta simulada') for u in direito_started) and \
+               all(finished(u, 'Qual o próximo passo') for u in coach_started):
+                break
+            await asyncio.sleep(0.01)
+        await job_queue.stop(application)
+        await application.stop()
+
+    def latency(started: Dict[int, float], marker: str) -> list:
+        return [
+            next(at for at, text in request.sent[chat_id] if marker in text) - began
+            for chat_id, began in started.items() if finished(chat_id, marker)
+        ]
+
+    return {
+        'direito': latency(direito_started, 'Resposta simulada'),
+        'coach': latency(coach_started, 'Qual o próximo passo')
+    }
+
+def summary(samples: list) -> str:
+    if not samples:
+        return "sem amostras"
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"p50 {statistics.median(ordered) * 1000:7.1f} ms | p95 {p95 * 1000:7.1f} ms | n={len(ordered)}"
+
+async def main(args):
+    print(f"IA /direito ~{args.ai_latency * 1000:.0f} ms, IA coach ~{args.coach_latency * 1000:.0f} ms, "
+          f"MongoDB ~{args.db_latency * 1000:.0f} ms (bloqueante), {args.workers} workers, "
+          f"{args.job_workers} workers de jobs\n")
+
+    alone = await scenario(0, args.direito_users, args.ai_latency, args.coach_latency, args.db_latency,
+                           args.workers, args.job_workers)
+    print(f"/direito sem coach:         {summary(alone['direito'])}")
+
+    loaded = await scenario(args.coach_users, args.direito_users, args.ai_latency, args.coach_latency,
+                            args.db_latency, args.workers, args.job_workers)
+    print(f"/direito com {args.coach_users:>3} sessões coach: {summary(loaded['direito'])}")
+    print(f"sessões coach (completas):  {summary(loaded['coach'])}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--coach-users', type=int, default=50)
+    parser.add_argument('--direito-users', type=int, default=50)
+    parser.add_argument('--ai-latency', type=float, default=0.3)
+    parser.add_argument('--coach-latency', type=float, default=2.0)
+    parser.add_argument('--db-latency', type=float, default=0.005)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--job-workers', type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
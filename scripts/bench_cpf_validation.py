@@ -0,0 +1,57 @@
+"""Benchmark de throughput: validação de CPF escalar x em lote com NumPy.
+
+Gera CPFs aleatórios (metade formatada, parte válida) e compara
+ProcessConsultation.validate_cpf com app.modules.cpf.validate_cpfs,
+conferindo que as duas implementações concordam.
+
+    python scripts/bench_cpf_validation.py --count 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def random_cpfs(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    values = []
+    for i in range(count):
+        base = [rng.randrange(10) for _ in range(9)]
+        for weights_start in (10, 11):
+            total = sum(d * w for d, w in zip(base, range(weights_start, 1, -1)))
+            base.append(total * 10 % 11 % 10)
+        # Um terço com dígito verificador trocado
+        if i % 3 == 0:
+            base[10] = (base[10] + 1) % 10
+        digits = ''.join(map(str, base))
+        values.append(f"{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}" if i % 2 else digits)
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200000)
+    args = parser.parse_args()
+
+    from app.modules.cpf import validate_cpfs
+    from app.modules.process_consultation import process_consultation
+
+    values = random_cpfs(args.count)
+
+    started = time.perf_counter()
+    scalar = [process_consultation.validate_cpf(value) for value in values]
+    scalar_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    valid, normalized = validate_cpfs(values)
+    batch_elapsed = time.perf_counter() - started
+
+    assert valid.tolist() == scalar, "implementações divergem"
+    print(f"CPFs: {args.count} | válidos: {int(valid.sum())}")
+    for label, elapsed in (('escalar', scalar_elapsed), ('numpy', batch_elapsed)):
+        print(f"{label:>8}: {elapsed:7.3f} s | {args.count / elapsed:12,.0f} CPF/s")
+    print(f"Ganho: {scalar_elapsed / batch_elapsed:.1f}x")
+
+if __name__ == '__main__':
+    main()
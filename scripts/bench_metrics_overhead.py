@@ -0,0 +1,106 @@
+"""Custo da instrumentação de métricas por update.
+
+Mede, com callbacks que não fazem nada (só o custo fixo aparece):
+
+- chamada direta x chamada pelo wrapper do MetricsRegistry.instrument;
+- Application.process_update com um CommandHandler sem e com instrumentação
+  (o caminho completo de um comando, sem rede: API do Telegram simulada);
+- o listener de comandos do MongoDB (started + succeeded), que roda nas
+  threads do pymongo e por isso usa trava;
+- a exposição de /metrics com todas as séries preenchidas.
+
+    python scripts/bench_metrics_overhead.py --rounds 50000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+
+from telegram import Chat, Message, MessageEntity, Update, User
+from telegram.ext import Application, CommandHandler
+
+from bench_update_concurrency import OfflineRequest
+
+async def noop(update, context):
+    pass
+
+def command_update(update_id: int) -> Update:
+    user = User(update_id % 100 + 1, 'Usuário', False)
+    message = Message(update_id, datetime.now(), Chat(user.id, Chat.PRIVATE), from_user=user, text='/direito',
+                      entities=[MessageEntity(MessageEntity.BOT_COMMAND, 0, 8)])
+    return Update(update_id, message=message)
+
+async def per_call(callback, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await callback(None, None)
+    return (time.perf_counter() - started) / rounds
+
+async def per_update(callback, rounds: int) -> float:
+    application = Application.builder().token('1:bench').request(OfflineRequest()).updater(None).build()
+    application.add_handler(CommandHandler('direito', callback))
+    await application.initialize()
+    updates = [command_update(update_id) for update_id in range(1, rounds + 1)]
+    for update in updates:
+        update.message.set_bot(application.bot)
+    started = time.perf_counter()
+    for update in updates:
+        await application.process_update(update)
+    elapsed = time.perf_counter() - started
+    await application.shutdown()
+    return elapsed / rounds
+
+def mongo_listener(rounds: int) -> float:
+    from app.core.metrics import mongo_command_metrics
+
+    started_event = SimpleNamespace(command_name='find', command={'find': 'users'}, connection_id=('127.0.0.1', 27017), request_id=0)
+    finished_event = SimpleNamespace(command_name='find', connection_id=('127.0.0.1', 27017), request_id=0, duration_micros=850)
+    started = time.perf_counter()
+    for request_id in range(rounds):
+        started_event.request_id = finished_event.request_id = request_id
+        mongo_command_metrics.started(started_event)
+        mongo_command_metrics.succeeded(finished_event)
+    return (time.perf_counter() - started) / rounds
+
+async def main(args: argparse.Namespace):
+    from app.core.metrics import metrics
+
+    instrumented = metrics.instrument(noop, '/direito', 'command')
+    # Mediana de algumas repetições: o primeiro lote paga aquecimento do interpretador
+    raw_call = statistics.median([await per_call(noop, args.rounds) for _ in range(5)])
+    wrapped_call = statistics.median([await per_call(instrumented, args.rounds) for _ in range(5)])
+    print(f"chamada do callback: {raw_call * 1e6:.2f} µs direto | {wrapped_call * 1e6:.2f} µs instrumentado | "
+          f"custo {(wrapped_call - raw_call) * 1e6:.2f} µs")
+
+    # Rodadas alternadas: o ruído entre execuções é maior que o custo medido
+    updates, raw_runs, wrapped_runs = args.rounds // 5, [], []
+    for _ in range(5):
+        raw_runs.append(await per_update(noop, updates))
+        wrapped_runs.append(await per_update(metrics.instrument(noop, '/direito', 'command'), updates))
+    raw_update, wrapped_update = statistics.median(raw_runs), statistics.median(wrapped_runs)
+    overhead = wrapped_update - raw_update
+    print(f"process_update: {raw_update * 1e6:.1f} µs sem métricas | {wrapped_update * 1e6:.1f} µs com métricas | "
+          f"custo {overhead * 1e6:.2f} µs por update ({overhead / raw_update * 100:.1f}%)")
+
+    listener = mongo_listener(args.rounds)
+    print(f"listener do MongoDB: {listener * 1e6:.2f} µs por comando (started + succeeded)")
+
+    started = time.perf_counter()
+    body = metrics.render()
+    print(f"/metrics: {(time.perf_counter() - started) * 1000:.2f} ms para {body.count(chr(10))} linhas")
+
+    limit = args.max_overhead_us
+    print(f"custo por update {'dentro' if overhead * 1e6 <= limit else 'ACIMA'} do limite de {limit:.0f} µs")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=50000)
+    parser.add_argument('--max-overhead-us', type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,138 @@
+"""Tempo de inicialização: módulos importados no boot x carregados sob demanda pelo manifesto.
+
+Cada medição roda em um processo novo (imports frios), monta a Application
+como o main.py (persistência, manifesto, hooks de inicialização; API do
+Telegram simulada, sem rede) e mede:
+
+- boot: do início do processo até a Application pronta para receber updates,
+  descontada a tentativa de conexão ao MongoDB (igual nos dois modos; as
+  coleções ficam indisponíveis, como com o banco fora do ar);
+- 1º update: o comando (--command) logo após o boot; no modo sob demanda
+  inclui o import do módulo que o atende;
+- 2º update: o mesmo comando de novo, já com o módulo carregado;
+- aquecimento: até os módulos `warm` do manifesto terminarem de carregar em segundo plano.
+
+    python scripts/bench_startup.py --runs 5 --command analisar
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1:startup')
+# Chaves fictícias, como em produção: os SDKs de IA são importados ao configurar o serviço
+os.environ.setdefault('GEMINI_API_KEY', 'bench')
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+
+def command_update(update_id: int, command: str) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': f'/{command}',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command) + 1}],
+            'chat': {'id': 4242, 'type': 'private'},
+            'from': {'id': 4242, 'is_bot': False, 'first_name': 'Usuário'}
+        }
+    }
+
+async def child(lazy: bool, command: str) -> dict:
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from telegram import Update
+    from telegram.ext import Application
+    from bench_coach_load import RecordingRequest
+
+    db_started = time.perf_counter()
+    from app.core.database import mongo_db
+    db_elapsed = time.perf_counter() - db_started
+    # Sem MongoDB: coleções indisponíveis em vez de esperar o timeout de seleção de servidor a cada chamada
+    mongo_db.get_collection = lambda name: None
+
+    from app.core import jobs, broadcast
+    from app.core.config import Config
+    from app.core.persistence import MongoPersistence
+    from app.core.registry import module_registry
+    from app.modules.manifest import MODULES
+
+    request = RecordingRequest()
+    application = (
+        Application.builder().token(Config.TELEGRAM_BOT_TOKEN)
+        .request(request).get_updates_request(RecordingRequest()).updater(None)
+        .persistence(MongoPersistence())
+        .post_init(module_registry.run_startup_hooks)
+        .post_shutdown(module_registry.run_shutdown_hooks)
+        .build()
+    )
+    module_registry.load_manifest(MODULES)
+    module_registry.install(application, lazy=lazy)
+    await application.initialize()
+    await application.post_init(application)
+    boot = time.perf_counter() - STARTED - db_elapsed
+    modules_at_boot = len(module_registry.get_loaded_modules())
+
+    latencies = []
+    for update_id in (1, 2):
+        update = Update.de_json(command_update(update_id, command), application.bot)
+        started = time.perf_counter()
+        await application.process_update(update)
+        latencies.append(time.perf_counter() - started)
+    replies = len(request.sent.get(4242, []))
+
+    warm = 0.0
+    if module_registry.warm_task is not None:
+        await module_registry.warm_task
+        warm = time.perf_counter() - STARTED - db_elapsed
+
+    await application.post_shutdown(application)
+    await application.shutdown()
+    return {
+        'boot': boot, 'first': latencies[0], 'second': latencies[1], 'warm': warm, 'replies': replies,
+        'modules_at_boot': modules_at_boot, 'modules': len(module_registry.get_loaded_modules()),
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def measure(mode: str, runs: int, command: str) -> list:
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', mode, '--command', command],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+def report(mode: str, results: list):
+    median = lambda key: statistics.median(result[key] for result in results)
+    last = results[-1]
+    warm = f" | aquecimento {median('warm') * 1000:6.0f} ms" if median('warm') else ""
+    print(f"{mode:>10}: boot {median('boot') * 1000:6.0f} ms | 1º update {median('first') * 1000:6.1f} ms | "
+          f"2º update {median('second') * 1000:5.1f} ms{warm} | módulos no boot {last['modules_at_boot']}/{last['modules']} | "
+          f"RSS {median('rss_mb'):.0f} MB | respostas {last['replies']}/2")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--command', default='analisar', help='comando enviado após o boot')
+    parser.add_argument('--child', choices=['eager', 'lazy'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args.child == 'lazy', args.command))))
+        sys.exit(0)
+
+    print(f"mediana de {args.runs} processos por modo, comando /{args.command}")
+    eager, lazy = measure('eager', args.runs, args.command), measure('lazy', args.runs, args.command)
+    report('no boot', eager)
+    report('sob demanda', lazy)
+    print(f"boot {statistics.median(r['boot'] for r in eager) / statistics.median(r['boot'] for r in lazy):.1f}x mais rápido")
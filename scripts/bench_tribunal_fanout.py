@@ -0,0 +1,58 @@
+"""Benchmark de latência: consulta sequencial x fan-out concorrente nos tribunais.
+
+Sobe o servidor mock local com latência simulada e mede ponta a ponta,
+passando pelo cliente HTTP compartilhado, limitadores e conectores reais.
+
+    python scripts/bench_tribunal_fanout.py --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_tribunal_server import make_server, parse_latency
+
+async def run(rounds: int):
+    from app.modules.tribunal_connectors import tribunal_connectors, close_http_client
+
+    cpf = '12345678900'
+    sequential, concurrent = [], []
+
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for connector in tribunal_connectors.connectors.values():
+            await connector.search_by_cpf(cpf)
+        sequential.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        processes, failed = await tribunal_connectors.search_by_cpf(cpf)
+        concurrent.append(time.perf_counter() - started)
+
+    await close_http_client()
+    print(f"Processos encontrados: {len(processes)} | falhas: {failed}")
+    for label, samples in (('sequencial', sequential), ('fan-out', concurrent)):
+        print(f"{label:>10}: média {statistics.mean(samples) * 1000:7.1f} ms | "
+              f"p50 {statistics.median(samples) * 1000:7.1f} ms | máx {max(samples) * 1000:7.1f} ms")
+    print(f"Ganho: {statistics.mean(sequential) / statistics.mean(concurrent):.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', default='tjsp=0.4,tjmg=0.6,tjrs=0.3')
+    args = parser.parse_args()
+
+    server = make_server(port=args.port, latency=parse_latency(args.latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ['TRIBUNAL_API_MODE'] = 'http'
+    for tribunal in ('tjsp', 'tjmg', 'tjrs'):
+        os.environ[f'{tribunal.upper()}_API_URL'] = f'http://127.0.0.1:{args.port}/{tribunal}/processos'
+
+    asyncio.run(run(args.rounds))
+    server.shutdown()
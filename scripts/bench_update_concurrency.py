@@ -0,0 +1,112 @@
+"""Teste de carga: processamento de updates sequencial x concorrente com ordem por chat.
+
+Monta uma Application real do python-telegram-bot (sem rede: a API do Telegram
+é simulada por um BaseRequest local), enfileira mensagens de vários usuários
+em update_queue e mede o tempo até todas serem tratadas por um handler que
+simula uma chamada lenta de IA. Também confere se a ordem das mensagens de
+cada usuário foi preservada.
+
+    python scripts/bench_update_concurrency.py --users 50 --messages 5 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, MessageHandler, SimpleUpdateProcessor, filters
+from telegram.request import BaseRequest, RequestData
+
+from app.core.sequencer import SequencedUpdateProcessor
+
+class OfflineRequest(BaseRequest):
+    """Responde localmente às chamadas da Bot API (apenas getMe é necessário)"""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        result = {'id': 1, 'is_bot': True, 'first_name': 'JuristBot', 'username': 'juristbot_bench'}
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+def make_updates(users: int, messages: int):
+    updates = []
+    update_id = 0
+    for sequence in range(messages):
+        for user_id in range(1, users + 1):
+            update_id += 1
+            user = User(user_id, f'Usuário {user_id}', False)
+            chat = Chat(user_id, Chat.PRIVATE)
+            message = Message(update_id, datetime.now(), chat, from_user=user, text=f'{sequence}')
+            updates.append(Update(update_id, message=message))
+    return updates
+
+async def run(label: str, processor, users: int, messages: int, latency: float) -> None:
+    application = (
+        Application.builder()
+        .token('1:bench')
+        .request(OfflineRequest())
+        .get_updates_request(OfflineRequest())
+        .updater(None)
+        .concurrent_updates(processor)
+        .build()
+    )
+    total = users * messages
+    seen = {}
+    processed = 0
+    out_of_order = 0
+    finished = asyncio.Event()
+
+    async def slow_handler(update: Update, context):
+        nonlocal processed, out_of_order
+        # Latência variável, como uma chamada de IA
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        user_id = update.effective_user.id
+        sequence = int(update.message.text)
+        if sequence != seen.get(user_id, -1) + 1:
+            out_of_order += 1
+        seen[user_id] = max(sequence, seen.get(user_id, -1))
+        processed += 1
+        if processed == total:
+            finished.set()
+
+    application.add_handler(MessageHandler(filters.TEXT, slow_handler))
+
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        for update in make_updates(users, messages):
+            await application.update_queue.put(update)
+        await finished.wait()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    print(f"{label:>28}: {elapsed:7.2f} s | {total / elapsed:8.1f} updates/s | fora de ordem: {out_of_order}")
+
+async def main(args):
+    print(f"{args.users} usuários x {args.messages} mensagens, latência ~{args.latency * 1000:.0f} ms por update\n")
+    await run('sequencial (padrão)', SimpleUpdateProcessor(1), args.users, args.messages, args.latency)
+    await run(f'concorrente sem ordem ({args.workers})', SimpleUpdateProcessor(args.workers),
+              args.users, args.messages, args.latency)
+    await run(f'concorrente por chat ({args.workers})', SequencedUpdateProcessor(args.workers),
+              args.users, args.messages, args.latency)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,61 @@
+"""Conferir o manifesto (app/modules/manifest.py) com o que os módulos registram de fato.
+
+Importa todos os módulos de app/modules e compara comandos (com descrição),
+prefixos de rota, grupos dos handlers de mensagem e tipos de job com o
+manifesto. Sai com código 1 se houver divergência; rode no build/CI, já que
+com LAZY_MODULES o bot só importa cada módulo no primeiro update.
+
+    python scripts/check_manifest.py
+"""
+import importlib
+import logging
+import os
+import pkgutil
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1:manifest')
+
+def main() -> int:
+    logging.disable(logging.CRITICAL)
+
+    from app.core.database import mongo_db
+    # Sem MongoDB: só os registros dos módulos importam aqui
+    mongo_db.get_collection = lambda name: None
+
+    import app.modules
+    from app.core.jobs import job_queue
+    from app.core.registry import module_registry
+    from app.modules.manifest import MODULES
+
+    # Tipos de job por módulo: a fila não passa pelo registro
+    jobs = defaultdict(list)
+    register_job = job_queue.register
+    def recording_register(kind, handler):
+        jobs[sys._getframe(1).f_globals['__name__'].rsplit('.', 1)[-1]].append(kind)
+        return register_job(kind, handler)
+    job_queue.register = recording_register
+
+    module_registry.load_manifest(MODULES)
+    for info in pkgutil.iter_modules(app.modules.__path__):
+        if info.name != 'manifest':
+            importlib.import_module(f"app.modules.{info.name}")
+
+    problems = []
+    for module_name in sorted(module_registry.get_loaded_modules()):
+        problems.extend(module_registry.manifest_drift(module_name, jobs.get(module_name, [])))
+    for module_name in sorted(set(module_registry.manifest) - module_registry.get_loaded_modules()):
+        problems.append(f"{module_name}: declarado no manifesto e não registrado por nenhum módulo")
+
+    if problems:
+        print("❌ Manifesto desatualizado:")
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+    print(f"✅ Manifesto em dia ({len(module_registry.get_loaded_modules())} módulos)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Servidor local que fala o protocolo do Redis (RESP2), para testar o cache sem um Redis real.
+
+Uso:
+    python scripts/mock_redis_server.py --port 6390 --password segredo
+
+Depois aponte o bot para ele:
+    CACHE_BACKEND=redis
+    REDIS_URL=redis://:segredo@127.0.0.1:6390/0
+
+Suporta apenas o que o RedisBackend usa: PING, AUTH, SELECT, GET, SET (EX/PX),
+DEL, INCR, EXPIRE e FLUSHDB. Os bancos selecionados por SELECT são independentes.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+class MockRedis:
+    def __init__(self, password: Optional[str] = None, latency: float = 0.0):
+        self.password = password
+        self.latency = latency
+        # banco -> chave -> (valor, expira_em monotônico ou None)
+        self.databases: Dict[int, Dict[bytes, Tuple[bytes, Optional[float]]]] = {}
+        self.commands = 0
+
+    def _lookup(self, data: Dict, key: bytes) -> Optional[bytes]:
+        entry = data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _bulk(value: Optional[bytes]) -> bytes:
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def execute(self, session: Dict, args: list) -> bytes:
+        self.commands += 1
+        command = args[0].upper()
+        if command == b'AUTH':
+            if self.password is not None and args[-1].decode() == self.password:
+                session['authenticated'] = True
+                return b'+OK\r\n'
+            return b'-WRONGPASS invalid password\r\n'
+        if not session['authenticated']:
+            return b'-NOAUTH Authentication required.\r\n'
+        if command == b'PING':
+            return b'+PONG\r\n'
+        if command == b'SELECT':
+            session['db'] = int(args[1])
+            return b'+OK\r\n'
+
+        data = self.databases.setdefault(session['db'], {})
+        if command == b'GET':
+            return self._bulk(self._lookup(data, args[1]))
+        if command == b'SET':
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            if b'EX' in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b'EX') + 1])
+            elif b'PX' in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b'PX') + 1]) / 1000
+            data[args[1]] = (args[2], expires_at)
+            return b'+OK\r\n'
+        if command == b'DEL':
+            removed = 0
+            for key in args[1:]:
+                if self._lookup(data, key) is not None:
+                    del data[key]
+                    removed += 1
+            return b':%d\r\n' % removed
+        if command == b'INCR':
+            current = self._lookup(data, args[1])
+            try:
+                value = int(current or 0) + 1
+            except ValueError:
+                return b'-ERR value is not an integer or out of range\r\n'
+            expires_at = data[args[1]][1] if current is not None else None
+            data[args[1]] = (str(value).encode(), expires_at)
+            return b':%d\r\n' % value
+        if command == b'EXPIRE':
+            current = self._lookup(data, args[1])
+            if current is None:
+                return b':0\r\n'
+            data[args[1]] = (current, time.monotonic() + int(args[2]))
+            return b':1\r\n'
+        if command == b'FLUSHDB':
+            data.clear()
+            return b'+OK\r\n'
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = {'authenticated': self.password is None, 'db': 0}
+        try:
+            while True:
+                header = await reader.readuntil(b'\r\n')
+                if not header.startswith(b'*'):
+                    writer.write(b'-ERR protocol error\r\n')
+                    break
+                args = []
+                for _ in range(int(header[1:-2])):
+                    length = int((await reader.readuntil(b'\r\n'))[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(self.execute(session, args))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+async def make_server(host: str = '127.0.0.1', port: int = 0, password: Optional[str] = None,
+                      latency: float = 0.0) -> Tuple[asyncio.AbstractServer, MockRedis]:
+    mock = MockRedis(password, latency)
+    server = await asyncio.start_server(mock.handle, host, port)
+    return server, mock
+
+async def main(args: argparse.Namespace):
+    server, _ = await make_server(args.host, args.port, args.password, args.latency)
+    print(f"🧱 Servidor mock do Redis em redis://{args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor mock do protocolo Redis')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    parser.add_argument('--password')
+    parser.add_argument('--latency', type=float, default=0.0, help='atraso simulado por comando, em segundos')
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,67 @@
+"""Servidor local que simula as APIs dos tribunais (substituto dos antigos mocks).
+
+Uso:
+    python scripts/mock_tribunal_server.py --port 8088 --latency tjsp=0.4,tjmg=0.6,tjrs=0.3
+
+Depois aponte o bot para ele:
+    TRIBUNAL_API_MODE=http
+    TJSP_API_URL=http://127.0.0.1:8088/tjsp/processos
+    TJMG_API_URL=http://127.0.0.1:8088/tjmg/processos
+    TJRS_API_URL=http://127.0.0.1:8088/tjrs/processos
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.modules.tribunal_mock import handle_request
+
+def parse_latency(value: str) -> dict:
+    latency = {}
+    for item in filter(None, value.split(',')):
+        tribunal, seconds = item.split('=')
+        latency[tribunal.strip()] = float(seconds)
+    return latency
+
+def make_server(host: str = '127.0.0.1', port: int = 8088, latency: dict = None) -> ThreadingHTTPServer:
+    latency = latency or {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            tribunal = url.path.strip('/').split('/')[0]
+            time.sleep(latency.get(tribunal, 0))
+            status, payload = handle_request(url.path, url.query)
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor mock das APIs dos tribunais')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8088)
+    parser.add_argument('--latency', default='tjsp=0.4,tjmg=0.6,tjrs=0.3',
+                        help='latência simulada por tribunal, em segundos')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, parse_latency(args.latency))
+    print(f"🏛️ Servidor mock dos tribunais em http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
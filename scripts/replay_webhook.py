@@ -0,0 +1,159 @@
+"""Replay de webhook: entregas duplicadas e concorrentes entre vários workers.
+
+Sobe N WebhookServer no mesmo processo, cada um com sua Application e seu
+socket (como os workers do WEB_CONCURRENCY), compartilhando uma coleção
+`processed_updates` em memória com a mesma semântica de _id único do MongoDB.
+Cada update é entregue várias vezes, em paralelo e em workers diferentes, como
+nas reentregas do Telegram. Confere se cada update_id foi tratado exatamente
+uma vez e mede a vazão de entregas.
+
+    python scripts/replay_webhook.py --workers 4 --updates 2000 --copies 3
+
+Com --url, dispara as mesmas entregas contra um deploy já em execução (por
+exemplo WEB_CONCURRENCY=4 com MongoDB real) e mede apenas a vazão.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+
+import tornado.httpserver
+import tornado.netutil
+from tornado.httpclient import AsyncHTTPClient
+from pymongo.errors import DuplicateKeyError
+from telegram.ext import Application, MessageHandler, filters
+
+from bench_update_concurrency import OfflineRequest
+
+SECRET = 'replay_secret'
+URL_PATH = 'webhook'
+
+class SharedUpdates:
+    """processed_updates em memória: insert_one falha com _id repetido, como no MongoDB"""
+
+    def __init__(self):
+        self.ids = set()
+        self.lock = threading.Lock()
+
+    def insert_one(self, document):
+        with self.lock:
+            if document['_id'] in self.ids:
+                raise DuplicateKeyError('duplicate key')
+            self.ids.add(document['_id'])
+
+def payload(update_id: int) -> dict:
+    user_id = 1000 + update_id % 200
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': f'mensagem {update_id}',
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'Usuário {user_id}'}
+        }
+    }
+
+def deliveries(updates: int, copies: int, workers: int) -> List[tuple]:
+    """(update_id, worker) embaralhados: cópias do mesmo update caem em workers diferentes"""
+    plan = [(update_id, (update_id + copy) % workers) for update_id in range(1, updates + 1) for copy in range(copies)]
+    random.shuffle(plan)
+    return plan
+
+async def blast(urls: List[str], plan: List[tuple], concurrency: int) -> float:
+    # Cliente do próprio tornado: o pool do httpx vira o gargalo com centenas de conexões
+    client = AsyncHTTPClient(max_clients=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET, 'Content-Type': 'application/json'}
+
+    async def deliver(update_id: int, worker: int):
+        async with semaphore:
+            await client.fetch(urls[worker % len(urls)], method='POST', headers=headers,
+                               body=json.dumps(payload(update_id)), request_timeout=30)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(deliver(update_id, worker) for update_id, worker in plan))
+    return time.perf_counter() - started
+
+async def local_replay(args):
+    from app.core.database import mongo_db
+    from app.core.webhook import WebhookServer
+
+    shared = SharedUpdates()
+    mongo_db.get_collection = lambda name: shared if name == 'processed_updates' else None
+
+    handled = Counter()
+    servers, http_servers, urls = [], [], []
+
+    async def handler(update, context):
+        handled[update.update_id] += 1
+
+    for worker in range(args.workers):
+        application = (
+            Application.builder().token('1:replay')
+            .request(OfflineRequest()).get_updates_request(OfflineRequest())
+            .updater(None).concurrent_updates(64).build()
+        )
+        application.add_handler(MessageHandler(filters.TEXT, handler))
+        server = WebhookServer(application, URL_PATH, SECRET)
+        sockets = tornado.netutil.bind_sockets(0, address='127.0.0.1')
+        http_server = tornado.httpserver.HTTPServer(server.make_app())
+        http_server.add_sockets(sockets)
+        await application.initialize()
+        await application.start()
+        servers.append(server)
+        http_servers.append(http_server)
+        urls.append(f"http://127.0.0.1:{sockets[0].getsockname()[1]}/{URL_PATH}")
+
+    plan = deliveries(args.updates, args.copies, args.workers)
+    elapsed = await blast(urls, plan, args.concurrency)
+
+    # Aguardar a fila de cada Application esvaziar
+    deadline = time.perf_counter() + 30
+    while len(handled) < args.updates and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    for server, http_server in zip(servers, http_servers):
+        http_server.stop()
+        await server.application.stop()
+        await server.application.shutdown()
+
+    twice = sum(1 for count in handled.values() if count > 1)
+    missing = args.updates - len(handled)
+    per_worker = [server.stats['accepted'] for server in servers]
+    duplicates = sum(server.stats['duplicates'] for server in servers)
+    print(f"{len(plan)} entregas ({args.copies}x {args.updates} updates) em {args.workers} workers: "
+          f"{elapsed:.2f} s | {len(plan) / elapsed:.0f} entregas/s")
+    print(f"aceitos por worker: {per_worker} | duplicados descartados: {duplicates}")
+    print(f"tratados mais de uma vez: {twice} | não tratados: {missing} -> "
+          f"{'OK, exatamente uma vez' if not twice and not missing else 'FALHA'}")
+
+async def remote_replay(args):
+    plan = deliveries(args.updates, args.copies, 1)
+    elapsed = await blast([args.url], plan, args.concurrency)
+    print(f"{len(plan)} entregas em {elapsed:.2f} s | {len(plan) / elapsed:.0f} entregas/s")
+
+async def main(args: argparse.Namespace):
+    if args.url:
+        await remote_replay(args)
+    else:
+        await local_replay(args)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--copies', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--url', help="URL completa do webhook de um deploy em execução (usa --secret)")
+    parser.add_argument('--secret', default=SECRET)
+    parsed = parser.parse_args()
+    SECRET = parsed.secret
+    asyncio.run(main(parsed))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Sem MongoDB nos testes: a conexão falha rápido e as coleções usadas são substituídas por fakes
+os.environ.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1/')
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1:tests')
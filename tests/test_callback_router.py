@@ -0,0 +1,72 @@
+import pytest
+from telegram import CallbackQuery, Update, User
+from app.core.registry import CALLBACK_DATA_LIMIT, CallbackRouter
+
+def callback_update(data: str) -> Update:
+    query = CallbackQuery('1', User(1, 'Usuário', False), chat_instance='chat', data=data)
+    return Update(1, callback_query=query)
+
+def test_pack_encodes_ints_in_base36():
+    assert CallbackRouter.pack('aff', 'page', 35, 36, 0) == 'aff:page:z:10:0'
+    assert CallbackRouter.pack('aff', 'page', -71) == 'aff:page:-1z'
+    assert CallbackRouter.pack('scan', 'p', 'abc') == 'scan:p:abc'
+
+@pytest.mark.parametrize('number', [0, 1, 35, 36, 123456789, 2 ** 53, -1, -987654321])
+def test_pack_unpack_roundtrip(number):
+    data = CallbackRouter.pack('x', 'y', number)
+    assert CallbackRouter.unpack_int(data.split(':')[2]) == number
+
+def test_pack_rejects_separator_and_oversized_data():
+    with pytest.raises(ValueError):
+        CallbackRouter.pack('x', 'y', 'a:b')
+    with pytest.raises(ValueError):
+        CallbackRouter.pack('x', 'y', 'a' * CALLBACK_DATA_LIMIT)
+
+def test_add_rejects_separator():
+    with pytest.raises(ValueError):
+        CallbackRouter().add('a:b', 'c', lambda update, context: None)
+
+def test_resolve_exact_wildcard_and_legacy():
+    router = CallbackRouter()
+    exact, wildcard = object(), object()
+    router.add('aff', 'link', exact)
+    router.add('aff', '*', wildcard)
+    router.legacy['generate_link'] = 'aff:link'
+
+    assert router.resolve('aff:link') == ('aff', 'link', exact, [])
+    assert router.resolve('aff:page:1:z') == ('aff', 'page', wildcard, ['1', 'z'])
+    assert router.resolve('generate_link') == ('aff', 'link', exact, [])
+    assert router.resolve('unknown:link') is None
+
+def test_remove_only_matching_callback():
+    router = CallbackRouter()
+    first, second = object(), object()
+    router.add('aff', 'link', first)
+    router.remove('aff', 'link', second)
+    assert router.resolve('aff:link') is not None
+    router.remove('aff', 'link', first)
+    assert router.resolve('aff:link') is None
+    assert 'aff' not in router.routes
+
+def test_global_handler_skips_scoped_prefix_unless_fallback():
+    router = CallbackRouter()
+    route, fallback = object(), object()
+    router.add('coach', 'menu', route)
+    scoped = router.handler('coach', actions={'menu'})
+    global_handler = router.handler()
+    update = callback_update('coach:menu')
+
+    assert scoped.check_update(update)[2] is route
+    assert global_handler.check_update(update) is None
+
+    router.add_fallback('coach', fallback)
+    assert global_handler.check_update(update)[2] is fallback
+    assert scoped.check_update(update)[2] is route
+
+def test_scoped_handler_filters_actions():
+    router = CallbackRouter()
+    router.add('coach', 'menu', object())
+    router.add('coach', 'cancel', object())
+    handler = router.handler('coach', actions={'cancel'})
+    assert handler.check_update(callback_update('coach:menu')) is None
+    assert handler.check_update(callback_update('coach:cancel')) is not None
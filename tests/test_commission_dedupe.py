@@ -0,0 +1,117 @@
+from datetime import datetime
+import pytest
+from pymongo.errors import BulkWriteError
+from app.core.database import mongo_db
+from app.modules.affiliate_pipeline import APPLIED_EVENTS_KEPT, ConversionPipeline
+from app.modules.commission_ledger import CommissionLedger
+
+class FakeLedger:
+    """insert_many com _id único, como a coleção commission_ledger"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def insert_many(self, docs, ordered=True, session=None):
+        inserted, errors = [], []
+        for index, doc in enumerate(docs):
+            if doc['_id'] in self.docs:
+                errors.append({'index': index, 'code': 11000})
+                continue
+            self.docs[doc['_id']] = doc
+            inserted.append(doc['_id'])
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(inserted)})
+        return type('InsertManyResult', (), {'inserted_ids': inserted})()
+
+class FakeConversionEvents:
+    """find por _id/$in + applied e bulk_write de upserts com $setOnInsert"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query, projection=None, session=None):
+        ids = query['_id']['$in']
+        return [
+            {'_id': doc_id} for doc_id in ids
+            if doc_id in self.docs and self.docs[doc_id].get('applied', True) is not False
+        ]
+
+    def bulk_write(self, ops, ordered=True, session=None):
+        for op in ops:
+            doc_id = op._filter['_id']
+            if doc_id not in self.docs:
+                self.docs[doc_id] = {'_id': doc_id, **op._doc['$setOnInsert']}
+
+def event(event_id: str, user_id: int = 7) -> dict:
+    return {
+        'event_id': event_id, 'user_id': user_id, 'service_type': 'process_consultation',
+        'amount': 35.0, 'commission': 3.5, 'created_at': datetime(2026, 1, 1)
+    }
+
+@pytest.fixture
+def collections(monkeypatch):
+    fakes = {'commission_ledger': FakeLedger(), 'conversion_events': FakeConversionEvents()}
+    monkeypatch.setattr(mongo_db, 'get_collection', lambda name: fakes[name])
+    return fakes
+
+# Ledger
+
+def test_ledger_append_ignores_repeated_entry_ids(collections):
+    ledger = CommissionLedger()
+    entries = [ledger.accrual('JBCODE', 3.5, event('e1')), ledger.accrual('JBCODE', 3.5, event('e2'))]
+    assert ledger.append(entries) == 2
+    assert ledger.append([ledger.accrual('JBCODE', 3.5, event('e1')), ledger.accrual('JBCODE', 3.5, event('e3'))]) == 1
+    assert sorted(collections['commission_ledger'].docs) == ['e1', 'e2', 'e3']
+
+def test_ledger_append_raises_other_write_errors(collections, monkeypatch):
+    def failing(docs, ordered=True, session=None):
+        raise BulkWriteError({'writeErrors': [{'index': 0, 'code': 121}], 'nInserted': 0})
+    monkeypatch.setattr(collections['commission_ledger'], 'insert_many', failing)
+    with pytest.raises(BulkWriteError):
+        CommissionLedger().append([CommissionLedger.entry('JBCODE', 'accrual', entry_id='e1')])
+
+def test_accrual_uses_event_id_and_moves_total_and_pending():
+    entry = CommissionLedger().accrual('JBCODE', 3.5, event('e1'))
+    assert entry['_id'] == 'e1'
+    assert (entry['total'], entry['pending'], entry['paid']) == (3.5, 3.5, 0.0)
+
+# Pipeline
+
+def test_claim_events_skips_applied_events(collections):
+    pipeline = ConversionPipeline()
+    session = object()
+    assert [e['event_id'] for e in pipeline._claim_events([event('e1'), event('e2')], session)] == ['e1', 'e2']
+    # Com transação o registro nasce aplicado: o mesmo evento não é somado de novo
+    assert pipeline._claim_events([event('e1'), event('e3')], session) == [event('e3')]
+
+def test_claim_events_without_transaction_retries_pending_until_marked(collections):
+    pipeline = ConversionPipeline()
+    assert len(pipeline._claim_events([event('e1')], None)) == 1
+    # Lote anterior falhou antes de marcar como aplicado: a nova tentativa reprocessa o evento
+    assert len(pipeline._claim_events([event('e1')], None)) == 1
+    collections['conversion_events'].docs['e1']['applied'] = True
+    assert pipeline._claim_events([event('e1')], None) == []
+
+def test_legacy_event_records_count_as_applied(collections):
+    collections['conversion_events'].docs['old'] = {'_id': 'old'}
+    assert ConversionPipeline()._claim_events([event('old')], None) == []
+
+def test_marked_update_is_conditioned_on_event_marker():
+    query, update = ConversionPipeline._marked('e1', {'affiliate_code': 'JBCODE'}, {'$inc': {'total_commission': 3.5}})
+    assert query == {'affiliate_code': 'JBCODE', 'applied_events': {'$ne': 'e1'}}
+    assert update['$inc'] == {'total_commission': 3.5}
+    assert update['$push'] == {'applied_events': {'$each': ['e1'], '$slice': -APPLIED_EVENTS_KEPT}}
+
+def test_bulk_write_tolerates_duplicate_marker_only_without_transaction():
+    class Collection:
+        def __init__(self, code):
+            self.code = code
+
+        def bulk_write(self, ops, ordered=True, session=None):
+            raise BulkWriteError({'writeErrors': [{'index': 0, 'code': self.code}]})
+
+    ConversionPipeline._bulk_write(Collection(11000), ['op'], None)
+    with pytest.raises(BulkWriteError):
+        ConversionPipeline._bulk_write(Collection(11000), ['op'], object())
+    with pytest.raises(BulkWriteError):
+        ConversionPipeline._bulk_write(Collection(121), ['op'], None)
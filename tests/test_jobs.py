@@ -0,0 +1,23 @@
+from app.core.jobs import split_message
+
+def test_short_message_is_kept_whole():
+    assert split_message('texto curto', limit=50) == ['texto curto']
+    assert split_message('', limit=50) == []
+
+def test_prefers_paragraph_breaks():
+    text = 'a' * 30 + '\n\n' + 'b' * 30
+    assert split_message(text, limit=40) == ['a' * 30, 'b' * 30]
+
+def test_falls_back_to_line_breaks():
+    text = 'a' * 30 + '\n' + 'b' * 30
+    assert split_message(text, limit=40) == ['a' * 30, 'b' * 30]
+
+def test_hard_cut_without_breaks():
+    parts = split_message('x' * 95, limit=40)
+    assert parts == ['x' * 40, 'x' * 40, 'x' * 15]
+
+def test_parts_respect_limit_and_keep_content():
+    text = '\n'.join(f'linha {i} ' + 'y' * (i % 17) for i in range(300))
+    parts = split_message(text, limit=100)
+    assert all(len(part) <= 100 for part in parts)
+    assert ''.join(parts).replace('\n', '') == text.replace('\n', '')
@@ -0,0 +1,69 @@
+import asyncio
+from collections import OrderedDict
+from app.core.persistence import USER_DATA, MongoPersistence, remember
+
+def shared_persistence(stored: dict) -> MongoPersistence:
+    persistence = MongoPersistence(shared=True)
+    persistence._find_data = lambda name, doc_id: dict(stored.get(doc_id) or {})
+    # Sem gravação de fato: só as mudanças pendentes interessam aqui
+    persistence._schedule_flush = lambda delay: None
+    return persistence
+
+def test_clean_data_is_reloaded_from_database():
+    async def main():
+        stored = {1: {'step': 'a'}}
+        persistence = shared_persistence(stored)
+        data = {}
+        await persistence.refresh_user_data(1, data)
+        stored[1] = {'step': 'b'}  # gravado por outro worker
+        await persistence.refresh_user_data(1, data)
+        return data
+
+    assert asyncio.run(main()) == {'step': 'b'}
+
+def test_local_changes_are_not_overwritten_before_delivery():
+    async def main():
+        stored = {1: {'step': 'a'}}
+        persistence = shared_persistence(stored)
+        data = {}
+        await persistence.refresh_user_data(1, data)
+        data['step'] = 'local'  # mudou neste worker; a Application ainda não entregou
+        stored[1] = {'step': 'b'}
+        await persistence.refresh_user_data(1, data)
+        return data
+
+    assert asyncio.run(main()) == {'step': 'local'}
+
+def test_pending_write_is_not_overwritten():
+    async def main():
+        stored = {1: {'step': 'a'}}
+        persistence = shared_persistence(stored)
+        data = {}
+        await persistence.refresh_user_data(1, data)
+        data['step'] = 'local'
+        await persistence.update_user_data(1, dict(data))
+        stored[1] = {'step': 'b'}
+        await persistence.refresh_user_data(1, data)
+        return data, persistence.pending_count()
+
+    data, pending = asyncio.run(main())
+    assert data == {'step': 'local'}
+    assert pending == 1
+
+def test_synced_versions_are_bounded():
+    async def main():
+        persistence = shared_persistence({})
+        persistence.max_tracked = 3
+        for user_id in range(10):
+            await persistence.refresh_user_data(user_id, {})
+        return list(persistence.synced[USER_DATA])
+
+    assert asyncio.run(main()) == [7, 8, 9]
+
+def test_remember_evicts_least_recently_used():
+    cache = OrderedDict()
+    for key in 'abc':
+        remember(cache, key, True, 3)
+    remember(cache, 'a', True, 3)
+    remember(cache, 'd', True, 3)
+    assert list(cache) == ['c', 'a', 'd']
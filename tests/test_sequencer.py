@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from app.core.sequencer import KeyedSequencer
+
+async def step(log: list, name: str, delay: float = 0):
+    log.append(f"{name}:start")
+    await asyncio.sleep(delay)
+    log.append(f"{name}:end")
+    return name
+
+def test_same_key_runs_in_arrival_order():
+    async def main():
+        sequencer, log = KeyedSequencer(10), []
+        results = await asyncio.gather(
+            sequencer.run('a', step(log, 'a1', 0.02)),
+            sequencer.run('a', step(log, 'a2')),
+            sequencer.run('a', step(log, 'a3')),
+        )
+        return results, log, sequencer.pending_keys()
+
+    results, log, pending = asyncio.run(main())
+    assert results == ['a1', 'a2', 'a3']
+    assert log == ['a1:start', 'a1:end', 'a2:start', 'a2:end', 'a3:start', 'a3:end']
+    assert pending == 0
+
+def test_different_keys_run_concurrently():
+    async def main():
+        sequencer, log = KeyedSequencer(10), []
+        await asyncio.gather(sequencer.run('a', step(log, 'a', 0.02)), sequencer.run('b', step(log, 'b')))
+        return log
+
+    assert asyncio.run(main()) == ['a:start', 'b:start', 'b:end', 'a:end']
+
+def test_failure_does_not_block_the_key():
+    async def boom():
+        raise RuntimeError('falhou')
+
+    async def main():
+        sequencer, log = KeyedSequencer(10), []
+        first = sequencer.run('a', boom())
+        second = sequencer.run('a', step(log, 'a2'))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, RuntimeError)
+    assert second == 'a2'
+
+def test_cancelled_waiter_keeps_order_for_the_next():
+    async def main():
+        sequencer, log = KeyedSequencer(10), []
+        first = asyncio.ensure_future(sequencer.run('a', step(log, 'a1', 0.03)))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(sequencer.run('a', step(log, 'a2')))
+        third = asyncio.ensure_future(sequencer.run('a', step(log, 'a3')))
+        await asyncio.sleep(0.01)
+        second.cancel()
+        await asyncio.gather(first, third, return_exceptions=True)
+        return log, second.cancelled(), sequencer.pending_keys()
+
+    log, cancelled, pending = asyncio.run(main())
+    # a3 só começa depois que a1 termina, mesmo com a2 cancelado no meio da fila
+    assert log == ['a1:start', 'a1:end', 'a3:start', 'a3:end']
+    assert cancelled
+    assert pending == 0
+
+def test_rejects_non_positive_concurrency():
+    with pytest.raises(ValueError):
+        KeyedSequencer(0)
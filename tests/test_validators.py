@@ -0,0 +1,79 @@
+from app.modules.affiliate_codes import ALPHABET, AffiliateCodeAllocator
+from app.modules.cnj import check_digits, parse_cnj
+from app.modules.cpf import validate_cpfs
+
+# CNJ
+
+def test_parse_cnj_decomposes_valid_number():
+    cnj = parse_cnj('0001234-08.2023.8.26.0100')
+    assert cnj['numero'] == '0001234-08.2023.8.26.0100'
+    assert cnj['tribunal'] == 'TJSP'
+    assert cnj['connector'] == 'tjsp'
+    assert cnj['justica'] == 'Justiça Estadual'
+
+def test_parse_cnj_accepts_number_without_punctuation():
+    assert parse_cnj('00012340820238260100')['numero'] == '0001234-08.2023.8.26.0100'
+
+def test_parse_cnj_rejects_wrong_check_digits():
+    assert parse_cnj('0001234-09.2023.8.26.0100') is None
+    assert parse_cnj('0001235-08.2023.8.26.0100') is None
+
+def test_parse_cnj_rejects_malformed_input():
+    assert parse_cnj('') is None
+    assert parse_cnj(None) is None
+    assert parse_cnj('0001234-08.2023.8.26') is None
+
+def test_parse_cnj_unknown_court_has_no_connector():
+    digits = check_digits('0000001', '2020', '4', '03', '0001')
+    cnj = parse_cnj(f'0000001-{digits}.2020.4.03.0001')
+    assert cnj['tribunal'] == 'TRF3'
+    assert cnj['connector'] is None
+
+# CPF
+
+def test_validate_cpfs_batch():
+    valid, normalized = validate_cpfs(['529.982.247-25', '52998224726', '111.111.111-11', '123', ''])
+    assert valid.tolist() == [True, False, False, False, False]
+    assert normalized.tolist() == ['52998224725', '52998224726', '11111111111', '', '']
+
+def test_validate_cpfs_empty():
+    valid, normalized = validate_cpfs([])
+    assert valid.shape == (0,) and normalized.shape == (0,)
+
+# Códigos de afiliado (Luhn mod 32)
+
+def test_generated_codes_are_valid():
+    allocator = AffiliateCodeAllocator()
+    for _ in range(200):
+        code = allocator.generate()
+        assert allocator.normalize(code) == code
+
+def test_any_single_character_error_is_detected():
+    allocator = AffiliateCodeAllocator()
+    code = allocator.generate()
+    for position in range(2, len(code)):
+        for char in ALPHABET:
+            if char != code[position]:
+                assert not allocator.is_valid(code[:position] + char + code[position + 1:])
+
+def test_adjacent_transposition_is_detected():
+    allocator = AffiliateCodeAllocator()
+    body = '0123456Z'
+    code = f"JB{body}{allocator.check_char(body)}"
+    swapped = f"JB{body[1]}{body[0]}{body[2:]}{code[-1]}"
+    assert allocator.is_valid(code)
+    assert not allocator.is_valid(swapped)
+
+def test_normalize_maps_confusable_characters_and_case():
+    allocator = AffiliateCodeAllocator()
+    body = '0011ABCD'
+    code = f"JB{body}{allocator.check_char(body)}"
+    typed = ' ' + code.lower().replace('0', 'o').replace('1', 'l') + ' '
+    assert allocator.normalize(typed) == code
+
+def test_normalize_keeps_legacy_codes_and_rejects_garbage():
+    allocator = AffiliateCodeAllocator()
+    assert allocator.normalize('jurist123456ab12') == 'JURIST123456AB12'
+    assert allocator.normalize('') is None
+    assert allocator.normalize('XX12345678') is None
+    assert allocator.normalize('JB1234') is None